@@ -1,5 +1,8 @@
 echo "BUILD START"
 python3.9 -m ensurepip
 python3.9 -m pip install -r requirements.txt
+python3.9 manage.py build_assets
 python3.9 manage.py collectstatic --noinput --clear
+python3.9 manage.py repair_schema
+if [ "$PRERENDER_PAGES" = "1" ]; then python3.9 manage.py prerender_pages; fi
 echo "BUILD END"
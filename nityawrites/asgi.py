@@ -12,5 +12,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nityawrites.settings')
+os.environ.setdefault('ASYNC_CATALOG_VIEWS', '1')
 
 application = get_asgi_application()
+
+# Compile the store templates now rather than on the first requests
+from store.warmup import warm_templates
+
+warm_templates()
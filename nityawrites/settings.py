@@ -48,7 +48,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.compression.CompressionMiddleware',
+    'store.middleware.ResourceHintsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'store.routers.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,13 +60,31 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Catalog pages pre-rendered by `manage.py prerender_pages` are served from the
+# "prerender" storage before any session/DB work (store/prerender.py)
+PRERENDER_PAGES = os.environ.get('PRERENDER_PAGES') == '1'
+PRERENDER_HOST = os.environ.get('PRERENDER_HOST', 'localhost')
+PRERENDER_MAX_AGE = int(os.environ.get('PRERENDER_MAX_AGE', '60'))
+PRERENDER_BACKGROUND = os.environ.get('PRERENDER_BACKGROUND', '1') == '1'
+if PRERENDER_PAGES:
+    MIDDLEWARE.insert(MIDDLEWARE.index('whitenoise.middleware.WhiteNoiseMiddleware') + 1,
+                      'store.prerender.PrerenderedPageMiddleware')
+
+# Brotli level for dynamic responses (store/compression.py); 11 is for
+# precompressed static files, 4-5 keeps per-request CPU low
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+# Load harness (manage.py load_funnel) reads per-request query counts from this
+if os.environ.get('QUERY_COUNT_HEADER') == '1':
+    MIDDLEWARE.insert(0, 'store.middleware.QueryCountHeaderMiddleware')
+
 ROOT_URLCONF = 'nityawrites.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -71,12 +92,24 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept per process (the dev autoreloader
+            # still resets them on edit); wsgi.py/asgi.py warm them at start-up.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'nityawrites.wsgi.application'
 
+# Route the catalog pages (home, book detail, order success, sitemap) to the
+# async views in store/async_views.py. asgi.py switches this on.
+ASYNC_CATALOG_VIEWS = os.environ.get('ASYNC_CATALOG_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -104,13 +137,18 @@ database_url = (
 )
 
 
-if database_url:
+def clean_database_url(url):
     # Clean up the URL: remove surrounding quotes and whitespace
-    database_url = database_url.strip().strip("'").strip('"')
-    
+    url = url.strip().strip("'").strip('"')
+
     # Handle accidental copy-paste of 'psql' command from Neon dashboard
-    if database_url.startswith("psql "):
-        database_url = database_url.replace("psql ", "", 1).strip().strip("'").strip('"')
+    if url.startswith("psql "):
+        url = url.replace("psql ", "", 1).strip().strip("'").strip('"')
+    return url
+
+
+if database_url:
+    database_url = clean_database_url(database_url)
     
     DATABASES["default"] = dj_database_url.parse(database_url)
     DATABASES["default"]["OPTIONS"] = {
@@ -125,6 +163,27 @@ elif not DEBUG:
     print("WARNING: No DATABASE_URL found in production. SQLite fallback will likely fail on Vercel.")
 
 
+# Read replicas for catalog reads (store/routers.py). DATABASE_REPLICA_URL
+# takes one or more comma-separated URLs in the same format as DATABASE_URL.
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URL", "").split(","))):
+    alias = "replica" if index == 0 else f"replica{index}"
+    DATABASES[alias] = dj_database_url.parse(clean_database_url(replica_url))
+    if "postgresql" in DATABASES[alias]["ENGINE"]:
+        DATABASES[alias]["OPTIONS"] = {"sslmode": "require"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 15     # keep a browser on the primary this long after it writes
+REPLICA_MAX_LAG = 5             # seconds; lagging replicas are skipped
+REPLICA_LAG_CHECK_INTERVAL = 10 # seconds between lag checks per replica
+
+# Order and payment changelists (store/admin_scale.py) show the planner's row
+# estimate above this many rows instead of running COUNT(*), and stop counting
+# filtered results here ("10,000+").
+ADMIN_COUNT_LIMIT = int(os.environ.get('ADMIN_COUNT_LIMIT', '10000'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -163,9 +222,28 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles_build' / 'static'
 
+# Asset pipeline: `python manage.py build_assets` writes minified bundles and
+# the critical CSS into static/dist/ before collectstatic fingerprints them and
+# WhiteNoise precompresses them (gzip + Brotli) and serves them as immutable.
+ASSET_BUILD_DIR = BASE_DIR / 'static' / 'dist'
+ASSET_BUNDLES = {
+    'site.min.css': ['style.css'],
+    'site.min.js': ['script.js'],
+    'direct-upload.min.js': ['direct_upload.js'],
+}
+CRITICAL_CSS_TEMPLATES = ['store/base.html', 'store/index.html']
+# Covers loaded eagerly (and preloaded) on the home page; the rest lazy-load
+ABOVE_THE_FOLD_COVERS = int(os.environ.get('ABOVE_THE_FOLD_COVERS', '4'))
+# "Customers also bought" books kept per book (store/recommendations.py)
+RECOMMENDATIONS_PER_BOOK = int(os.environ.get('RECOMMENDATIONS_PER_BOOK', '6'))
+# "Similar books" kept per book, by catalog text (store/similar.py)
+SIMILAR_BOOKS_PER_BOOK = int(os.environ.get('SIMILAR_BOOKS_PER_BOOK', '6'))
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Media URLs memoised per process (store/media.py)
+MEDIA_URL_CACHE_SIZE = int(os.environ.get('MEDIA_URL_CACHE_SIZE', '4096'))
 
 INSTALLED_APPS += [
     'cloudinary_storage',
@@ -192,18 +270,50 @@ cloudinary.config(
 
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": os.environ.get('MEDIA_STORAGE_BACKEND', "cloudinary_storage.storage.MediaCloudinaryStorage"),
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    # Pre-rendered catalog pages; by default next to the collectstatic output
+    "prerender": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": BASE_DIR / 'staticfiles_build' / 'pages'},
+    },
 }
+if os.environ.get('PRERENDER_STORAGE_BACKEND'):
+    STORAGES["prerender"] = {"BACKEND": os.environ['PRERENDER_STORAGE_BACKEND']}
+
+# Direct uploads (store/direct_upload.py): browsers send screenshots and
+# covers straight to storage with a signed token valid for
+# DIRECT_UPLOAD_TOKEN_AGE seconds. The backend follows the default storage
+# (Cloudinary, or the local stand-in endpoint) unless set explicitly.
+DIRECT_UPLOAD_BACKEND = os.environ.get('DIRECT_UPLOAD_BACKEND')
+DIRECT_UPLOAD_TOKEN_AGE = int(os.environ.get('DIRECT_UPLOAD_TOKEN_AGE', '600'))
+DIRECT_UPLOAD_MAX_BYTES = int(os.environ.get('DIRECT_UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
+
+# Order placement and the payment callback run once per idempotency key
+# (store/idempotency.py); repeats within this many seconds get the first
+# response back.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+# A duplicate of a request still running waits up to IDEMPOTENCY_WAIT seconds
+# for its response; a claim with no response after IDEMPOTENCY_CLAIM_TIMEOUT
+# seconds is taken to be abandoned
+IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', '10'))
+IDEMPOTENCY_CLAIM_TIMEOUT = int(os.environ.get('IDEMPOTENCY_CLAIM_TIMEOUT', '60'))
 
 # UPI Configuration
 UPI_ID = 'nityabhambhani@upi'
 
+# Shared pool for QR code and screenshot processing (store/offload.py).
+# Jobs beyond OFFLOAD_MAX_PENDING are rejected; requests wait at most
+# OFFLOAD_TIMEOUT seconds before falling back.
+OFFLOAD_WORKERS = int(os.environ.get('OFFLOAD_WORKERS', '4'))
+OFFLOAD_MAX_PENDING = int(os.environ.get('OFFLOAD_MAX_PENDING', '32'))
+OFFLOAD_TIMEOUT = float(os.environ.get('OFFLOAD_TIMEOUT', '5'))
+
 # Email Configuration (Gmail SMTP)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -211,3 +321,16 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = f'Nityawrites <{EMAIL_HOST_USER}>'
 
+# The owner gets one digest of confirmed orders per run of send_owner_digest
+# (hourly via the Vercel cron in vercel.json, which authenticates with
+# CRON_SECRET) instead of a copy of every confirmation email.
+OWNER_DIGEST_RECIPIENTS = [
+    address.strip() for address in os.environ.get('OWNER_DIGEST_RECIPIENTS', EMAIL_HOST_USER or '').split(',')
+    if address.strip()
+]
+OWNER_DIGEST_KEEP_DAYS = int(os.environ.get('OWNER_DIGEST_KEEP_DAYS', '30'))
+CRON_SECRET = os.environ.get('CRON_SECRET')
+# Orders still pending payment after this many hours are abandoned checkouts;
+# purge_abandoned_orders (daily Vercel cron) removes them.
+ABANDONED_ORDER_HOURS = int(os.environ.get('ABANDONED_ORDER_HOURS', '72'))
+
@@ -15,4 +15,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nityawrites.settings')
 
 application = get_wsgi_application()
 
+# Compile the store templates now rather than on the first requests
+from store.warmup import warm_templates
+
+warm_templates()
+
 app = application
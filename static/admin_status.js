@@ -0,0 +1,28 @@
+// Inline status edits on the order and payment changelists (see
+// store/admin_scale.py): each status <select> saves itself with one small POST.
+(function () {
+  function csrfToken() {
+    const field = document.querySelector('#changelist-form [name=csrfmiddlewaretoken]');
+    return field ? field.value : '';
+  }
+
+  function save(select) {
+    const body = new FormData();
+    body.append('status', select.value);
+    select.disabled = true;
+    fetch(select.dataset.url, {method: 'POST', body: body, headers: {'X-CSRFToken': csrfToken()}, credentials: 'same-origin'})
+      .then(response => {
+        if (!response.ok) throw new Error('Saving the status failed (' + response.status + ')');
+        select.dataset.value = select.value;
+      })
+      .catch(error => {
+        select.value = select.dataset.value;
+        window.alert(error.message);
+      })
+      .then(() => { select.disabled = false; });
+  }
+
+  document.addEventListener('change', event => {
+    if (event.target.matches('select.status-select')) save(event.target);
+  });
+})();
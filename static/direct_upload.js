@@ -0,0 +1,120 @@
+// Direct-to-storage uploads (see store/direct_upload.py): ask the server for a
+// signed token, send the file straight to storage, then hand the token back.
+(function () {
+  function csrfToken(form) {
+    const field = form.querySelector('[name=csrfmiddlewaretoken]');
+    return field ? field.value : '';
+  }
+
+  function postForm(url, fields, headers) {
+    return fetch(url, {method: 'POST', body: toFormData(fields), headers: headers || {}, credentials: 'same-origin'})
+      .then(response => {
+        if (!response.ok) throw new Error('Upload failed (' + response.status + ')');
+        return response.json();
+      });
+  }
+
+  // Resolves to the fields the confirm step needs: token, version, signature
+  function directUpload(file, options) {
+    const tokenFields = {kind: options.kind, target: options.target || '', filename: file.name};
+    return postForm(options.tokenUrl, tokenFields, {'X-CSRFToken': options.csrf})
+      .then(issued => {
+        const fields = Object.assign({}, issued.upload.fields);
+        fields[issued.upload.file_field] = file;
+        // Cross-origin for Cloudinary: no credentials, no CSRF header
+        return fetch(issued.upload.url, {method: 'POST', body: toFormData(fields)})
+          .then(response => {
+            if (!response.ok) throw new Error('Upload failed (' + response.status + ')');
+            return response.json();
+          })
+          .then(stored => ({token: issued.token, version: stored.version || '', signature: stored.signature || ''}));
+      });
+  }
+
+  function toFormData(fields) {
+    const body = new FormData();
+    Object.keys(fields).forEach(name => body.append(name, fields[name]));
+    return body;
+  }
+
+  function submitTo(url, fields) {
+    const form = document.createElement('form');
+    form.method = 'post';
+    form.action = url;
+    form.style.display = 'none';
+    Object.keys(fields).forEach(name => {
+      const input = document.createElement('input');
+      input.type = 'hidden';
+      input.name = name;
+      input.value = fields[name];
+      form.appendChild(input);
+    });
+    document.body.appendChild(form);
+    form.submit();
+  }
+
+  function init() {
+    // Payment proof: upload on submit, confirm instead of posting the file
+    document.querySelectorAll('form[data-direct-upload="payment"]').forEach(form => {
+      form.addEventListener('submit', event => {
+        const input = form.querySelector('input[type=file]');
+        if (!window.fetch || !window.FormData || !input || !input.files.length) return;
+        event.preventDefault();
+        const button = form.querySelector('[type=submit]');
+        if (button) button.disabled = true;
+        directUpload(input.files[0], {
+          kind: 'payment',
+          target: form.dataset.target,
+          tokenUrl: form.dataset.tokenUrl,
+          csrf: csrfToken(form),
+        }).then(result => {
+          submitTo(form.dataset.confirmUrl, {
+            token: result.token,
+            version: result.version,
+            signature: result.signature,
+            payment_reference: form.elements.payment_reference ? form.elements.payment_reference.value : '',
+            csrfmiddlewaretoken: csrfToken(form),
+          });
+        }).catch(() => {
+          // Fall back to the regular upload through the server
+          form.submit();
+        });
+      });
+    });
+
+    // Admin book form: upload the cover as soon as it's picked, post only the token
+    document.querySelectorAll('input[data-direct-upload="book"]').forEach(tokenInput => {
+      const form = tokenInput.form;
+      const input = form.querySelector('input[type=file][name=image]');
+      if (!window.fetch || !window.FormData || !input) return;
+      input.addEventListener('change', () => {
+        if (!input.files.length) return;
+        const submit = form.querySelectorAll('[type=submit]');
+        submit.forEach(button => { button.disabled = true; });
+        directUpload(input.files[0], {
+          kind: 'book',
+          target: tokenInput.dataset.target,
+          tokenUrl: tokenInput.dataset.tokenUrl,
+          csrf: csrfToken(form),
+        }).then(result => {
+          tokenInput.value = result.token;
+          form.elements.direct_image_version.value = result.version;
+          form.elements.direct_image_signature.value = result.signature;
+          input.value = '';
+        }).catch(() => {
+          // Leave the file in place; it goes up with the form as before
+          tokenInput.value = '';
+        }).then(() => {
+          submit.forEach(button => { button.disabled = false; });
+        });
+      });
+    });
+  }
+
+  // Admin media loads in <head>, before the form exists
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', init);
+  } else {
+    init();
+  }
+})();
@@ -1,8 +1,18 @@
-from django.contrib import admin
-from django.http import HttpResponse
-from django.utils.html import format_html
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
 from openpyxl import Workbook
-from .models import Book, Order, OrderItem, Payment, AboutSection, SocialMedia, Review
+from . import direct_upload, placeholders, reconcile, rollups, search, similar
+from .admin_scale import LargeTableAdminMixin, OrderStatusFilter, PaymentStatusFilter
+from .catalog_import import import_books, iter_rows
+from .media import media_url
+from .models import Book, Order, OrderItem, Payment, AboutSection, SocialMedia, Review, ArchivedOrder, DailySales, DailyBookSales, DailyOrderStatus
 
 
 @admin.register(Review)
@@ -12,13 +22,118 @@ class ReviewAdmin(admin.ModelAdmin):
     search_fields = ['name', 'comment', 'book__title']
 
 
+class BookForm(forms.ModelForm):
+    # Filled in by direct_upload.js once the cover is in storage; the file
+    # input is then cleared so the image never passes through this server
+    direct_image_token = forms.CharField(required=False, widget=forms.HiddenInput)
+    direct_image_version = forms.CharField(required=False, widget=forms.HiddenInput)
+    direct_image_signature = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    class Meta:
+        model = Book
+        fields = '__all__'
+
+    class Media:
+        js = ['direct_upload.js']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['direct_image_token'].widget.attrs.update({
+            'data-direct-upload': 'book',
+            'data-target': self.instance.pk or '',
+            'data-token-url': reverse('direct_upload_token'),
+        })
+
+    def clean(self):
+        cleaned_data = super().clean()
+        token = cleaned_data.get('direct_image_token')
+        if token:
+            try:
+                payload = direct_upload.confirm(
+                    token, cleaned_data.get('direct_image_version'), cleaned_data.get('direct_image_signature'),
+                )
+            except direct_upload.UploadError as e:
+                raise forms.ValidationError({'image': str(e)})
+            if payload['kind'] != 'book' or payload['target'] not in (None, self.instance.pk):
+                raise forms.ValidationError({'image': 'Upload token is for a different object.'})
+            cleaned_data['image'] = payload['name']
+            self.instance.image.name = payload['name']
+            placeholders.refresh(self.instance)
+        return cleaned_data
+
+
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
+    form = BookForm
     list_display = ['title', 'author', 'price', 'stock', 'created_at']
     list_filter = ['created_at']
     search_fields = ['title', 'author']
     list_editable = ['price', 'stock']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Price/stock edits from the changelist leave the similar-books lists alone
+        if not change or set(form.changed_data) & set(similar.TEXT_FIELDS):
+            transaction.on_commit(lambda: similar.refresh([obj.pk]))
+
+    def delete_model(self, request, obj):
+        self.refresh_similar_on_delete([obj.pk])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        self.refresh_similar_on_delete(list(queryset.values_list('pk', flat=True)))
+        super().delete_queryset(request, queryset)
+
+    def refresh_similar_on_delete(self, pks):
+        # The deleted books' rows in other lists cascade away, so find those lists first
+        listed = similar.listed_with(pks) - set(pks)
+        if listed:
+            transaction.on_commit(lambda: similar.refresh(listed))
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='store_book_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Upload a CSV/XLSX file and upsert the books in it"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return HttpResponseRedirect(reverse('admin:store_book_changelist'))
+        form = BookImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            result = import_books(iter_rows(upload.file, upload.name))
+            self.message_user(request, (
+                f"Imported {result.rows} rows: {result.created} created, "
+                f"{result.updated} updated, {result.covers} covers fetched."
+            ))
+            for number, message in result.errors[:20]:
+                self.message_user(request, f"Row {number}: {message}", messages.WARNING)
+            if len(result.errors) > 20:
+                self.message_user(request, f"...and {len(result.errors) - 20} more row errors.", messages.WARNING)
+            return HttpResponseRedirect(reverse('admin:store_book_changelist'))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import books',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/store/book/import.html', context)
+
+
+class StatementUploadForm(forms.Form):
+    file = forms.FileField(help_text='Bank or UPI statement CSV with an amount column and a UTR/reference or narration column.')
+
+
+class BookImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or XLSX with columns title, author, description, price, stock, image_url.')
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+            raise forms.ValidationError('Upload a .csv or .xlsx file.')
+        return upload
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -75,15 +190,31 @@ export_orders_to_excel.short_description = "Export to Excel"
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_id', 'customer_name', 'phone', 'total_amount', 'payment_status', 'quick_actions', 'created_at']
-    list_filter = ['payment_status', 'created_at']
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['order_id', 'customer_name', 'phone', 'total_amount', 'status_widget', 'quick_actions', 'created_at']
+    list_filter = [OrderStatusFilter, 'created_at']
     search_fields = ['order_id', 'customer_name', 'email', 'phone']
+    search_help_text = 'Order ID, email, phone number, or the start of the customer name.'
     readonly_fields = ['order_id', 'created_at', 'quick_actions']
-    list_editable = ['payment_status']
+    status_field = 'payment_status'
     inlines = [OrderItemInline]
     actions = [export_orders_to_excel, 'mark_as_verified', 'mark_as_failed']
 
+    def get_search_results(self, request, queryset, search_term):
+        return search.search_orders(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rollups.record_transition(obj, form.initial.get('payment_status') if change else None, obj.payment_status)
+
+    def status_changed(self, obj, old, new):
+        rollups.record_transition(obj, old, new)
+
+    def status_widget(self, obj):
+        return self.status_select(obj)
+    status_widget.short_description = 'Payment status'
+    status_widget.admin_order_field = 'payment_status'
+
     def quick_actions(self, obj):
         from django.utils.safestring import mark_safe
         verify_url = f"/manage-order/verify/{obj.pk}/"
@@ -118,7 +249,9 @@ class OrderAdmin(admin.ModelAdmin):
         from django.utils import timezone
         count = 0
         errors = []
+        changes = []
         for order in queryset:
+            changes.append((order, order.payment_status, 'verified'))
             order.payment_status = 'verified'
             order.save()
             # Update associated payment
@@ -134,6 +267,7 @@ class OrderAdmin(admin.ModelAdmin):
                 count += 1
             except Exception as e:
                 errors.append(f"#{order.order_id}: {str(e)}")
+        rollups.record_transitions(changes)
         
         if count:
             self.message_user(request, f"Successfully verified {count} order(s) and sent emails.")
@@ -144,8 +278,10 @@ class OrderAdmin(admin.ModelAdmin):
     actions = ['mark_as_verified', 'mark_as_failed', 'export_to_excel', 'resend_confirmation_email']
 
     def mark_as_failed(self, request, queryset):
+        orders = list(queryset)
         count = queryset.update(payment_status='failed')
-        for order in queryset:
+        rollups.record_transitions([(order, order.payment_status, 'failed') for order in orders])
+        for order in orders:
             payment = getattr(order, 'payment', None)
             if payment:
                 payment.status = 'failed'
@@ -157,17 +293,68 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'book', 'quantity', 'price']
-    list_filter = ['order']
+    list_select_related = ['order', 'book']
+    # A filter listing every order doesn't scale; search by order ID instead
+    search_fields = ['order__order_id']
+    show_full_result_count = False
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
-    list_display = ['order', 'payment_reference', 'amount', 'status', 'quick_actions', 'created_at', 'has_screenshot']
-    list_filter = ['status', 'created_at']
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['order', 'payment_reference', 'amount', 'status_widget', 'quick_actions', 'created_at', 'has_screenshot']
+    list_filter = [PaymentStatusFilter, 'created_at']
     search_fields = ['upi_transaction_id', 'payment_reference', 'order__order_id']
+    search_help_text = 'UTR/reference, order ID, email, phone number, or the start of the customer name.'
     readonly_fields = ['created_at', 'screenshot_preview', 'quick_actions']
-    list_editable = ['status']
+    status_field = 'status'
     fields = ['order', 'upi_transaction_id', 'payment_reference', 'amount', 'status', 'created_at', 'verified_at', 'screenshot_preview', 'payment_screenshot']
+
+    def get_search_results(self, request, queryset, search_term):
+        return search.search_payments(queryset, search_term), False
+
+    def get_urls(self):
+        return [
+            path('reconcile/', self.admin_site.admin_view(self.reconcile_view), name='store_payment_reconcile'),
+        ] + super().get_urls()
+
+    def reconcile_view(self, request):
+        """Match a UPI statement against pending payments, then verify the matches in one go"""
+        from .views import send_order_confirmation_email
+        if not self.has_change_permission(request):
+            return HttpResponseRedirect(reverse('admin:store_payment_changelist'))
+
+        if request.method == 'POST' and 'payment_ids' in request.POST:
+            ids = [int(pk) for pk in request.POST['payment_ids'].split(',') if pk.isdigit()]
+            orders = reconcile.verify_payments(ids)
+            errors = []
+            if request.POST.get('send_emails'):
+                for order in orders:
+                    try:
+                        send_order_confirmation_email(order)
+                    except Exception as e:
+                        errors.append(f"#{order.order_id}: {str(e)}")
+            self.message_user(request, f"Verified {len(orders)} payment(s) from the statement.")
+            if errors:
+                self.message_user(request, f"Failed to send {len(errors)} email(s): {', '.join(errors)}", level='ERROR')
+            return HttpResponseRedirect(reverse('admin:store_payment_changelist'))
+
+        form = StatementUploadForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == 'POST' and form.is_valid():
+            try:
+                result = reconcile.reconcile(reconcile.parse_statement(form.cleaned_data['file'].file))
+            except ValueError as e:
+                form.add_error('file', str(e))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Reconcile UPI statement',
+            'form': form,
+            'result': result,
+            'payment_ids': result and ','.join(str(payment.pk) for _, payment in result.matched),
+        }
+        return TemplateResponse(request, 'admin/store/payment/reconcile.html', context)
+
     def resend_confirmation_email(self, request, queryset):
         """Resend email from payment admin"""
         from .views import send_order_confirmation_email
@@ -193,14 +380,20 @@ class PaymentAdmin(admin.ModelAdmin):
         return bool(obj.payment_screenshot)
     has_screenshot.boolean = True
     has_screenshot.short_description = 'Screenshot'
+
+    def status_widget(self, obj):
+        return self.status_select(obj)
+    status_widget.short_description = 'Status'
+    status_widget.admin_order_field = 'status'
     
     def screenshot_preview(self, obj):
         """Display screenshot preview in admin"""
         if obj.payment_screenshot:
             return format_html(
                 '<a href="{}" target="_blank"><img src="{}" style="max-width: 300px; max-height: 300px; border: 2px solid #ddd; border-radius: 5px;"/></a>',
-                obj.payment_screenshot.url,
-                obj.payment_screenshot.url
+                media_url(obj.payment_screenshot),
+                # Retina-sized thumbnail on Cloudinary; the link opens the original
+                media_url(obj.payment_screenshot, 'c_limit,h_600,w_600'),
             )
         return "No screenshot uploaded"
     screenshot_preview.short_description = 'Payment Screenshot'
@@ -220,11 +413,13 @@ class PaymentAdmin(admin.ModelAdmin):
         from .views import send_order_confirmation_email
         from django.utils import timezone
         count = 0
+        changes = []
         for payment in queryset:
             payment.status = 'verified'
             payment.verified_at = timezone.now()
             payment.save()
             # Update order status
+            changes.append((payment.order, payment.order.payment_status, 'verified'))
             payment.order.payment_status = 'verified'
             payment.order.save()
             
@@ -235,15 +430,21 @@ class PaymentAdmin(admin.ModelAdmin):
                 self.message_user(request, f"Error sending email for {payment.order.order_id}: {e}", level='Warning')
                 
             count += 1
+        rollups.record_transitions(changes)
         self.message_user(request, f'{count} payment(s) marked as verified and emails sent.')
     mark_as_verified.short_description = "✅ Mark as Verified & Send Email"
     
     def mark_as_failed(self, request, queryset):
         """Mark selected payments as failed"""
+        # Read them first: with the status filter on, the queryset is empty after the update
+        payments = list(queryset.select_related('order'))
         count = queryset.update(status='failed')
-        for payment in queryset:
+        changes = []
+        for payment in payments:
+            changes.append((payment.order, payment.order.payment_status, 'failed'))
             payment.order.payment_status = 'failed'
             payment.order.save()
+        rollups.record_transitions(changes)
         self.message_user(request, f'{count} payment(s) marked as failed.')
     mark_as_failed.short_description = "❌ Mark as Failed"
 
@@ -266,3 +467,111 @@ class SocialMediaAdmin(admin.ModelAdmin):
     list_display = ['platform', 'url', 'is_active', 'order']
     list_filter = ['platform', 'is_active']
     list_editable = ['is_active', 'order']
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['order_id', 'customer_name', 'phone', 'total_amount', 'payment_status', 'created_at', 'archived_at']
+    list_filter = ['payment_status']
+    search_fields = ['order_id', 'customer_name', 'email', 'phone']
+    search_help_text = 'Order ID, email, phone number, or the start of the customer name.'
+    date_hierarchy = 'created_at'
+    fields = ['order_id', 'customer_name', 'email', 'phone', 'total_amount', 'payment_status',
+              'created_at', 'archived_at', 'address', 'items', 'payment_details', 'archive_file']
+    readonly_fields = fields
+
+    def get_search_results(self, request, queryset, search_term):
+        return search.search_orders(queryset, search_term), False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def record(self, obj):
+        # Loaded once per object view; JSONL-backed rows read their file here
+        if not hasattr(obj, '_record'):
+            from .archive import load_archived
+            obj._record = load_archived(obj)
+        return obj._record
+
+    def address(self, obj):
+        r = self.record(obj)
+        parts = [r.get('address_line1'), r.get('address_line2'), r.get('city'), r.get('state'), r.get('pincode'), r.get('country')]
+        return ', '.join(p for p in parts if p)
+
+    def items(self, obj):
+        return format_html_join(
+            '', '<div>{} x {} - ₹{}</div>',
+            ((item['title'], item['quantity'], item['price']) for item in self.record(obj).get('items', [])),
+        ) or '-'
+    items.short_description = 'Books'
+
+    def payment_details(self, obj):
+        payment = self.record(obj).get('payment') or {}
+        return format_html_join(
+            '', '<div><strong>{}:</strong> {}</div>',
+            ((key.replace('_', ' ').title(), value or '-') for key, value in payment.items()),
+        ) or '-'
+    payment_details.short_description = 'Payment'
+
+
+@admin.register(DailySales)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Sales dashboard built only from the daily rollup tables (see store.rollups)"""
+    PERIODS = [7, 30, 90, 365]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        from django.db.models import Sum
+        from django.utils import timezone
+
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        if days not in self.PERIODS:
+            days = 30
+        since = timezone.localdate() - timedelta(days=days - 1)
+
+        daily = list(DailySales.objects.filter(date__gte=since).order_by('date'))
+        totals = {
+            'orders': sum(d.orders for d in daily),
+            'units': sum(d.units for d in daily),
+            'revenue': sum(d.revenue for d in daily),
+        }
+        peak = max((d.revenue for d in daily), default=0) or 1
+        for d in daily:
+            d.bar = int(d.revenue * 100 / peak)
+        top_books = (
+            DailyBookSales.objects.filter(date__gte=since)
+            .values('book__title').annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .filter(units__gt=0).order_by('-units')[:10]
+        )
+        statuses = (
+            DailyOrderStatus.objects.filter(date__gte=since)
+            .values('payment_status').annotate(orders=Sum('orders'))
+            .filter(orders__gt=0).order_by('-orders')
+        )
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Sales dashboard',
+            'days': days,
+            'periods': self.PERIODS,
+            'daily': daily,
+            'totals': totals,
+            'top_books': top_books,
+            'statuses': statuses,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/store/dailysales/dashboard.html', context)
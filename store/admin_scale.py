@@ -0,0 +1,209 @@
+"""
+Admin changelists for tables with millions of rows (orders, payments).
+
+- Counts: the row estimate the planner keeps (pg_class.reltuples on
+  Postgres, MAX(rowid) on SQLite) for the unfiltered list; filtered or
+  searched lists are counted up to ADMIN_COUNT_LIMIT and shown as "N+".
+  Small tables still get an exact COUNT(*).
+- Pagination: in the default newest-first order, pages are fetched with a
+  keyset cursor on (created_at, pk), so page 10,000 costs the same as
+  page 1. Sorting by another column falls back to numbered pages.
+- Filters: fixed status lists, so building the sidebar runs no queries.
+- Status edits: a per-row <select> saved with one small POST instead of a
+  list_editable formset over the whole page.
+"""
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import PermissionDenied
+from django.db import connections, router, transaction
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from django.views.decorators.http import require_POST
+
+
+CURSOR_VAR = 'after'
+
+# Every value Order.payment_status / Payment.status takes in practice
+STATUSES = [
+    ('pending', 'Pending'),
+    ('pending_verification', 'Pending verification'),
+    ('verified', 'Verified'),
+    ('completed', 'Completed'),
+    ('failed', 'Failed'),
+]
+
+
+def estimated_count(model):
+    """Approximate row count from planner statistics; None if there are none"""
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            # -1 until the table has been vacuumed/analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        raise IncorrectLookupParameters('Invalid cursor')
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList with estimated counts and keyset pagination (see module docstring)"""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Any link that changes the filters/search/order starts from the top
+        new_params = dict(new_params or {})
+        new_params.setdefault(CURSOR_VAR, None)
+        return super().get_query_string(new_params, remove)
+
+    def is_filtered(self):
+        return bool(self.query) or bool(self.get_filters_params())
+
+    def count(self):
+        """(count, is_exact) without a full COUNT(*) on big tables"""
+        limit = settings.ADMIN_COUNT_LIMIT
+        if not self.is_filtered():
+            estimate = estimated_count(self.model)
+            if estimate is not None and estimate > limit:
+                return estimate, False
+        counted = self.queryset.order_by()[:limit + 1].count()
+        return min(counted, limit), counted <= limit
+
+    def get_results(self, request):
+        self.keyset = ORDER_VAR not in self.params
+        if not self.keyset:
+            return super().get_results(request)
+
+        queryset = self.queryset.order_by('-created_at', '-pk')
+        cursor = request.GET.get(CURSOR_VAR)
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            # A range on created_at (index-friendly) minus the rows already shown
+            queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk)
+        rows = list(queryset[:self.list_per_page + 1])
+        has_next = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+
+        self.result_count, self.result_count_exact = self.count()
+        if self.result_count_exact:
+            self.result_count_label = f"{self.result_count:,}"
+        elif self.is_filtered():
+            self.result_count_label = f"{self.result_count:,}+"
+        else:
+            self.result_count_label = f"about {self.result_count:,}"
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        # Numbered pagination (and its COUNT) stays off; see pagination.html
+        self.multi_page = False
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.next_url = rows and has_next and super().get_query_string(
+            {CURSOR_VAR: encode_cursor(rows[-1].created_at, rows[-1].pk)}
+        )
+        self.first_url = cursor and self.get_query_string()
+
+
+class StatusFilter(admin.SimpleListFilter):
+    """Status filter with a fixed list of values (no DISTINCT query)"""
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return STATUSES
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field: self.value()})
+        return queryset
+
+
+class OrderStatusFilter(StatusFilter):
+    title = 'payment status'
+    parameter_name = 'payment_status'
+    field = 'payment_status'
+
+
+class PaymentStatusFilter(StatusFilter):
+    field = 'status'
+
+
+class LargeTableAdminMixin:
+    """Use on ModelAdmins over tables with a created_at column that grow without bound"""
+    show_full_result_count = False
+    status_field = None
+
+    class Media:
+        js = ['admin_status.js']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path('<int:object_id>/status/', self.admin_site.admin_view(require_POST(self.status_view)),
+                 name='%s_%s_status' % info),
+        ] + super().get_urls()
+
+    def status_url(self, obj):
+        return reverse(f'admin:{self.opts.app_label}_{self.opts.model_name}_status', args=[obj.pk])
+
+    def status_view(self, request, object_id):
+        """Save one row's status from the changelist <select>"""
+        value = request.POST.get('status')
+        if value not in dict(STATUSES):
+            return JsonResponse({'error': 'Unknown status.'}, status=400)
+        with transaction.atomic():
+            obj = get_object_or_404(self.model.objects.select_for_update(), pk=object_id)
+            if not self.has_change_permission(request, obj):
+                raise PermissionDenied
+            old = getattr(obj, self.status_field)
+            if old != value:
+                setattr(obj, self.status_field, value)
+                obj.save(update_fields=[self.status_field])
+                self.status_changed(obj, old, value)
+                self.log_change(request, obj, [{'changed': {'fields': [self.status_field]}}])
+        return JsonResponse({'status': value})
+
+    def status_changed(self, obj, old, new):
+        """Hook for side effects of a status edit (rollups)"""
+
+    def status_select(self, obj):
+        """Inline status <select>; admin_status.js saves a change straight away"""
+        current = getattr(obj, self.status_field)
+        choices = STATUSES if current in dict(STATUSES) else STATUSES + [(current, current)]
+        return format_html(
+            '<select class="status-select" data-url="{}" data-value="{}">{}</select>',
+            self.status_url(obj), current,
+            format_html_join('', '<option value="{}"{}>{}</option>', (
+                (value, format_html(' selected') if value == current else '', label) for value, label in choices
+            )),
+        )
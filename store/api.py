@@ -0,0 +1,138 @@
+"""
+Read-only JSON API for the catalog: books and reviews.
+
+Lists take ?fields= (only those columns are selected), ?limit= and an opaque
+?cursor= for keyset pagination on id. Rows are serialised straight from
+values_list() tuples. Responses carry an ETag (If-None-Match gets a 304);
+CompressionMiddleware compresses them.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from .media import media_url
+from .models import Book, Review
+
+
+BOOK_FIELDS = ['id', 'title', 'author', 'description', 'price', 'stock', 'image', 'created_at']
+BOOK_DEFAULT_FIELDS = ['id', 'title', 'author', 'price', 'stock', 'image', 'created_at']
+REVIEW_FIELDS = ['id', 'book', 'name', 'rating', 'comment', 'created_at']
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_AGE = 60
+
+
+class InvalidParameter(Exception):
+    """A query parameter the API can't honour; answered with a 400"""
+
+
+def _fields(request, allowed, default):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise InvalidParameter(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    # id always comes along: it's the cursor
+    return ['id'] + [f for f in dict.fromkeys(fields) if f != 'id']
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidParameter('Invalid cursor')
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise InvalidParameter('limit must be a number')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _rows(queryset, fields):
+    """Dicts from values_list() tuples; 'book' is the review's book id, 'image' a URL"""
+    columns = ['book_id' if f == 'book' else f for f in fields]
+    image_at = fields.index('image') if 'image' in fields else None
+    rows = []
+    for values in queryset.values_list(*columns):
+        if image_at is not None:
+            values = list(values)
+            values[image_at] = media_url(values[image_at]) or None
+        rows.append(dict(zip(fields, values)))
+    return rows
+
+
+def _respond(request, payload):
+    """JSON response with an ETag over the body, answering If-None-Match with a 304"""
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    etag = quote_etag(hashlib.md5(body).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={MAX_AGE}"
+    return response
+
+
+def _page(request, queryset, allowed, default):
+    try:
+        fields = _fields(request, allowed, default)
+        limit = _limit(request)
+        if request.GET.get('cursor'):
+            queryset = queryset.filter(pk__gt=decode_cursor(request.GET['cursor']))
+    except InvalidParameter as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = _rows(queryset.order_by('pk')[:limit + 1], fields)
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor(rows[-1]['id'])
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    return _respond(request, {'results': rows, 'next': next_url})
+
+
+@require_GET
+def book_list(request):
+    """GET /api/books/?fields=id,title,price&limit=50&cursor=..."""
+    return _page(request, Book.objects.all(), BOOK_FIELDS, BOOK_DEFAULT_FIELDS)
+
+
+@require_GET
+def book_detail(request, pk):
+    """GET /api/books/<id>/?fields=..."""
+    try:
+        fields = _fields(request, BOOK_FIELDS, BOOK_FIELDS)
+    except InvalidParameter as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    rows = _rows(Book.objects.filter(pk=pk), fields)
+    if not rows:
+        raise Http404('No such book')
+    return _respond(request, rows[0])
+
+
+@require_GET
+def review_list(request, pk=None):
+    """GET /api/reviews/?book=<id> or /api/books/<id>/reviews/"""
+    reviews = Review.objects.all()
+    book = pk or request.GET.get('book')
+    if book:
+        if not str(book).isdigit():
+            return JsonResponse({'error': 'book must be an id'}, status=400)
+        reviews = reviews.filter(book_id=book)
+    return _page(request, reviews, REVIEW_FIELDS, REVIEW_FIELDS)
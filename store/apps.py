@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        # Re-render pre-rendered pages when catalog data changes
+        from . import prerender  # noqa: F401
+        # Cover placeholders for uploaded images
+        from . import placeholders  # noqa: F401
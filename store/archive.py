@@ -0,0 +1,164 @@
+"""
+Moving old orders out of the live Order/OrderItem/Payment tables.
+
+Each batch is one transaction: snapshot the orders, write ArchivedOrder rows
+(with the full record inline, or pointing at a gzipped JSONL file in the
+default storage) and delete the originals, which cascades to their items
+and payment.
+
+purge_batch does the same for abandoned checkouts (orders still pending
+long after the payment page was shown), deleting them unless asked to
+archive.
+"""
+import gzip
+import json
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import rollups
+from .models import Order, OrderItem, ArchivedOrder
+
+
+ARCHIVE_DIR = 'archive/orders'
+
+
+def order_snapshot(order):
+    """Plain-dict copy of an order with its items and payment"""
+    payment = getattr(order, 'payment', None)
+    return {
+        'order_id': order.order_id,
+        'customer_name': order.customer_name,
+        'email': order.email,
+        'phone': order.phone,
+        'address_line1': order.address_line1,
+        'address_line2': order.address_line2,
+        'city': order.city,
+        'state': order.state,
+        'pincode': order.pincode,
+        'country': order.country,
+        'total_amount': str(order.total_amount),
+        'payment_status': order.payment_status,
+        'created_at': order.created_at.isoformat(),
+        'items': [
+            {
+                'book_id': item.book_id,
+                'title': item.book.title,
+                'quantity': item.quantity,
+                'price': str(item.price),
+            }
+            for item in order.items.all()
+        ],
+        'payment': payment and {
+            'upi_transaction_id': payment.upi_transaction_id,
+            'payment_reference': payment.payment_reference,
+            'payment_screenshot': payment.payment_screenshot.name or '',
+            'amount': str(payment.amount),
+            'status': payment.status,
+            'created_at': payment.created_at.isoformat(),
+            'verified_at': payment.verified_at and payment.verified_at.isoformat(),
+        },
+    }
+
+
+def archive_batch(order_pks, to_file=False):
+    """Archive one batch of orders in a single transaction; returns the count"""
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(pk__in=order_pks)
+            .select_related('payment')
+            .prefetch_related('items__book')
+            .select_for_update(of=('self',))
+        )
+        if not orders:
+            return 0
+        snapshots = [order_snapshot(order) for order in orders]
+
+        archive_file = ''
+        if to_file:
+            lines = ''.join(json.dumps(s, cls=DjangoJSONEncoder) + '\n' for s in snapshots)
+            stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+            archive_file = default_storage.save(
+                f"{ARCHIVE_DIR}/{stamp}.jsonl.gz",
+                ContentFile(gzip.compress(lines.encode('utf-8'))),
+            )
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                order_id=order.order_id,
+                customer_name=order.customer_name,
+                email=order.email,
+                phone=order.phone,
+                total_amount=order.total_amount,
+                payment_status=order.payment_status,
+                created_at=order.created_at,
+                data={} if to_file else snapshot,
+                archive_file=archive_file,
+            )
+            for order, snapshot in zip(orders, snapshots)
+        ])
+        Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+    return len(orders)
+
+
+@dataclass
+class PurgeResult:
+    orders: int = 0
+    items: int = 0
+    units: int = 0
+    value: Decimal = Decimal('0')
+
+    def add(self, other):
+        self.orders += other.orders
+        self.items += other.items
+        self.units += other.units
+        self.value += other.value
+
+
+def purge_batch(order_pks, archive=False, to_file=False):
+    """
+    Remove one batch of abandoned orders in a single transaction.
+
+    Orders that left 'pending' since they were picked (the customer paid
+    after all) are skipped. Pending orders hold no stock, as payment_callback
+    only deducts it on completion, so nothing has to be put back; the
+    result counts the units they had reserved in the cart all the same.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(pk__in=order_pks, payment_status='pending')
+            .select_for_update().only('pk', 'created_at', 'total_amount', 'payment_status')
+        )
+        if not orders:
+            return PurgeResult()
+        pks = [order.pk for order in orders]
+        totals = OrderItem.objects.filter(order_id__in=pks).aggregate(items=Count('pk'), units=Sum('quantity'))
+        result = PurgeResult(
+            orders=len(orders), items=totals['items'], units=totals['units'] or 0,
+            value=sum((order.total_amount for order in orders), Decimal('0')),
+        )
+        if archive:
+            # Archived orders stay in the rollups (rollups.rebuild counts them)
+            archive_batch(pks, to_file=to_file)
+        else:
+            Order.objects.filter(pk__in=pks).delete()
+            rollups.record_transitions([(order, 'pending', None) for order in orders])
+    return result
+
+
+def load_archived(archived):
+    """Full record for an ArchivedOrder, reading its JSONL file when needed"""
+    if archived.data or not archived.archive_file:
+        return archived.data
+    with default_storage.open(archived.archive_file, 'rb') as f:
+        for line in gzip.decompress(f.read()).decode('utf-8').splitlines():
+            record = json.loads(line)
+            if record['order_id'] == archived.order_id:
+                return record
+    return {}
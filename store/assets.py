@@ -0,0 +1,161 @@
+"""
+Minify/bundle helpers and critical CSS extraction used by the build_assets
+command and the store_assets template tags.
+
+bundle_url() and critical_css() are cached for the life of the process, like
+the staticfiles manifest itself: after re-running build_assets/collectstatic,
+restart the workers (every deploy does).
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.template.loader import get_template
+
+
+DIST_PREFIX = 'dist'
+CRITICAL_CSS_NAME = 'critical.css'
+
+# Interaction-only states never matter for first paint
+STATEFUL_PSEUDO = re.compile(r':(hover|focus|focus-within|focus-visible|active|visited|checked|disabled)\b')
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Conservative JS minification: drop whole-line comments and indentation"""
+    lines, comment = [], []
+    for line in source.splitlines():
+        line = line.strip()
+        if comment or line.startswith('/*'):
+            comment.append(line)
+            end = line.find('*/', 2 if len(comment) == 1 else 0)
+            if end == -1:
+                continue
+            if end + 2 < len(line):
+                # Code follows the comment on its last line: keep the lines as written
+                lines.extend(comment)
+            comment = []
+        elif line and not line.startswith('//'):
+            lines.append(line)
+    # An unterminated comment is left for the browser to report
+    lines.extend(comment)
+    return '\n'.join(line for line in lines if line)
+
+
+def build_bundle(sources):
+    """Concatenate and minify a list of static source paths"""
+    parts = []
+    for source in sources:
+        path = finders.find(source)
+        if not path:
+            raise FileNotFoundError(f"Static source '{source}' not found")
+        with open(path, encoding='utf-8') as f:
+            parts.append(f.read())
+    if sources[0].endswith('.css'):
+        return minify_css('\n'.join(parts))
+    return ';\n'.join(minify_js(part) for part in parts)
+
+
+def _split_blocks(css):
+    """Yield (prelude, body) for each top-level block of minified CSS"""
+    depth = 0
+    start = 0
+    prelude = None
+    for i, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude = css[start:i].strip()
+                start = i + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield prelude, css[start:i]
+                start = i + 1
+
+
+def template_selectors(template_names):
+    """Collect tag names, classes and ids that appear in the given templates"""
+    tags, classes, ids = {'html', 'body'}, set(), set()
+    for name in template_names:
+        with open(get_template(name).origin.name, encoding='utf-8') as f:
+            source = f.read()
+        tags.update(t.lower() for t in re.findall(r'<([a-zA-Z][\w-]*)', source))
+        for value in re.findall(r'class="([^"]*)"', source):
+            classes.update(re.sub(r'{[{%].*?[%}]}', ' ', value).split())
+        for value in re.findall(r'id="([^"]*)"', source):
+            ids.update(re.sub(r'{[{%].*?[%}]}', ' ', value).split())
+    return tags, classes, ids
+
+
+def _selector_used(selector, tags, classes, ids):
+    selector = selector.strip()
+    if selector in (':root', '*'):
+        return True
+    if STATEFUL_PSEUDO.search(selector):
+        return False
+    selector = re.sub(r'::?[\w-]+(\([^)]*\))?', '', selector)
+    selector = re.sub(r'\[[^\]]*\]', '', selector)
+    needed_classes = set(re.findall(r'\.([\w-]+)', selector))
+    needed_ids = set(re.findall(r'#([\w-]+)', selector))
+    needed_tags = {t.lower() for t in re.findall(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)', selector)}
+    return needed_classes <= classes and needed_ids <= ids and needed_tags <= tags
+
+
+def extract_critical_css(css, template_names):
+    """Keep only the rules whose selectors can match markup in template_names"""
+    used = template_selectors(template_names)
+
+    def walk(block_css):
+        kept = []
+        for prelude, body in _split_blocks(block_css):
+            if prelude.startswith('@media') or prelude.startswith('@supports'):
+                inner = walk(body)
+                if inner:
+                    kept.append(f"{prelude}{{{inner}}}")
+            elif prelude.startswith('@font-face'):
+                kept.append(f"{prelude}{{{body}}}")
+            elif prelude.startswith('@'):
+                continue
+            elif any(_selector_used(s, *used) for s in prelude.split(',')):
+                kept.append(f"{prelude}{{{body}}}")
+        return ''.join(kept)
+
+    return walk(css)
+
+
+@lru_cache(maxsize=None)
+def bundle_url(name):
+    """URL of a built bundle, or of its first source when it hasn't been built (cached per process)"""
+    built = f"{DIST_PREFIX}/{name}"
+    try:
+        if not settings.DEBUG or finders.find(built):
+            return static(built)
+    except ValueError:
+        # Not in the staticfiles manifest: build_assets wasn't run
+        pass
+    return static(settings.ASSET_BUNDLES[name][0])
+
+
+@lru_cache(maxsize=None)
+def critical_css():
+    """Contents of the extracted critical CSS, or '' when it hasn't been built (cached per process)"""
+    name = f"{DIST_PREFIX}/{CRITICAL_CSS_NAME}"
+    path = finders.find(name)
+    if not path and staticfiles_storage.exists(name):
+        path = staticfiles_storage.path(name)
+    if not path:
+        return ''
+    with open(path, encoding='utf-8') as f:
+        return f.read()
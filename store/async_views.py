@@ -0,0 +1,89 @@
+"""
+Async versions of the read-only catalog views, routed instead of the ones in
+views.py when ASYNC_CATALOG_VIEWS is on (asgi.py turns it on).
+
+Everything a template touches is fetched up front: lazy querysets can't be
+evaluated from async code.
+"""
+import asyncio
+
+from django.contrib.sitemaps.views import sitemap as sitemap_view
+from django.db.utils import OperationalError
+from django.http import Http404
+from django.shortcuts import render
+
+from .models import Book, BookRecommendation, Order, AboutSection, SocialMedia, Review, SimilarBook
+from .sitemaps import BookSitemap
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def home(request):
+    """Display all books on the homepage"""
+    try:
+        books, about, social_links = await asyncio.gather(
+            _alist(Book.objects.all()),
+            AboutSection.objects.filter(is_active=True).afirst(),
+            _alist(SocialMedia.objects.filter(is_active=True)),
+        )
+    except (OperationalError, Exception) as e:
+        # Catch ProgrammingError (missing tables) and other DB issues
+        books = []
+        about = None
+        social_links = []
+        db_error_msg = str(e)
+        print(f"DB Error in home: {e}")
+    else:
+        db_error_msg = None
+
+    return render(request, 'store/index.html', {
+        'books': books,
+        'about': about,
+        'social_links': social_links,
+        'db_error_msg': db_error_msg,
+        'db_error': bool(db_error_msg)
+    })
+
+
+async def book_detail(request, pk):
+    """Display detailed view of a single book"""
+    try:
+        book, social_links, reviews, recommendations, similar = await asyncio.gather(
+            Book.objects.filter(pk=pk).afirst(),
+            _alist(SocialMedia.objects.filter(is_active=True)),
+            _alist(Review.objects.filter(book_id=pk)),
+            _alist(BookRecommendation.objects.filter(book_id=pk).select_related('recommended')),
+            _alist(SimilarBook.objects.filter(book_id=pk).select_related('recommended')),
+        )
+    except OperationalError:
+        return render(request, 'store/index.html', {'db_error': True})
+    if book is None:
+        raise Http404("No Book matches the given query.")
+
+    also_bought = [r.recommended for r in recommendations]
+    return render(request, 'store/book_detail.html', {
+        'book': book,
+        'social_links': social_links,
+        'reviews': reviews,
+        'also_bought': also_bought,
+        'similar_books': [s.recommended for s in similar if s.recommended not in also_bought],
+    })
+
+
+async def order_success(request, order_id):
+    """Display order success page"""
+    try:
+        order = await Order.objects.prefetch_related('items__book').aget(order_id=order_id)
+    except Order.DoesNotExist:
+        raise Http404("No Order matches the given query.")
+    return render(request, 'store/order_success.html', {'order': order})
+
+
+async def sitemap(request, sitemaps):
+    """Sitemap with the book list loaded asynchronously before rendering"""
+    books = BookSitemap()
+    items = await _alist(books.items())
+    books.items = lambda: items
+    return sitemap_view(request, sitemaps={**sitemaps, 'books': books})
@@ -0,0 +1,207 @@
+"""
+Streaming bulk import of books from CSV or XLSX.
+
+Rows are read one at a time (csv module / openpyxl read-only mode) and
+upserted in batches keyed on (title, author). Cover images given as http(s)
+URLs are downloaded on a small thread pool before each batch's transaction
+opens, so slow downloads never hold it (or its row locks) open.
+"""
+import csv
+import io
+import os
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from . import placeholders, prerender, similar
+from .models import Book
+
+
+COLUMNS = {
+    'title': 'title',
+    'author': 'author',
+    'description': 'description',
+    'price': 'price',
+    'stock': 'stock',
+    'image_url': 'image_url',
+    'cover': 'image_url',
+    'cover_url': 'image_url',
+}
+UPDATE_FIELDS = ['description', 'price', 'stock']
+COVER_SCHEMES = {'http', 'https'}
+# DecimalField(max_digits=10, decimal_places=2)
+MAX_PRICE = Decimal('99999999.99')
+# IntegerField on every backend
+MIN_STOCK, MAX_STOCK = -2**31, 2**31 - 1
+MAX_COVER_BYTES = 10 * 1024 * 1024
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    covers: int = 0
+    book_ids: set = field(default_factory=set)
+    errors: list = field(default_factory=list)  # (row number, message)
+
+
+def iter_rows(fileobj, filename):
+    """Yield (row number, {column: value}) without loading the whole file"""
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h or '').strip().lower() for h in next(rows, [])]
+            for number, values in enumerate(rows, start=2):
+                if any(v not in (None, '') for v in values):
+                    yield number, dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        if isinstance(fileobj.read(0), bytes):
+            fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        reader = csv.DictReader(fileobj)
+        reader.fieldnames = [h.strip().lower() for h in reader.fieldnames or []]
+        for number, row in enumerate(reader, start=2):
+            yield number, row
+
+
+def clean_row(raw):
+    """Map a raw row onto Book fields; raises ValueError with a readable message"""
+    row = {}
+    for column, value in raw.items():
+        if column in COLUMNS and value is not None:
+            row[COLUMNS[column]] = str(value).strip()
+    if not row.get('title'):
+        raise ValueError('title is required')
+    row.setdefault('author', 'Nitya')
+    row['author'] = row['author'] or 'Nitya'
+    for name in ('title', 'author'):
+        max_length = Book._meta.get_field(name).max_length
+        if len(row[name]) > max_length:
+            raise ValueError(f"{name} is longer than {max_length} characters")
+    price = _number(row.get('price'), 'price')
+    if not 0 <= price <= MAX_PRICE:
+        raise ValueError(f"price {row['price']} is out of range")
+    row['price'] = price.quantize(Decimal('0.01'))
+    stock = int(_number(row.get('stock'), 'stock'))
+    if not MIN_STOCK <= stock <= MAX_STOCK:
+        raise ValueError(f"stock {row['stock']} is out of range")
+    row['stock'] = stock
+    row.setdefault('description', '')
+    return row
+
+
+def _number(value, name):
+    """Finite Decimal from a cell (blank is 0); raises ValueError"""
+    try:
+        number = Decimal(value or '0')
+    except InvalidOperation:
+        number = None
+    # NaN and Infinity parse but fit no column
+    if number is None or not number.is_finite():
+        raise ValueError(f"invalid {name} {value!r}")
+    return number
+
+
+def fetch_cover(url, timeout=15):
+    # urlopen would also read file:// and ftp:// URLs
+    if urllib.parse.urlsplit(url).scheme.lower() not in COVER_SCHEMES:
+        raise ValueError('only http and https URLs are allowed')
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = response.read(MAX_COVER_BYTES + 1)
+    if len(data) > MAX_COVER_BYTES:
+        raise ValueError(f"larger than {MAX_COVER_BYTES // (1024 * 1024)} MB")
+    return data
+
+
+def _fetch_with_placeholder(url):
+    data = fetch_cover(url)
+    return data, placeholders.generate(io.BytesIO(data))
+
+
+def _attach_covers(pending, pool, result):
+    """Download covers concurrently and attach them to their (not yet saved) books"""
+    futures = [(number, book, url, pool.submit(_fetch_with_placeholder, url)) for number, book, url in pending]
+    attached = []
+    for number, book, url, future in futures:
+        try:
+            data, placeholder = future.result()
+        except Exception as e:
+            result.errors.append((number, f"cover {url}: {e}"))
+            continue
+        # New books have no pk yet
+        name = os.path.basename(url.split('?')[0]) or f"book-{number}.jpg"
+        book.image.save(name, ContentFile(data), save=False)
+        book.placeholder = placeholder
+        attached.append(book)
+    result.covers += len(attached)
+    return attached
+
+
+def _flush(batch, pool, result):
+    keys = {(row['title'], row['author']) for _, row in batch}
+    existing = {}
+    for book in Book.objects.filter(title__in={t for t, _ in keys}):
+        existing.setdefault((book.title, book.author), book)
+
+    to_create, to_update, covers = [], {}, []
+    for number, row in batch:
+        key = (row['title'], row['author'])
+        book = existing.get(key)
+        if book is None:
+            book = Book(title=row['title'], author=row['author'])
+            existing[key] = book
+            to_create.append(book)
+        elif book.pk:
+            to_update[book.pk] = book
+        for name in UPDATE_FIELDS:
+            setattr(book, name, row[name])
+        if row.get('image_url') and not book.image:
+            covers.append((number, book, row['image_url']))
+
+    # New books get their cover in the INSERT, existing ones in the UPDATE
+    with_covers = _attach_covers(covers, pool, result) if covers else []
+    update_fields = UPDATE_FIELDS + ['image', 'placeholder'] if any(book.pk for book in with_covers) else UPDATE_FIELDS
+    with transaction.atomic():
+        Book.objects.bulk_create(to_create)
+        Book.objects.bulk_update(list(to_update.values()), update_fields)
+    result.created += len(to_create)
+    result.updated += len(to_update)
+    result.book_ids.update(book.pk for book in to_create)
+    result.book_ids.update(to_update)
+
+
+def import_books(rows, batch_size=500, cover_workers=8, progress=None):
+    """Upsert books from iter_rows() output; progress(result) runs after each batch"""
+    result = ImportResult()
+    batch = []
+    with ThreadPoolExecutor(max_workers=cover_workers, thread_name_prefix='covers') as pool:
+        for number, raw in rows:
+            result.rows += 1
+            try:
+                batch.append((number, clean_row(raw)))
+            except ValueError as e:
+                result.errors.append((number, str(e)))
+            if len(batch) >= batch_size:
+                _flush(batch, pool, result)
+                batch = []
+                if progress:
+                    progress(result)
+        if batch:
+            _flush(batch, pool, result)
+            if progress:
+                progress(result)
+    # bulk_create/bulk_update send no signals
+    if result.book_ids:
+        prerender.schedule(render=prerender.STATIC_PATHS + [prerender.book_path(pk) for pk in result.book_ids])
+        similar.refresh(result.book_ids)
+    return result
@@ -0,0 +1,148 @@
+"""
+Brotli/gzip compression for dynamic responses.
+
+WhiteNoise serves precompressed static files; CompressionMiddleware covers
+what the views render (the book grid, payment.html with its inline QR code,
+JSON). It picks Brotli or gzip from Accept-Encoding, leaves small bodies,
+binary types and already-encoded responses alone, and compresses streaming
+responses chunk by chunk.
+
+BREACH: a page that rendered a CSRF token is only ever gzipped, using
+Django's randomised gzip header padding so its compressed length doesn't
+leak the secret. Brotli has no equivalent padding, so it is only used for
+token-free pages. Django masks the token differently on every response as
+well.
+"""
+import gzip
+import re
+import secrets
+
+import brotli
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import get_random_string
+from django.utils.text import StreamingBuffer, compress_sequence, compress_string
+
+
+MIN_LENGTH = 200
+# Same padding GZipMiddleware uses
+MAX_RANDOM_BYTES = 100
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml|xhtml\+xml|rss\+xml|atom\+xml|[\w.-]+\+json)|image/svg\+xml)'
+)
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        match = re.search(r'q=([\d.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(request, breach_sensitive):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if not breach_sensitive and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def breach_sensitive(request):
+    # get_token() (behind {% csrf_token %}) adds this key; CsrfViewMiddleware
+    # resets it to False once the cookie is set, but never removes it
+    return 'CSRF_COOKIE_NEEDS_UPDATE' in request.META
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def abrotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+    async for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def agzip_sequence(sequence):
+    """compress_sequence() for async iterators, with the same random header padding"""
+    buf = StreamingBuffer()
+    filename = get_random_string(secrets.randbelow(MAX_RANDOM_BYTES) + 1).encode()
+    with gzip.GzipFile(filename=filename, mode='wb', compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        yield buf.read()
+        async for chunk in sequence:
+            zfile.write(chunk)
+            data = buf.read()
+            if data:
+                yield data
+    yield buf.read()
+
+
+def compressible(response):
+    if response.has_header('Content-Encoding') or isinstance(response, FileResponse):
+        return False
+    if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+        return False
+    return response.streaming or len(response.content) >= MIN_LENGTH
+
+
+class CompressionMiddleware:
+    """Compress dynamic responses with Brotli or gzip (see module docstring)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request, breach_sensitive(request))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            content = response.streaming_content
+            if encoding == 'br':
+                response.streaming_content = abrotli_sequence(content) if response.is_async else brotli_sequence(content)
+            elif response.is_async:
+                response.streaming_content = agzip_sequence(content)
+            else:
+                response.streaming_content = compress_sequence(content, max_random_bytes=MAX_RANDOM_BYTES)
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=MAX_RANDOM_BYTES)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag names the uncompressed bytes
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
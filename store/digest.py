@@ -0,0 +1,76 @@
+"""
+Owner digest: confirmed orders are appended to OwnerDigestEntry as their
+confirmation emails go out, and send_pending() mails the owner one summary
+of everything appended since the last run.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import OwnerDigestEntry
+
+
+def append(order, item_lines):
+    """Queue an order for the next digest; an order is only ever reported once"""
+    OwnerDigestEntry.objects.bulk_create([
+        OwnerDigestEntry(
+            order_id=order.order_id,
+            customer_name=order.customer_name,
+            email=order.email,
+            phone=order.phone,
+            city=order.city,
+            total_amount=order.total_amount,
+            items='\n'.join(item_lines),
+        )
+    ], ignore_conflicts=True)
+
+
+def send_pending(recipients=None, keep_days=None):
+    """Email the pending entries as one digest and mark them sent; returns how many were sent"""
+    recipients = settings.OWNER_DIGEST_RECIPIENTS if recipients is None else recipients
+    keep_days = settings.OWNER_DIGEST_KEEP_DAYS if keep_days is None else keep_days
+    if not recipients:
+        return 0
+
+    # Claim the rows by marking them sent and commit straight away, so no
+    # locks are held during the SMTP round-trip; a failed send releases them
+    now = timezone.now()
+    with transaction.atomic():
+        # Concurrent runs skip rows another run is already claiming
+        entries = list(
+            OwnerDigestEntry.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True).order_by('created_at')
+        )
+        if not entries:
+            return 0
+        claimed = OwnerDigestEntry.objects.filter(pk__in=[entry.pk for entry in entries])
+        claimed.update(sent_at=now)
+
+    total = sum(entry.total_amount for entry in entries)
+    for entry in entries:
+        entry.item_lines = entry.items.splitlines()
+    html_message = render_to_string('store/emails/owner_digest.html', {
+        'entries': entries,
+        'total': total,
+        'since': entries[0].created_at,
+    })
+    try:
+        send_mail(
+            subject=f"Nityawrites orders digest: {len(entries)} order(s), ₹{total}",
+            message=strip_tags(html_message),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=recipients,
+            html_message=html_message,
+            fail_silently=False,
+        )
+    except Exception:
+        claimed.update(sent_at=None)
+        raise
+
+    OwnerDigestEntry.objects.filter(sent_at__lt=now - timedelta(days=keep_days)).delete()
+    return len(entries)
@@ -0,0 +1,118 @@
+"""
+Direct-to-storage uploads for payment screenshots and book covers.
+
+The server signs a short-lived token naming the object to create; the
+browser sends the file straight to the storage backend (Cloudinary's signed
+upload API, or the local stand-in endpoint when media lives on a
+FileSystemStorage) and then hands the token back to a confirm endpoint,
+which checks the upload really happened and attaches the stored name to the
+Payment or Book. The web worker never sees the file bytes.
+"""
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+
+SALT = 'store.direct_upload'
+
+# Where each kind of upload goes, mirroring the model fields' upload_to
+KINDS = {
+    # Same 1600px cap prepare_screenshot applies to proxied uploads
+    'payment': {'folder': 'payment_screenshots', 'transformation': 'c_limit,h_1600,w_1600'},
+    'book': {'folder': 'books', 'transformation': None},
+}
+
+
+# Extensions a locally stored upload may get; anything else would let a file
+# PIL accepts be served as e.g. .html or .svg
+EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+# Formats the local endpoint accepts, matching those extensions
+IMAGE_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+
+class UploadError(Exception):
+    """Token expired/tampered, or the object it names was never uploaded"""
+
+
+def backend():
+    if settings.DIRECT_UPLOAD_BACKEND:
+        return settings.DIRECT_UPLOAD_BACKEND
+    if settings.STORAGES['default']['BACKEND'].endswith('CloudinaryStorage'):
+        return 'cloudinary'
+    return 'local'
+
+
+def issue(kind, target, filename):
+    """Token plus the form the browser should POST the file with"""
+    folder = KINDS[kind]['folder']
+    if backend() == 'cloudinary':
+        return _issue_cloudinary(kind, target, folder)
+    ext = os.path.splitext(filename or '')[1].lower()
+    name = f"{folder}/{uuid.uuid4().hex}{ext if ext in EXTENSIONS else ''}"
+    token = signing.dumps({'kind': kind, 'target': target, 'name': name}, salt=SALT)
+    return {
+        'token': token,
+        'upload': {'url': reverse('direct_upload_local'), 'fields': {'token': token}, 'file_field': 'file'},
+    }
+
+
+def _issue_cloudinary(kind, target, folder):
+    import cloudinary
+    import cloudinary.utils
+    from cloudinary_storage import app_settings
+
+    # MediaCloudinaryStorage stores objects under the media prefix; the
+    # public_id is also the name it reads back
+    prefix = app_settings.PREFIX.strip('/')
+    name = f"{prefix}/{folder}/{uuid.uuid4().hex}" if prefix else f"{folder}/{uuid.uuid4().hex}"
+    params = {'public_id': name, 'timestamp': int(time.time()), 'tags': app_settings.MEDIA_TAG}
+    if KINDS[kind]['transformation']:
+        params['transformation'] = KINDS[kind]['transformation']
+    config = cloudinary.config()
+    fields = {
+        **params,
+        'signature': cloudinary.utils.api_sign_request(params, config.api_secret),
+        'api_key': config.api_key,
+    }
+    token = signing.dumps({'kind': kind, 'target': target, 'name': name}, salt=SALT)
+    return {
+        'token': token,
+        'upload': {'url': cloudinary.utils.cloudinary_api_url('upload', resource_type='image'),
+                   'fields': fields, 'file_field': 'file'},
+    }
+
+
+def read_token(token):
+    try:
+        return signing.loads(token, salt=SALT, max_age=settings.DIRECT_UPLOAD_TOKEN_AGE)
+    except signing.SignatureExpired:
+        raise UploadError('Upload token expired, please try again.')
+    except signing.BadSignature:
+        raise UploadError('Invalid upload token.')
+
+
+def confirm(token, version=None, signature=None):
+    """Payload of a token whose object has been uploaded; raises UploadError otherwise"""
+    payload = read_token(token)
+    if backend() == 'cloudinary':
+        import cloudinary.api
+        import cloudinary.uploader
+        import cloudinary.utils
+
+        # Cloudinary signs its upload response; a valid signature for our
+        # public_id proves the object exists
+        if not (version and signature and
+                cloudinary.utils.verify_api_response_signature(payload['name'], version, signature)):
+            raise UploadError('Upload could not be verified.')
+        # The signed upload can't carry a size limit, so check what was stored
+        if cloudinary.api.resource(payload['name'])['bytes'] > settings.DIRECT_UPLOAD_MAX_BYTES:
+            cloudinary.uploader.destroy(payload['name'], invalidate=True)
+            raise UploadError('File too large.')
+    elif not default_storage.exists(payload['name']):
+        raise UploadError('File was not uploaded.')
+    return payload
@@ -0,0 +1,71 @@
+"""
+Resource hints for storefront pages.
+
+Templates register what the browser should fetch early (the stylesheet
+bundle, the covers visible without scrolling) and the hosts it should
+connect to ahead of time. The hints are written into the page head as <link>
+tags, so pre-rendered pages carry them too, and ResourceHintsMiddleware
+repeats them in a Link header, which edges with Early Hints support (e.g.
+Cloudflare) replay as a 103 response while the page is still being made.
+Django can't send a 103 itself under WSGI or ASGI.
+"""
+from urllib.parse import urlsplit
+
+from django.utils.html import format_html, format_html_join
+
+from .assets import bundle_url
+from .media import media_url
+
+
+# (origin, crossorigin): third-party hosts every page loads from
+PRECONNECT = [
+    ('https://fonts.googleapis.com', False),
+    ('https://fonts.gstatic.com', True),  # font files are CORS requests
+    ('https://cdnjs.cloudflare.com', False),
+]
+
+
+def _hints(request):
+    if not hasattr(request, 'resource_hints'):
+        request.resource_hints = {}
+    return request.resource_hints
+
+
+def add(request, url, rel='preload', **params):
+    """Register a hint for the Link header; params become attributes (as_='image' -> as=image)"""
+    if request is not None and url:
+        _hints(request).setdefault((url, rel), {k.rstrip('_'): v for k, v in params.items() if v})
+
+
+def media_origin():
+    """scheme://host of media URLs when they're on another host (Cloudinary), else None"""
+    url = urlsplit(media_url('origin'))
+    return f"{url.scheme}://{url.netloc}" if url.netloc else None
+
+
+def page_hints(request):
+    """Register the hints every page shares; returns the preconnect origins"""
+    origins = list(PRECONNECT)
+    media = media_origin()
+    if media:
+        origins.append((media, False))
+    for origin, crossorigin in origins:
+        add(request, origin, 'preconnect', crossorigin=crossorigin and 'anonymous')
+    add(request, bundle_url('site.min.css'), as_='style')
+    return origins
+
+
+def link_tags(origins):
+    return format_html_join('\n  ', '<link rel="preconnect" href="{}"{}>', (
+        (origin, format_html(' crossorigin') if crossorigin else '') for origin, crossorigin in origins
+    ))
+
+
+def link_header(request):
+    links = []
+    for (url, rel), params in getattr(request, 'resource_hints', {}).items():
+        link = f"<{url}>; rel={rel}"
+        for name, value in params.items():
+            link += f"; {name}" if value is True else f"; {name}={value}"
+        links.append(link)
+    return ', '.join(links)
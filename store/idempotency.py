@@ -0,0 +1,164 @@
+"""
+Idempotency keys for order placement and the payment callback.
+
+A client names each logical request with a key: the checkout form carries a
+fresh one per page view (or send an Idempotency-Key header), and the payment
+callback defaults to one per order. The view runs at most once per key and
+session; repeats get the first response back. Requests without a session run
+unguarded, since keys are only unique within one.
+
+- Responses are kept in IdempotencyKey for IDEMPOTENCY_KEY_TTL seconds and
+  in the cache, so a retry storm costs one cache lookup per request.
+- The first request claims the key by inserting its row (status_code NULL)
+  in a short transaction of its own, then runs the view in another and
+  stores the response in the same one, so no lock is held while the view
+  runs. A concurrent duplicate sees the claim and polls for up to
+  IDEMPOTENCY_WAIT seconds for the response to replay, else gets a 409.
+  A claim older than IDEMPOTENCY_CLAIM_TIMEOUT is taken to be abandoned.
+- If the view raises or answers with a 5xx, its writes are rolled back and
+  the claim deleted, so the client can really retry.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+POLL_INTERVAL = 0.2
+
+
+def make_key(scope, request, client_key):
+    """Key row name: scoped to the endpoint and session, so keys can't be replayed across browsers"""
+    session_key = request.session.session_key or ''
+    return hashlib.sha256(f"{scope}\0{session_key}\0{client_key}".encode()).hexdigest()
+
+
+def cache_key(key):
+    return f"idempotency:{key}"
+
+
+def stored(record):
+    return {
+        'status': record.status_code,
+        'content_type': record.content_type,
+        'location': record.location,
+        'content': bytes(record.content),
+    }
+
+
+def replay(saved):
+    response = HttpResponse(saved['content'], status=saved['status'], content_type=saved['content_type'] or None)
+    if saved['location']:
+        response['Location'] = saved['location']
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def purge_expired():
+    """Delete keys past IDEMPOTENCY_KEY_TTL; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    return IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def claim(key):
+    """
+    (record, None) if this request should run the view, or (None, saved
+    response) to replay; (None, None) if another request is still running it.
+    """
+    ttl = settings.IDEMPOTENCY_KEY_TTL
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.select_for_update().get_or_create(key=key)
+        if created:
+            return record, None
+        age = timezone.now() - record.created_at
+        if record.status_code is not None and age <= timedelta(seconds=ttl):
+            return None, stored(record)
+        if record.status_code is not None or age > timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIMEOUT):
+            # Expired, or claimed by a request that never finished
+            record.status_code, record.content_type, record.location, record.content = None, '', '', b''
+            record.created_at = timezone.now()
+            record.save()
+            return record, None
+    return None, wait_for(record.pk)
+
+
+def wait_for(pk):
+    """Poll a claimed key for up to IDEMPOTENCY_WAIT seconds; its saved response, or None"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=pk).first()
+        if record is None:
+            # The first request failed; the client may retry
+            return None
+        if record.status_code is not None:
+            return stored(record)
+    return None
+
+
+def idempotent(scope, default_key=None):
+    """
+    Run a POST view once per idempotency key (see module docstring).
+
+    default_key(request) supplies a key when the client sends none; requests
+    with no key at all run as before.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view(request, *args, **kwargs)
+            client_key = request.headers.get(HEADER) or request.POST.get(FIELD)
+            if not client_key and default_key:
+                client_key = default_key(request)
+            if not client_key or not request.session.session_key:
+                # Without a session every such client would share one key namespace
+                return view(request, *args, **kwargs)
+
+            key = make_key(scope, request, client_key[:200])
+            ttl = settings.IDEMPOTENCY_KEY_TTL
+            saved = cache.get(cache_key(key))
+            if saved:
+                return replay(saved)
+            record, saved = claim(key)
+            if saved:
+                cache.set(cache_key(key), saved, ttl)
+                return replay(saved)
+            if record is None:
+                response = HttpResponse('This request is still being processed, please retry shortly.', status=409)
+                response['Retry-After'] = '1'
+                return response
+
+            try:
+                with transaction.atomic():
+                    response = view(request, *args, **kwargs)
+                    failed = response.status_code >= 500 or response.streaming
+                    if failed:
+                        transaction.set_rollback(True)
+                    else:
+                        record.status_code = response.status_code
+                        record.content_type = response.get('Content-Type', '')
+                        record.location = response.get('Location', '')
+                        record.content = response.content
+                        record.created_at = timezone.now()
+                        record.save()
+            except BaseException:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                raise
+            if failed:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                return response
+            cache.set(cache_key(key), stored(record), ttl)
+            return response
+        return wrapper
+    return decorator
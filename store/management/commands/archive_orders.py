@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.archive import archive_batch
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Move orders older than --days with a final status into ArchivedOrder, "
+        "in small transactions, so the live order tables stay small."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180, help='Archive orders older than this many days.')
+        parser.add_argument(
+            '--status', action='append', dest='statuses',
+            help='Payment status to archive (repeatable; default: completed, verified, failed).',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--to-file', action='store_true',
+            help='Keep full records in gzipped JSONL files in storage; only the searchable columns stay in the DB.',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        statuses = options['statuses'] or ['completed', 'verified', 'failed']
+        candidates = Order.objects.filter(payment_status__in=statuses, created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} order(s) older than {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        total = 0
+        last_pk = 0
+        while True:
+            # Keyset over pk so each batch starts where the last one ended
+            pks = list(
+                candidates.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            total += archive_batch(pks, to_file=options['to_file'])
+            self.stdout.write(f"  archived {total} order(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} order(s) older than {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+SERVERS = {
+    # ASGI: async catalog views under uvicorn
+    'uvicorn': lambda port, workers, threads: [
+        sys.executable, '-m', 'uvicorn', 'nityawrites.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+    ],
+    # WSGI: the current sync deployment under threaded gunicorn
+    'gunicorn': lambda port, workers, threads: [
+        sys.executable, '-m', 'gunicorn', 'nityawrites.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+        '--worker-class', 'gthread', '--log-level', 'warning',
+    ],
+}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def fetch(port, path):
+    """One HTTP/1.1 GET on a fresh connection; returns the status code"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def run_load(port, paths, clients, duration):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(n):
+        nonlocal errors
+        i = n
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, path)
+            except (OSError, ValueError, IndexError):
+                status = 0
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return latencies, errors
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare catalog throughput under uvicorn (ASGI, async views) and gunicorn "
+        "(WSGI, sync views) with many concurrent clients. Needs uvicorn and gunicorn "
+        "installed; both servers use the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help='Concurrent clients.')
+        parser.add_argument('--duration', type=float, default=15, help='Seconds of load per server.')
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes per server.')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker.')
+        parser.add_argument('--port', type=int, default=8310, help='First port to bind.')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable).')
+        parser.add_argument('--server', action='append', dest='servers', choices=sorted(SERVERS))
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/sitemap.xml']
+        servers = options['servers'] or ['uvicorn', 'gunicorn']
+        self.stdout.write(
+            f"{options['clients']} clients x {options['duration']}s against {', '.join(paths)}"
+        )
+        self.stdout.write(f"{'server':<10}{'req/s':>10}{'ok':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+        for offset, name in enumerate(servers):
+            port = options['port'] + offset
+            argv = SERVERS[name](port, options['workers'], options['threads'])
+            env = {**os.environ, 'ASYNC_CATALOG_VIEWS': '1' if name == 'uvicorn' else '0'}
+            proc = subprocess.Popen(argv, cwd=settings.BASE_DIR, env=env)
+            try:
+                if not wait_for_port(port, 20):
+                    raise CommandError(f"{name} did not start (is it installed?)")
+                latencies, errors = asyncio.run(
+                    run_load(port, paths, options['clients'], options['duration'])
+                )
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+            rate = len(latencies) / options['duration']
+            self.stdout.write(
+                f"{name:<10}{rate:>10.1f}{len(latencies):>8}{errors:>8}"
+                f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}{percentile(latencies, 99):>10.1f}"
+            )
@@ -0,0 +1,114 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template import engines
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from store.models import Book, Order, OrderItem, Payment, Review, SocialMedia
+
+
+def _cached_queryset(model, objects):
+    """A queryset that already holds its results, so templates never hit the DB"""
+    qs = model.objects.none()
+    qs._result_cache = list(objects)
+    qs._prefetch_done = True
+    return qs
+
+
+def _no_queries(execute, sql, params, many, context):
+    raise AssertionError(f"Template rendering ran a query: {sql}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every customer-facing template with in-memory data and report "
+        "cold (parse + render) and warm (cached loader) timings per template."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Warm renders per template.')
+        parser.add_argument('--books', type=int, default=24, help='Books on the home page grid.')
+        parser.add_argument('--reviews', type=int, default=20, help='Reviews on the book detail page.')
+
+    def handle(self, *args, **options):
+        contexts = self.build_contexts(options['books'], options['reviews'])
+        request = RequestFactory().get('/', HTTP_HOST='localhost')
+        iterations = options['iterations']
+
+        self.stdout.write(f"{'template':<32}{'cold ms':>10}{'mean ms':>10}{'p95 ms':>10}")
+        for name, context in contexts.items():
+            for loader in engines['django'].engine.template_loaders:
+                if hasattr(loader, 'reset'):
+                    loader.reset()
+
+            with self.guard_queries():
+                start = time.perf_counter()
+                get_template(name).render(context, request)
+                cold = (time.perf_counter() - start) * 1000
+
+                samples = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    get_template(name).render(context, request)
+                    samples.append((time.perf_counter() - start) * 1000)
+
+            samples.sort()
+            p95 = samples[int(len(samples) * 0.95) - 1] if samples else 0
+            mean = statistics.mean(samples) if samples else 0
+            self.stdout.write(f"{name:<32}{cold:>10.3f}{mean:>10.3f}{p95:>10.3f}")
+
+    def guard_queries(self):
+        return connections['default'].execute_wrapper(_no_queries)
+
+    def build_contexts(self, book_count, review_count):
+        now = timezone.now()
+        books = [
+            Book(pk=i, title=f"Book {i}", author='Nitya', price=Decimal('299.00'), stock=i % 5,
+                 description='A story that lingers. ' * 30, image=f"books/cover-{i}.jpg", created_at=now)
+            for i in range(1, book_count + 1)
+        ]
+        book = books[0]
+        reviews = [
+            Review(pk=i, book=book, name=f"Reader {i}", rating=5, comment='Loved it. ' * 10, created_at=now)
+            for i in range(1, review_count + 1)
+        ]
+        social_links = [SocialMedia(pk=1, platform='instagram', url='https://instagram.com/nityawrites', is_active=True)]
+
+        order = Order(
+            pk=1, order_id='ORD1A2B3C4D', customer_name='Asha Rao', email='asha@example.com',
+            phone='9999999999', address_line1='12 MG Road', address_line2='Flat 4', city='Pune',
+            state='Maharashtra', pincode='411001', total_amount=Decimal('897.00'),
+            payment_status='pending', created_at=now,
+        )
+        items = [OrderItem(pk=i, order=order, book=b, quantity=1, price=b.price) for i, b in enumerate(books[:3], 1)]
+        order._prefetched_objects_cache = {'items': _cached_queryset(OrderItem, items)}
+        order.payment = Payment(pk=1, order=order, amount=order.total_amount, status='pending')
+
+        cart_items = [
+            {'id': str(b.pk), 'title': b.title, 'price': str(b.price), 'quantity': 1,
+             'total': float(b.price), 'image': ''}
+            for b in books[:3]
+        ]
+        total = sum(item['total'] for item in cart_items)
+
+        return {
+            'store/index.html': {'books': books, 'about': None, 'social_links': social_links},
+            'store/book_detail.html': {
+                'book': book, 'social_links': social_links,
+                'reviews': _cached_queryset(Review, reviews),
+            },
+            'store/cart.html': {'cart_items': cart_items, 'total': total, 'social_links': social_links},
+            'store/checkout.html': {'cart_items': cart_items, 'total': total},
+            'store/payment.html': {
+                'order': order, 'total': total, 'upi_id_debug': 'nityabhambhani@upi',
+                'qr_code': 'A' * 4000, 'upi_link': 'upi://pay',
+            },
+            'store/payment_submitted.html': {'order': order},
+            'store/order_success.html': {'order': order},
+            'store/order_failed.html': {},
+        }
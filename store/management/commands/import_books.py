@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_import import import_books, iter_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update books from a CSV or XLSX file, matched on (title, author). "
+        "Columns: title, author, description, price, stock, image_url. The file is "
+        "streamed and written in batches; cover URLs are fetched concurrently."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--cover-workers', type=int, default=8, help='Concurrent cover image downloads.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fileobj = open(path, 'rb')
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}")
+
+        def progress(result):
+            self.stdout.write(
+                f"  {result.rows} rows: {result.created} created, {result.updated} updated, "
+                f"{result.covers} covers, {len(result.errors)} errors"
+            )
+
+        with fileobj:
+            result = import_books(
+                iter_rows(fileobj, path),
+                batch_size=options['batch_size'],
+                cover_workers=options['cover_workers'],
+                progress=progress,
+            )
+
+        for number, message in result.errors:
+            self.stderr.write(f"  row {number}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.rows} rows: {result.created} created, {result.updated} updated, "
+            f"{len(result.errors)} errors."
+        ))
@@ -0,0 +1,234 @@
+import io
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from store.management.commands.bench_servers import percentile, wait_for_port
+from store.models import Book
+from store.seed import make_books, make_orders, make_reviews
+
+
+STEPS = [
+    'home', 'book_detail', 'cart_add', 'checkout',
+    'payment_process', 'upload_payment_proof', 'admin_order_verify',
+]
+ADMIN_USERNAME = 'loadtest'
+ADMIN_PASSWORD_ENV = 'LOADTEST_ADMIN_PASSWORD'
+UPLOAD_RE = re.compile(r'/payment/upload/(\d+)/')
+
+
+class Results:
+    """Thread-safe per-step latency, error and query-count collector"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.queries = {step: [] for step in STEPS}
+        self.funnels = 0
+
+    def record(self, step, elapsed_ms, ok, queries):
+        with self.lock:
+            self.latencies[step].append(elapsed_ms)
+            if not ok:
+                self.errors[step] += 1
+            if queries is not None:
+                self.queries[step].append(queries)
+
+
+class VirtualUser:
+    """One shopper walking the purchase funnel, plus an admin session to verify the order"""
+
+    def __init__(self, base_url, book_ids, screenshot, results, admin_password):
+        self.base_url = base_url.rstrip('/')
+        self.book_ids = book_ids
+        self.screenshot = screenshot
+        self.results = results
+        self.admin = requests.Session()
+        self.login_admin(admin_password)
+
+    def login_admin(self, password):
+        self.admin.get(f"{self.base_url}/admin/login/", timeout=30)
+        self.admin.post(f"{self.base_url}/admin/login/", data={
+            'username': ADMIN_USERNAME, 'password': password,
+            'csrfmiddlewaretoken': self.admin.cookies.get('csrftoken', ''), 'next': '/admin/',
+        }, allow_redirects=False, timeout=30)
+        if 'sessionid' not in self.admin.cookies:
+            raise CommandError("Could not log in the load-test admin user")
+
+    def step(self, session, name, method, path, expect, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, allow_redirects=False, timeout=60, **kwargs)
+        except requests.RequestException:
+            response = None
+        elapsed = (time.perf_counter() - start) * 1000
+        ok = response is not None and response.status_code == expect
+        queries = response.headers.get('X-DB-Queries') if response is not None else None
+        self.results.record(name, elapsed, ok, int(queries) if queries else None)
+        return response if ok else None
+
+    def run_funnel(self):
+        shop = requests.Session()
+        book_id = random.choice(self.book_ids)
+        if not self.step(shop, 'home', 'GET', '/', 200):
+            return
+        if not self.step(shop, 'book_detail', 'GET', f"/book/{book_id}/", 200):
+            return
+        if not self.step(shop, 'cart_add', 'GET', f"/cart/add/{book_id}/", 302):
+            return
+        if not self.step(shop, 'checkout', 'GET', '/checkout/', 200):
+            return
+        csrf = shop.cookies.get('csrftoken', '')
+        page = self.step(shop, 'payment_process', 'POST', '/payment/process/', 200, data={
+            'csrfmiddlewaretoken': csrf, 'name': 'Load Test', 'email': 'load@example.com',
+            'phone': '9999999999', 'address1': '12 MG Road', 'city': 'Pune',
+            'state': 'Maharashtra', 'pincode': '411001',
+        })
+        match = UPLOAD_RE.search(page.text) if page is not None else None
+        if not match:
+            return
+        order_pk = match.group(1)
+        if not self.step(shop, 'upload_payment_proof', 'POST', f"/payment/upload/{order_pk}/", 200,
+                         data={'csrfmiddlewaretoken': csrf, 'payment_reference': 'LOADTEST'},
+                         files={'payment_screenshot': ('proof.png', self.screenshot, 'image/png')}):
+            return
+        if self.step(self.admin, 'admin_order_verify', 'GET', f"/manage-order/verify/{order_pk}/", 302):
+            with self.results.lock:
+                self.results.funnels += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the purchase funnel (home -> book -> cart -> checkout -> payment -> "
+        "proof upload -> admin verify) with concurrent virtual users and report "
+        "throughput, per-step latency percentiles, error rates and DB queries. "
+        "Starts a local runserver with the locmem email backend and filesystem "
+        "media unless --base-url is given. Only runs with DEBUG on, since it "
+        "writes test data and a superuser."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users.')
+        parser.add_argument('--funnels', type=int, default=5, help='Funnels each user walks.')
+        parser.add_argument('--base-url', help='Target an already running server instead of starting one.')
+        parser.add_argument('--port', type=int, default=8320)
+        parser.add_argument('--seed-books', type=int, default=0, help='Books to add before the run.')
+        parser.add_argument('--seed-orders', type=int, default=0, help='Historical orders to add before the run.')
+        parser.add_argument('--seed-reviews', type=int, default=0, help='Reviews per seeded book.')
+        parser.add_argument('--seed-only', action='store_true', help='Seed the database and exit.')
+        parser.add_argument(
+            '--admin-password', default=os.environ.get(ADMIN_PASSWORD_ENV),
+            help=f'Password for the {ADMIN_USERNAME!r} superuser that verifies orders (default: ${ADMIN_PASSWORD_ENV}).',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            raise CommandError("Refusing to seed test data and a superuser with DEBUG off")
+        if not options['seed_only'] and not options['admin_password']:
+            raise CommandError(f"Pass --admin-password or set {ADMIN_PASSWORD_ENV} for the {ADMIN_USERNAME!r} superuser")
+        self.seed(options)
+        if options['seed_only']:
+            return
+        self.ensure_admin(options['admin_password'])
+
+        book_ids = list(Book.objects.filter(stock__gt=0).exclude(image='').values_list('pk', flat=True)[:1000])
+        if not book_ids:
+            raise CommandError("No in-stock books with covers; seed some with --seed-books")
+
+        server = None
+        base_url = options['base_url']
+        if not base_url:
+            base_url = f"http://127.0.0.1:{options['port']}"
+            server = self.start_server(options['port'])
+        try:
+            self.run_load(base_url, book_ids, options['users'], options['funnels'], options['admin_password'])
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=10)
+
+    def ensure_admin(self, password):
+        user, _ = User.objects.get_or_create(username=ADMIN_USERNAME, defaults={'email': 'loadtest@example.com'})
+        user.is_staff = user.is_superuser = True
+        user.set_password(password)
+        user.save()
+
+    def seed(self, options):
+        if options['seed_books']:
+            books = make_books(options['seed_books'], stock=10**6)
+            self.stdout.write(f"Seeded {len(books)} books")
+            if options['seed_reviews']:
+                reviews = make_reviews(books, options['seed_reviews'])
+                self.stdout.write(f"Seeded {len(reviews)} reviews")
+        if options['seed_orders']:
+            books = list(Book.objects.all()[:1000])
+            if not books:
+                raise CommandError("Seed books before orders")
+            orders = make_orders(options['seed_orders'], books, status='completed')
+            self.stdout.write(f"Seeded {len(orders)} orders")
+
+    def start_server(self, port):
+        env = {
+            **os.environ,
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'MEDIA_STORAGE_BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'QUERY_COUNT_HEADER': '1',
+        }
+        argv = [sys.executable, 'manage.py', 'runserver', '--noreload', f"127.0.0.1:{port}"]
+        server = subprocess.Popen(argv, cwd=settings.BASE_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not wait_for_port(port, 30):
+            server.terminate()
+            raise CommandError("Local server did not start")
+        return server
+
+    def run_load(self, base_url, book_ids, users, funnels, admin_password):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 900), 'white').save(buffer, format='PNG')
+        screenshot = buffer.getvalue()
+        results = Results()
+
+        def worker(_):
+            user = VirtualUser(base_url, book_ids, screenshot, results, admin_password)
+            for _ in range(funnels):
+                user.run_funnel()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            list(pool.map(worker, range(users)))
+        elapsed = time.perf_counter() - start
+        self.report(results, elapsed)
+
+    def report(self, results, elapsed):
+        total = sum(len(v) for v in results.latencies.values())
+        self.stdout.write(
+            f"{results.funnels} funnels completed in {elapsed:.1f}s "
+            f"({results.funnels / elapsed:.2f} funnels/s, {total / elapsed:.1f} req/s)"
+        )
+        self.stdout.write(
+            f"{'step':<22}{'reqs':>7}{'err %':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+        )
+        for step in STEPS:
+            samples = results.latencies[step]
+            if not samples:
+                self.stdout.write(f"{step:<22}{0:>7}")
+                continue
+            error_rate = 100 * results.errors[step] / len(samples)
+            queries = results.queries[step]
+            mean_queries = f"{sum(queries) / len(queries):.1f}" if queries else '-'
+            self.stdout.write(
+                f"{step:<22}{len(samples):>7}{error_rate:>8.1f}{percentile(samples, 50):>9.1f}"
+                f"{percentile(samples, 95):>9.1f}{percentile(samples, 99):>9.1f}{mean_queries:>9}"
+            )
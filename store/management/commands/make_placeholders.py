@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from store import placeholders, prerender
+from store.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the tiny inline cover placeholders shown while covers lazy-load, "
+        "for books that don't have one yet. New uploads get theirs automatically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every placeholder, not just missing ones.')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            books = books.filter(placeholder='')
+        batch, updated = [], []
+        for book in books.only('pk', 'image', 'placeholder').iterator(chunk_size=options['batch_size']):
+            if placeholders.refresh(book):
+                batch.append(book)
+            if len(batch) >= options['batch_size']:
+                Book.objects.bulk_update(batch, ['placeholder'])
+                updated += [b.pk for b in batch]
+                batch = []
+        if batch:
+            Book.objects.bulk_update(batch, ['placeholder'])
+            updated += [b.pk for b in batch]
+        # bulk_update sends no signals
+        if updated:
+            prerender.schedule(render=prerender.STATIC_PATHS + [prerender.book_path(pk) for pk in updated])
+        self.stdout.write(self.style.SUCCESS(f"Computed {len(updated)} placeholder(s)."))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import prerender
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the catalog pages (home, every book page, robots.txt, sitemap.xml) "
+        "into the \"prerender\" storage. With PRERENDER_PAGES=1 they are served from "
+        "there; catalog edits re-render the affected pages automatically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book', type=int, action='append', dest='books', help='Only render this book page (repeatable).')
+
+    def handle(self, *args, **options):
+        if options['books']:
+            paths = [prerender.book_path(pk) for pk in options['books']]
+        else:
+            paths = prerender.all_paths()
+        start = time.perf_counter()
+        written = prerender.publish(paths)
+        self.stdout.write(self.style.SUCCESS(
+            f"Pre-rendered {written} page(s) in {time.perf_counter() - start:.1f}s."
+        ))
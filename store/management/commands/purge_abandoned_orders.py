@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.archive import PurgeResult, purge_batch
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete (or --archive) orders still pending payment after --hours, in small "
+        "transactions, so abandoned checkouts don't pile up in the live order tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.ABANDONED_ORDER_HOURS,
+            help='Remove pending orders older than this many hours (default: ABANDONED_ORDER_HOURS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+        parser.add_argument('--archive', action='store_true', help='Move them into ArchivedOrder instead of deleting.')
+        parser.add_argument('--to-file', action='store_true', help='With --archive, keep the records in JSONL files.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # Served by the (payment_status, created_at) index
+        candidates = Order.objects.filter(payment_status='pending', created_at__lt=cutoff).order_by('created_at')
+
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} pending order(s) older than {cutoff:%Y-%m-%d %H:%M} would be removed.")
+            return
+
+        total = PurgeResult()
+        while True:
+            # Removed rows drop out of the filter, so each batch is the next LIMIT from the oldest
+            pks = list(candidates.values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            result = purge_batch(pks, archive=options['archive'], to_file=options['to_file'])
+            if not result.orders:
+                break
+            total.add(result)
+            self.stdout.write(f"  removed {total.orders} order(s)...")
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        verb = 'Archived' if options['archive'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {total.orders} abandoned order(s) older than {cutoff:%Y-%m-%d %H:%M}: "
+            f"{total.items} item(s), {total.units} unit(s), ₹{total.value} unpaid. "
+            f"No stock to release (pending orders never deducted any)."
+        ))
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups behind the admin sales dashboard from the "
+        "order tables (live and archived). Normally they are kept up to date as "
+        "orders change status; run this once after deploying them or to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days from this date on (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+        deltas = rebuild(since=since)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups for {len(deltas.daily)} day(s) with sales, "
+            f"{len(deltas.books)} book/day row(s), {len(deltas.statuses)} status/day row(s)."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.similar import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute every book\'s "similar books" list from the titles, authors and '
+        "descriptions. Admin edits and catalog imports update the lists they affect; "
+        "run this after deploying them or now and then to refresh the word weights."
+    )
+
+    def handle(self, *args, **options):
+        changed = refresh()
+        self.stdout.write(self.style.SUCCESS(f"Rewrote the similar-books list of {len(changed)} book(s)."))
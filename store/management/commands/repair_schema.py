@@ -0,0 +1,278 @@
+import re
+from collections import namedtuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.sql import emit_post_migrate_signal, emit_pre_migrate_signal
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations import operations
+from django.db.migrations.executor import MigrationExecutor
+
+
+# One round-trip per vendor: every (table, column) pair in the current schema.
+CATALOG_QUERIES = {
+    'postgresql': """
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+    """,
+    'sqlite': """
+        SELECT m.name, p.name
+        FROM sqlite_master AS m
+        JOIN pragma_table_info(m.name) AS p
+        WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    """,
+}
+
+# And every (table, index or constraint name) pair. SQLite keeps named
+# constraints only in the CREATE TABLE statement, so that comes back too.
+NAME_QUERIES = {
+    'postgresql': """
+        SELECT tablename, indexname, NULL FROM pg_indexes
+        WHERE schemaname = current_schema()
+        UNION ALL
+        SELECT table_name, constraint_name, NULL FROM information_schema.table_constraints
+        WHERE table_schema = current_schema()
+    """,
+    'sqlite': """
+        SELECT tbl_name, name, CASE WHEN type = 'table' THEN sql END
+        FROM sqlite_master
+        WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%'
+    """,
+}
+SQLITE_CONSTRAINT = re.compile(r'CONSTRAINT\s+"?(\w+)"?', re.I)
+
+
+# column and name are None for whole-table facts; created tables carry their
+# columns so the catalog can be rolled forward as migrations are planned.
+# name is an index or constraint name.
+Fact = namedtuple('Fact', ['table', 'column', 'exists', 'columns', 'name'], defaults=[(), None])
+
+# {table: {column, ...}} and {table: {index/constraint name, ...}}
+Catalog = namedtuple('Catalog', ['columns', 'names'])
+
+
+def snapshot_schema(connection):
+    """Return the Catalog of the whole database"""
+    query = CATALOG_QUERIES.get(connection.vendor)
+    name_query = NAME_QUERIES.get(connection.vendor)
+    catalog = Catalog({}, {})
+    with connection.cursor() as cursor:
+        if query:
+            cursor.execute(query)
+            for table, column in cursor.fetchall():
+                catalog.columns.setdefault(table, set()).add(column)
+            cursor.execute(name_query)
+            for table, name, sql in cursor.fetchall():
+                names = catalog.names.setdefault(table, set())
+                names.update(SQLITE_CONSTRAINT.findall(sql) if sql else [name])
+        else:
+            # Unknown backend: fall back to Django's per-table introspection
+            for info in connection.introspection.get_table_list(cursor):
+                columns = connection.introspection.get_table_description(cursor, info.name)
+                catalog.columns[info.name] = {col.name for col in columns}
+                catalog.names[info.name] = set(connection.introspection.get_constraints(cursor, info.name))
+    return catalog
+
+
+def _db_table(model_state):
+    return model_state.options.get('db_table') or f"{model_state.app_label}_{model_state.name_lower}"
+
+
+def _column(field, name):
+    if field.many_to_many:
+        return None
+    field = field.clone()
+    field.set_attributes_from_name(name)
+    return field.column
+
+
+def migration_footprint(loader, migration):
+    """
+    List the schema facts a migration leaves behind.
+
+    Operations whose effect can't be read back from the catalog (RunPython,
+    AlterField, ...) contribute nothing. Indexes and constraints count by name.
+    """
+    key = (migration.app_label, migration.name)
+    before = loader.project_state(key, at_end=False)
+    after = loader.project_state(key, at_end=True)
+    app_label = migration.app_label
+    facts = []
+    for op in migration.operations:
+        if isinstance(op, operations.CreateModel):
+            model = after.models.get((app_label, op.name_lower))
+            if model:
+                columns = {_column(f, name) for name, f in model.fields.items()} - {None}
+                facts.append(Fact(_db_table(model), None, True, columns))
+                for item in op.options.get('indexes', []) + op.options.get('constraints', []):
+                    facts.append(Fact(_db_table(model), None, True, name=item.name))
+        elif isinstance(op, operations.DeleteModel):
+            model = before.models.get((app_label, op.name_lower))
+            if model:
+                facts.append(Fact(_db_table(model), None, False))
+        elif isinstance(op, operations.AddField):
+            model = after.models.get((app_label, op.model_name_lower))
+            column = _column(op.field, op.name)
+            if model and column:
+                facts.append(Fact(_db_table(model), column, True))
+        elif isinstance(op, operations.RemoveField):
+            model = before.models.get((app_label, op.model_name_lower))
+            field = model.fields.get(op.name) if model else None
+            column = _column(field, op.name) if field else None
+            if column:
+                facts.append(Fact(_db_table(model), column, False))
+        elif isinstance(op, (operations.AddIndex, operations.AddConstraint)):
+            model = after.models.get((app_label, op.model_name_lower))
+            item = op.index if isinstance(op, operations.AddIndex) else op.constraint
+            if model:
+                facts.append(Fact(_db_table(model), None, True, name=item.name))
+        elif isinstance(op, (operations.RemoveIndex, operations.RemoveConstraint)):
+            model = before.models.get((app_label, op.model_name_lower))
+            if model:
+                facts.append(Fact(_db_table(model), None, False, name=op.name))
+        elif isinstance(op, operations.RenameIndex):
+            model = after.models.get((app_label, op.model_name_lower))
+            if model:
+                facts.append(Fact(_db_table(model), None, True, name=op.new_name))
+    return facts
+
+
+def fact_holds(catalog, fact):
+    if fact.name is not None:
+        present = fact.name in catalog.names.get(fact.table, ())
+    elif fact.column is None:
+        present = fact.table in catalog.columns
+    else:
+        present = fact.column in catalog.columns.get(fact.table, ())
+    return present == fact.exists
+
+
+def roll_forward(catalog, facts):
+    """Update the in-memory catalog as if the facts had just been applied"""
+    for fact in facts:
+        if fact.name is not None and fact.exists:
+            catalog.names.setdefault(fact.table, set()).add(fact.name)
+        elif fact.name is not None:
+            catalog.names.get(fact.table, set()).discard(fact.name)
+        elif fact.column is None and fact.exists:
+            catalog.columns.setdefault(fact.table, set()).update(fact.columns)
+        elif fact.column is None:
+            catalog.columns.pop(fact.table, None)
+            catalog.names.pop(fact.table, None)
+        elif fact.exists:
+            catalog.columns.setdefault(fact.table, set()).add(fact.column)
+        else:
+            catalog.columns.get(fact.table, set()).discard(fact.column)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring the database in line with the migration graph. Snapshots the schema "
+        "catalog in two queries, fakes migrations whose tables/columns/indexes "
+        "already exist and applies only the ones that are really missing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to repair (default: "default").',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only print the plan, do not touch the database.',
+        )
+        parser.add_argument(
+            '--unrecord-missing', action='store_true',
+            help='Forget applied migrations whose tables/columns are gone so they run again.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        dry_run = options['dry_run']
+
+        catalog = snapshot_schema(connection)
+        executor = MigrationExecutor(connection)
+        loader = executor.loader
+        self.stdout.write(f"Catalog snapshot: {len(catalog.columns)} tables ({connection.vendor}).")
+
+        if options['unrecord_missing']:
+            stale = self.find_stale(loader, catalog)
+            for key in stale:
+                self.stdout.write(self.style.WARNING(f"  {key[0]}.{key[1]}: recorded but schema missing, unrecording"))
+                if not dry_run:
+                    executor.recorder.record_unapplied(*key)
+            if stale and not dry_run:
+                loader.build_graph()
+
+        plan = executor.migration_plan(loader.graph.leaf_nodes())
+        if not plan:
+            self.stdout.write(self.style.SUCCESS("Schema is up to date, nothing to do."))
+            return
+
+        # Classify every pending migration, then group consecutive runs of the
+        # same action so each group is one executor call.
+        groups = []
+        for migration, backwards in plan:
+            if backwards:
+                raise CommandError(f"Refusing to unapply {migration.app_label}.{migration.name}.")
+            action = self.classify(loader, catalog, migration)
+            self.stdout.write(f"  {migration.app_label}.{migration.name}: {action}")
+            if groups and groups[-1][0] == action:
+                groups[-1][1].append((migration, False))
+            else:
+                groups.append((action, [(migration, False)]))
+
+        if dry_run:
+            self.stdout.write("Dry run, no changes made.")
+            return
+
+        # What migrate does around its run: contenttypes and auth create the
+        # ContentTypes and Permissions of new models on post_migrate
+        verbosity, interactive = options['verbosity'], False
+        state = executor._create_project_state(with_applied_migrations=True)
+        emit_pre_migrate_signal(verbosity, interactive, connection.alias, stdout=self.stdout, apps=state.apps, plan=plan)
+        for action, group in groups:
+            state = executor.migrate(
+                [(group[-1][0].app_label, group[-1][0].name)],
+                plan=group,
+                state=state,
+                fake=(action == 'fake'),
+            )
+            # Refresh the applied set so the next group builds on this one
+            loader.build_graph()
+        state.clear_delayed_apps_cache()
+        emit_post_migrate_signal(verbosity, interactive, connection.alias, stdout=self.stdout, apps=state.apps, plan=plan)
+
+        faked = sum(len(g) for a, g in groups if a == 'fake')
+        self.stdout.write(self.style.SUCCESS(
+            f"Repair finished: {len(plan) - faked} applied, {faked} faked."
+        ))
+
+    def classify(self, loader, catalog, migration):
+        """Decide 'fake' or 'apply', rolling the catalog forward for the next one"""
+        facts = migration_footprint(loader, migration)
+        holding = [fact_holds(catalog, fact) for fact in facts]
+        if facts and all(holding):
+            return 'fake'
+        if not any(holding):
+            roll_forward(catalog, facts)
+            return 'apply'
+        partial = ', '.join(
+            f"{fact.table}.{fact.column or fact.name}" if fact.column or fact.name else fact.table
+            for fact, ok in zip(facts, holding) if not ok
+        )
+        raise CommandError(
+            f"{migration.app_label}.{migration.name} is only partly applied "
+            f"(out of sync: {partial}). Fix these by hand and rerun."
+        )
+
+    def find_stale(self, loader, catalog):
+        stale = []
+        for key in loader.applied_migrations:
+            migration = loader.graph.nodes.get(key)
+            if migration is None:
+                continue
+            facts = [f for f in migration_footprint(loader, migration) if f.exists]
+            if facts and not any(fact_holds(catalog, fact) for fact in facts):
+                stale.append(key)
+        return stale
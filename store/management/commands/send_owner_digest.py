@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.digest import send_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Email the store owner one summary of the orders confirmed since the last "
+        "run. Schedule it hourly; it replaces the per-order owner copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to', action='append', dest='recipients',
+            help='Recipient address (repeatable; default: OWNER_DIGEST_RECIPIENTS).',
+        )
+
+    def handle(self, *args, **options):
+        sent = send_pending(recipients=options['recipients'])
+        if sent:
+            self.stdout.write(self.style.SUCCESS(f"Sent digest with {sent} order(s)."))
+        else:
+            self.stdout.write("No new orders to report.")
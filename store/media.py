@@ -0,0 +1,53 @@
+"""
+Process-wide cache of media file URLs.
+
+Stored names never change once written (a new upload gets a new name), so a
+name's URL is fixed for a given storage. Building one isn't free on
+Cloudinary, and the book grid asks for one per card on every render, so
+media_url() memoises them by (storage, name, transformation) in a bounded
+LRU shared by every request the process serves.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+@lru_cache(maxsize=settings.MEDIA_URL_CACHE_SIZE)
+def _url(storage, name, transformation):
+    if transformation and hasattr(storage, '_prepend_prefix'):
+        import cloudinary
+
+        # MediaCloudinaryStorage.url() takes no options; build the same
+        # resource it would and ask for the transformed delivery URL
+        resource = cloudinary.CloudinaryResource(
+            storage._prepend_prefix(name), default_resource_type=storage._get_resource_type(name),
+        )
+        return resource.build_url(raw_transformation=transformation)
+    return storage.url(name)
+
+
+def media_url(file, transformation=None):
+    """
+    URL of a FieldFile, or of a name on the default storage.
+
+    transformation is a Cloudinary transformation string such as
+    'c_limit,w_600'; other storages serve the original file.
+    """
+    if not file:
+        return ''
+    if isinstance(file, str):
+        return _url(default_storage, file, transformation)
+    return _url(file.storage, file.name, transformation)
+
+
+def clear_cache():
+    _url.cache_clear()
+
+
+@receiver(setting_changed)
+def storage_settings_changed(setting, **kwargs):
+    if setting in ('STORAGES', 'MEDIA_URL', 'CLOUDINARY_STORAGE'):
+        clear_cache()
@@ -0,0 +1,37 @@
+from django.db import connection
+
+from . import hints
+
+
+class QueryCountHeaderMiddleware:
+    """Report the number of DB queries a request ran in an X-DB-Queries header (load testing only)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response['X-DB-Queries'] = str(count)
+        return response
+
+
+class ResourceHintsMiddleware:
+    """Send the hints a page's templates registered as a Link header (see store/hints.py)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        links = hints.link_header(request)
+        if links and not response.streaming and response.get('Content-Type', '').startswith('text/html'):
+            response['Link'] = f"{response['Link']}, {links}" if response.has_header('Link') else links
+        return response
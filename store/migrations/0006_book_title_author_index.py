@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_archivedorder_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'author'], name='store_book_title_author_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerDigestEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=100, unique=True)),
+                ('customer_name', models.CharField(max_length=200)),
+                ('email', models.EmailField(max_length=254)),
+                ('phone', models.CharField(max_length=15)),
+                ('city', models.CharField(max_length=100)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('items', models.TextField(help_text='One "title x quantity - price" line per book')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['sent_at', 'created_at'], name='store_digest_sent_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_owner_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='placeholder',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
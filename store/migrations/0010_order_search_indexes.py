@@ -0,0 +1,78 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:49
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+# Name/email indexes for store/search.py. They need expression indexes and
+# operator classes Django can't declare portably, so they're per vendor.
+SEARCH_TABLES = ['store_order', 'store_archivedorder']
+
+POSTGRES_INDEXES = [
+    # icontains compiles to UPPER(col::text) LIKE UPPER('%term%')
+    'CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx ON {table} USING gin (UPPER(customer_name::text) gin_trgm_ops)',
+    # iexact compiles to UPPER(col::text) = UPPER('term')
+    'CREATE INDEX IF NOT EXISTS {table}_email_upper_idx ON {table} (UPPER(email::text))',
+]
+
+SQLITE_INDEXES = [
+    # LIKE is case-insensitive, so only a NOCASE index serves istartswith/iexact
+    'CREATE INDEX IF NOT EXISTS {table}_name_nocase_idx ON {table} (customer_name COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS {table}_email_nocase_idx ON {table} (email COLLATE NOCASE)',
+]
+
+INDEX_SUFFIXES = ['name_trgm_idx', 'email_upper_idx', 'name_nocase_idx', 'email_nocase_idx']
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError:
+            # Without the extension name search still works, as a sequential scan
+            statements = POSTGRES_INDEXES[1:]
+        else:
+            statements = POSTGRES_INDEXES
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_INDEXES
+    else:
+        return
+    for table in SEARCH_TABLES:
+        for statement in statements:
+            schema_editor.execute(statement.format(table=table))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    for table in SEARCH_TABLES:
+        for suffix in INDEX_SUFFIXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{suffix}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_book_placeholder'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['phone'], name='store_archorder_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone'], name='store_order_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['upi_transaction_id'], name='store_payment_upi_txn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_reference'], name='store_payment_reference_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
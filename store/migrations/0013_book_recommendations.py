@@ -0,0 +1,44 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('orders', models.IntegerField(help_text='Orders containing both books')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='store.book')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.book')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookCoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.book')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.book')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bookrecommendation',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='store_recommendation_book_rank_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookcopurchase',
+            constraint=models.UniqueConstraint(fields=('book', 'other'), name='store_copurchase_book_other_uniq'),
+        ),
+    ]
@@ -9,6 +9,8 @@ class Book(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
     image = models.ImageField(upload_to='books/', blank=True, null=True)
+    # Tiny data: URI shown while the cover lazy-loads (store/placeholders.py)
+    placeholder = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -16,6 +18,10 @@ class Book(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Natural key used by the catalog import
+            models.Index(fields=['title', 'author'], name='store_book_title_author_idx'),
+        ]
 
 
 class Order(models.Model):
@@ -45,6 +51,12 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='store_order_created_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='store_order_status_created_idx'),
+            # Admin search (store/search.py); name/email indexes are vendor-specific, see migration 0010
+            models.Index(fields=['phone'], name='store_order_phone_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -75,6 +87,15 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment for {self.order.order_id}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['upi_transaction_id'], name='store_payment_upi_txn_idx'),
+            models.Index(fields=['payment_reference'], name='store_payment_reference_idx'),
+            # Keyset pagination in the admin (store/admin_scale.py)
+            models.Index(fields=['created_at'], name='store_payment_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='store_payment_status_crt_idx'),
+        ]
+
 
 class AboutSection(models.Model):
     """Model for About the Author section"""
@@ -129,3 +150,150 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+
+class ArchivedOrder(models.Model):
+    """Searchable copy of an order moved out of the live tables by archive_orders"""
+    order_id = models.CharField(max_length=100, unique=True)
+    customer_name = models.CharField(max_length=200)
+    email = models.EmailField()
+    phone = models.CharField(max_length=15)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(default=dict, blank=True, help_text='Order, items and payment as archived')
+    archive_file = models.CharField(max_length=255, blank=True, help_text='JSONL archive in storage holding the full record')
+
+    def __str__(self):
+        return f"Archived order {self.order_id} - {self.customer_name}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='store_archorder_created_idx'),
+            models.Index(fields=['phone'], name='store_archorder_phone_idx'),
+        ]
+
+
+class DailySales(models.Model):
+    """Verified/completed orders per day, maintained incrementally by store.rollups"""
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Sales Dashboard'
+        verbose_name_plural = 'Sales Dashboard'
+
+
+class DailyBookSales(models.Model):
+    """Units and revenue per book per day for verified/completed orders"""
+    date = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'book'], name='store_dailybooksales_date_book_uniq'),
+        ]
+
+
+class DailyOrderStatus(models.Model):
+    """Number of orders created on a day that currently have each payment status"""
+    date = models.DateField()
+    payment_status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_status'], name='store_dailyorderstatus_date_status_uniq'),
+        ]
+
+
+class BookCoPurchase(models.Model):
+    """Verified/completed orders containing both books, stored both ways round (store.recommendations)"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'other'], name='store_copurchase_book_other_uniq'),
+        ]
+
+
+class BookRecommendation(models.Model):
+    """One of a book's top "customers also bought" neighbours, precomputed from BookCoPurchase"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    orders = models.IntegerField(help_text='Orders containing both books')
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='store_recommendation_book_rank_uniq'),
+        ]
+
+
+class SimilarBook(models.Model):
+    """One of a book's most similar books by title, author and description (store.similar)"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(help_text='Cosine similarity of the TF-IDF vectors')
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='store_similarbook_book_rank_uniq'),
+        ]
+
+
+class OwnerDigestEntry(models.Model):
+    """One confirmed order waiting to go out in the next owner digest email"""
+    order_id = models.CharField(max_length=100, unique=True)
+    customer_name = models.CharField(max_length=200)
+    email = models.EmailField()
+    phone = models.CharField(max_length=15)
+    city = models.CharField(max_length=100)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    items = models.TextField(help_text='One "title x quantity - price" line per book')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Digest entry for {self.order_id}"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['sent_at', 'created_at'], name='store_digest_sent_created_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a request that must only run once (store/idempotency.py)"""
+    key = models.CharField(max_length=64, unique=True, help_text='SHA-256 of the endpoint, session and client key')
+    status_code = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=500, blank=True)
+    content = models.BinaryField(blank=True, default=b'')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='store_idem_created_idx'),
+        ]
@@ -0,0 +1,125 @@
+"""
+Shared, bounded worker pool for CPU-bound checkout work (QR codes, payment
+screenshots), so a burst of checkouts queues here instead of on the request
+threads.
+
+Callers use run(); it raises PoolBusy when the queue is full and PoolTimeout
+when the result doesn't arrive in time, and the view falls back to a page
+that works without the result. submit() queues background work without
+waiting for it.
+"""
+import base64
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusy(Exception):
+    """The pool already has OFFLOAD_MAX_PENDING jobs queued or running"""
+
+
+class PoolTimeout(Exception):
+    """A job did not finish within its timeout"""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_stats = {'pending': 0, 'peak': 0, 'completed': 0, 'cancelled': 0, 'rejected': 0, 'timed_out': 0}
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.OFFLOAD_WORKERS, thread_name_prefix='offload',
+            )
+            _slots = threading.BoundedSemaphore(settings.OFFLOAD_MAX_PENDING)
+    return _executor, _slots
+
+
+def _release(future):
+    _slots.release()
+    with _lock:
+        _stats['pending'] -= 1
+        _stats['cancelled' if future.cancelled() else 'completed'] += 1
+
+
+def submit(fn, *args):
+    """Queue fn(*args) on the shared pool without waiting; returns the future"""
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        with _lock:
+            _stats['rejected'] += 1
+        logger.warning("Offload pool full (%s pending), rejecting %s", _stats['pending'], fn.__name__)
+        raise PoolBusy(fn.__name__)
+
+    with _lock:
+        _stats['pending'] += 1
+        _stats['peak'] = max(_stats['peak'], _stats['pending'])
+    future = executor.submit(fn, *args)
+    future.add_done_callback(_release)
+    return future
+
+
+def run(fn, *args, timeout=None):
+    """Run fn(*args) on the shared pool and wait for the result"""
+    future = submit(fn, *args)
+    try:
+        return future.result(timeout=settings.OFFLOAD_TIMEOUT if timeout is None else timeout)
+    except FutureTimeout:
+        # Not cancelled if already running; its slot frees when it finishes
+        future.cancel()
+        with _lock:
+            _stats['timed_out'] += 1
+        raise PoolTimeout(fn.__name__)
+
+
+def stats():
+    """Queue depth and counters, for diagnostics"""
+    with _lock:
+        return dict(_stats)
+
+
+def render_upi_qr(upi_string):
+    """PNG QR code for a UPI deeplink, base64 encoded for a data: URI"""
+    import qrcode
+
+    qr_img = qrcode.make(upi_string)
+    buffer = io.BytesIO()
+    qr_img.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def prepare_screenshot(data, max_side=1600):
+    """
+    Validate an uploaded screenshot and shrink it to at most max_side pixels.
+
+    Returns (bytes, extension); raises ValueError if data isn't an image.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a valid image: {e}")
+
+    if max(image.size) <= max_side:
+        return data, (image.format or 'png').lower()
+
+    image.thumbnail((max_side, max_side))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85, optimize=True)
+    return buffer.getvalue(), 'jpg'
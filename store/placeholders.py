@@ -0,0 +1,69 @@
+"""
+Tiny inline cover placeholders.
+
+Each Book keeps a ~16px JPEG of its cover as a data: URI in
+Book.placeholder, computed once when the cover is uploaded. Lazy-loaded
+covers show it (stretched, so it reads as a blur) until the real image
+arrives. Fresh uploads get one on save; code that points image at a file
+already in storage calls refresh(); `manage.py make_placeholders` fills in
+older books.
+"""
+import base64
+import io
+import logging
+
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Book
+
+
+logger = logging.getLogger(__name__)
+
+SIZE = 16
+QUALITY = 40
+
+
+def generate(fileobj):
+    """data: URI of a tiny JPEG of the image in fileobj, or '' if it can't be read"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(fileobj) as image:
+            image.draft('RGB', (SIZE * 4, SIZE * 4))  # JPEGs decode at reduced scale
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((SIZE, SIZE))
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=QUALITY, optimize=True)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("No placeholder for %r: %s", getattr(fileobj, 'name', fileobj), e)
+        return ''
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def refresh(book):
+    """Recompute book.placeholder from the stored cover (not saved)"""
+    if not book.image:
+        book.placeholder = ''
+        return book.placeholder
+    try:
+        with book.image.storage.open(book.image.name, 'rb') as f:
+            book.placeholder = generate(f)
+    except OSError as e:
+        logger.warning("Cover %s unreadable: %s", book.image.name, e)
+        book.placeholder = ''
+    return book.placeholder
+
+
+@receiver(pre_save, sender=Book)
+def placeholder_for_upload(sender, instance, raw=False, **kwargs):
+    # Uploaded files are still in memory here; committed covers are left alone
+    if raw:
+        return
+    if not instance.image:
+        instance.placeholder = ''
+    elif not instance.image._committed:
+        upload = instance.image.file
+        upload.seek(0)
+        instance.placeholder = generate(upload)
+        upload.seek(0)
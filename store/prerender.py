@@ -0,0 +1,214 @@
+"""
+Pre-rendered storefront pages.
+
+The catalog pages (home, book details, robots.txt, sitemap.xml) look the same
+for every visitor, so the prerender_pages command renders them once into the
+"prerender" storage and PrerenderedPageMiddleware serves them from there
+without running a view or touching the database. Cart, checkout and
+everything else fall through to the live views.
+
+Saving or deleting a Book, Review, AboutSection or SocialMedia row
+re-renders only the pages that show it, once the transaction commits, on
+the shared offload pool.
+"""
+import asyncio
+import logging
+import mimetypes
+import threading
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.test.client import RequestFactory
+from django.urls import Resolver404, resolve, reverse
+
+from . import offload
+from .models import AboutSection, Book, Review, SocialMedia
+
+
+logger = logging.getLogger(__name__)
+
+STATIC_PATHS = ['/', '/robots.txt', '/sitemap.xml']
+PRERENDERED_URL_NAMES = {'home', 'book_detail', 'django.contrib.sitemaps.views.sitemap'}
+
+# The current thread's _Batch, waiting for its transaction to commit
+_local = threading.local()
+
+
+def storage():
+    return storages['prerender']
+
+
+def page_name(path):
+    """Storage name for a URL path: '/book/3/' -> 'book/3/index.html'"""
+    name = path.lstrip('/')
+    return f"{name}index.html" if not name or name.endswith('/') else name
+
+
+def book_path(pk):
+    return reverse('book_detail', args=[pk])
+
+
+def all_paths():
+    return STATIC_PATHS + [book_path(pk) for pk in Book.objects.values_list('pk', flat=True)]
+
+
+def render_path(path):
+    """Render a URL path through its view as an anonymous visitor would see it"""
+    request = RequestFactory().get(path, HTTP_HOST=settings.PRERENDER_HOST, secure=True)
+    # Templates swap per-visitor bits (the CSRF token) for client-side code
+    request.prerendering = True
+    match = resolve(path)
+    view = match.func
+    if asyncio.iscoroutinefunction(view):
+        response = async_to_sync(view)(request, *match.args, **match.kwargs)
+    else:
+        response = view(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f"{path} rendered with status {response.status_code}")
+    return response.content
+
+
+def publish(paths):
+    """Render and store the given paths; returns the number written"""
+    target = storage()
+    written = 0
+    for path in paths:
+        content = render_path(path)
+        name = page_name(path)
+        if target.exists(name):
+            target.delete(name)
+        target.save(name, ContentFile(content))
+        written += 1
+    return written
+
+
+def remove(paths):
+    target = storage()
+    for path in paths:
+        name = page_name(path)
+        if target.exists(name):
+            target.delete(name)
+
+
+def regenerate(render, gone):
+    try:
+        remove(gone)
+        publish(sorted(render))
+    except Exception:
+        # A stale page is better than a failed save; prerender_pages repairs it
+        logger.exception("Re-rendering %s failed", sorted(render))
+
+
+def _regenerate_in_background(render, gone):
+    try:
+        regenerate(render, gone)
+    finally:
+        connections.close_all()
+
+
+class _Batch:
+    """Paths scheduled during one transaction, flushed when it commits"""
+
+    def __init__(self):
+        self.render, self.remove = set(), set()
+
+    def flush(self):
+        if getattr(_local, 'batch', None) is self:
+            del _local.batch
+        render, gone = self.render - self.remove, self.remove
+        if not settings.PRERENDER_BACKGROUND:
+            regenerate(render, gone)
+            return
+        # Keep rendering (the home page lists every book) off the request thread
+        try:
+            offload.submit(_regenerate_in_background, render, gone)
+        except offload.PoolBusy:
+            logger.warning("Offload pool busy, pages %s left stale", sorted(render | gone))
+
+
+def schedule(render=(), remove=()):
+    """Re-render/remove paths once the current transaction commits"""
+    if not settings.PRERENDER_PAGES:
+        return
+    batch = getattr(_local, 'batch', None)
+    # A batch whose transaction rolled back has lost its on_commit callback
+    pending = batch is not None and any(
+        entry[1] == batch.flush for entry in transaction.get_connection().run_on_commit
+    )
+    if not pending:
+        batch = _local.batch = _Batch()
+    batch.render.update(render)
+    batch.remove.update(remove)
+    if not pending:
+        # Runs straight away outside a transaction
+        transaction.on_commit(batch.flush)
+
+
+@receiver([post_save, post_delete], sender=Book)
+def book_changed(sender, instance, **kwargs):
+    if kwargs.get('created') is None:  # deleted
+        schedule(render=STATIC_PATHS, remove=[book_path(instance.pk)])
+    else:
+        schedule(render=STATIC_PATHS + [book_path(instance.pk)])
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, **kwargs):
+    schedule(render=[book_path(instance.book_id)])
+
+
+@receiver([post_save, post_delete], sender=AboutSection)
+def about_changed(sender, instance, **kwargs):
+    schedule(render=['/'])
+
+
+@receiver([post_save, post_delete], sender=SocialMedia)
+def social_changed(sender, instance, **kwargs):
+    # Social links are in every page's footer
+    schedule(render=all_paths())
+
+
+class PrerenderedPageMiddleware:
+    """Serve pre-rendered catalog pages from storage, falling back to the live views"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.serve(request)
+        return response if response is not None else self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or request.GET:
+            return None
+        # Pages carry absolute URLs for PRERENDER_HOST only
+        try:
+            if request.get_host() != settings.PRERENDER_HOST:
+                return None
+        except DisallowedHost:
+            return None
+        try:
+            if resolve(request.path_info).url_name not in PRERENDERED_URL_NAMES and request.path_info not in STATIC_PATHS:
+                return None
+        except Resolver404:
+            return None
+        name = page_name(request.path_info)
+        try:
+            with storage().open(name, 'rb') as f:
+                content = f.read()
+        except (FileNotFoundError, OSError):
+            return None
+        content_type = mimetypes.guess_type(name)[0] or 'text/html'
+        response = HttpResponse(content, content_type=f"{content_type}; charset=utf-8")
+        response['Cache-Control'] = f"public, max-age={settings.PRERENDER_MAX_AGE}"
+        response['X-Prerendered'] = '1'
+        return response
@@ -0,0 +1,131 @@
+"""
+"Customers also bought" recommendations from co-purchases.
+
+BookCoPurchase is a sparse co-occurrence matrix. It has one row per pair of
+books that appear together in a verified/completed order, stored both ways
+round, with the number of such orders. rollups.record_transitions() passes
+every order that enters or leaves a sold status to record_baskets(). That
+adds the pair deltas with the same additive upsert the sales rollups use,
+then recomputes the top RECOMMENDATIONS_PER_BOOK neighbours of the books in
+those orders into BookRecommendation. book_detail reads a book's list with
+one query on the (book, rank) index, so no request scans order history.
+
+rebuild() recomputes both tables from live and archived orders.
+"""
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.conf import settings
+from django.db import router, transaction
+
+from . import prerender
+from .models import ArchivedOrder, BookCoPurchase, BookRecommendation, Book, OrderItem
+from .rollups import SOLD_STATUSES, _upsert_add
+
+
+def pair_counts(baskets):
+    """Counter of (book_id, other_id) -> orders over (book ids, +1/-1) baskets"""
+    counts = Counter()
+    for book_ids, sign in baskets:
+        for pair in permutations(set(book_ids), 2):
+            counts[pair] += sign
+    return counts
+
+
+def top_neighbours(counts):
+    """{book_id: [(other_id, orders), ...]} best first, from a pair -> orders mapping"""
+    neighbours = defaultdict(list)
+    for (book, other), orders in counts.items():
+        if orders > 0:
+            neighbours[book].append((other, orders))
+    for book, others in neighbours.items():
+        others.sort(key=lambda item: (-item[1], item[0]))
+        del others[settings.RECOMMENDATIONS_PER_BOOK:]
+    return neighbours
+
+
+def stored_lists(model, value, book_ids=None):
+    current = defaultdict(list)
+    rows = model.objects.all()
+    if book_ids is not None:
+        rows = rows.filter(book__in=book_ids)
+    for book, other, score in rows.order_by('book_id', 'rank').values_list('book', 'recommended', value):
+        current[book].append((other, score))
+    return current
+
+
+def save_lists(neighbours, book_ids=None, model=BookRecommendation, value='orders'):
+    """
+    Store {book_id: [(recommended_id, value), ...]} lists in a (book,
+    recommended, rank, value) table, for book_ids (all books if None),
+    rewriting only the lists that differ and re-rendering the pages whose
+    books changed. Returns the book ids whose lists were rewritten.
+    """
+    current = stored_lists(model, value, book_ids)
+    books = set(neighbours) | set(current) if book_ids is None else set(book_ids)
+    changed = {book for book in books if neighbours.get(book, []) != current.get(book, [])}
+    if not changed:
+        return changed
+    model.objects.filter(book__in=changed).delete()
+    model.objects.bulk_create([
+        model(book_id=book, recommended_id=other, rank=rank, **{value: score})
+        for book in changed for rank, (other, score) in enumerate(neighbours.get(book, []))
+    ], batch_size=500)
+    # Pages show the books, not the scores
+    prerender.schedule(render=[
+        prerender.book_path(book) for book in changed
+        if [o for o, _ in neighbours.get(book, [])] != [o for o, _ in current.get(book, [])]
+    ])
+    return changed
+
+
+def record_baskets(baskets):
+    """Add (book ids, +1/-1) for orders that became sold (+1) or stopped being sold (-1)"""
+    counts = pair_counts(baskets)
+    rows = [(book, other, orders) for (book, other), orders in counts.items() if orders]
+    if not rows:
+        return
+    touched = {book for book, _, _ in rows}
+    # No savepoint: usually runs inside the rollups' transaction
+    with transaction.atomic(using=router.db_for_write(BookCoPurchase), savepoint=False):
+        _upsert_add(BookCoPurchase, ['book', 'other'], ['orders'], rows)
+        matrix = BookCoPurchase.objects.filter(book__in=touched, orders__gt=0)
+        save_lists(top_neighbours({
+            (book, other): orders for book, other, orders in matrix.values_list('book', 'other', 'orders')
+        }), touched)
+
+
+def sold_baskets():
+    """Book ids of every verified/completed order, live and archived, one set at a time"""
+    items = (
+        OrderItem.objects.filter(order__payment_status__in=SOLD_STATUSES)
+        .order_by('order_id').values_list('order_id', 'book_id')
+    )
+    basket, current = set(), None
+    for order_id, book_id in items.iterator(chunk_size=2000):
+        if order_id != current and basket:
+            yield basket
+            basket = set()
+        current = order_id
+        basket.add(book_id)
+    if basket:
+        yield basket
+    # Per-book history of archived orders is only available when kept inline
+    archived = ArchivedOrder.objects.filter(payment_status__in=SOLD_STATUSES).exclude(data={})
+    for data in archived.values_list('data', flat=True).iterator(chunk_size=500):
+        yield {item['book_id'] for item in data.get('items', [])}
+
+
+def rebuild():
+    """Recompute the co-purchase matrix and every book's list; returns (pairs, books with recommendations)"""
+    counts = pair_counts((basket, 1) for basket in sold_baskets())
+    known = set(Book.objects.values_list('pk', flat=True))
+    counts = {pair: orders for pair, orders in counts.items() if pair[0] in known and pair[1] in known}
+    neighbours = top_neighbours(counts)
+    with transaction.atomic(using=router.db_for_write(BookCoPurchase)):
+        BookCoPurchase.objects.all().delete()
+        BookCoPurchase.objects.bulk_create([
+            BookCoPurchase(book_id=book, other_id=other, orders=orders) for (book, other), orders in counts.items()
+        ], batch_size=1000)
+        save_lists(neighbours)
+    return len(counts), len(neighbours)
@@ -0,0 +1,159 @@
+"""
+Matching a UPI/bank statement CSV against payments awaiting verification.
+
+Pending payments are loaded once into an in-memory index keyed on their
+normalised payment_reference and upi_transaction_id; each statement row is
+then a dict lookup plus an amount check. Confirmed matches are verified with
+set-based updates.
+"""
+import csv
+import io
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import Order, Payment
+
+
+PENDING_STATUSES = ('pending', 'pending_verification')
+
+# Header names used by common bank/UPI statement exports
+REFERENCE_COLUMNS = ('utr', 'utr no', 'utr number', 'upi ref no', 'upi reference', 'reference',
+                     'reference no', 'ref no', 'transaction id', 'upi transaction id', 'rrn')
+AMOUNT_COLUMNS = ('amount', 'credit', 'credit amount', 'deposit', 'deposit amt', 'amount (inr)')
+DESCRIPTION_COLUMNS = ('description', 'narration', 'remarks', 'particulars', 'details')
+
+# UPI UTR/RRN numbers are 12 digits; narrations usually embed them
+UTR_PATTERN = re.compile(r'(?<!\d)\d{12}(?!\d)')
+
+
+@dataclass
+class StatementRow:
+    number: int
+    reference: str
+    amount: Decimal
+    description: str = ''
+
+
+@dataclass
+class Reconciliation:
+    matched: list = field(default_factory=list)    # (row, payment)
+    ambiguous: list = field(default_factory=list)  # (row, [payments], reason)
+    unmatched: list = field(default_factory=list)  # (row or row number, reason)
+
+
+def normalise(reference):
+    return re.sub(r'[\s-]', '', reference or '').upper()
+
+
+def _column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def _amount(value):
+    value = re.sub(r'[^\d.\-]', '', value or '')
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def _cell(values, col):
+    return values[col].strip() if col is not None and col < len(values) else ''
+
+
+def parse_statement(fileobj):
+    """Yield StatementRow or (row number, error) for each line of a statement CSV"""
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(fileobj)
+    header = [h.strip().lower() for h in next(reader, [])]
+    ref_col = _column(header, REFERENCE_COLUMNS)
+    amount_col = _column(header, AMOUNT_COLUMNS)
+    desc_col = _column(header, DESCRIPTION_COLUMNS)
+    if amount_col is None or (ref_col is None and desc_col is None):
+        raise ValueError('Statement needs an amount column and a reference or narration column.')
+
+    for number, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        description = _cell(values, desc_col)
+        reference = _cell(values, ref_col)
+        if not reference:
+            utr = UTR_PATTERN.search(description)
+            reference = utr.group() if utr else ''
+        amount = _amount(_cell(values, amount_col))
+        if not reference:
+            yield number, 'no reference found'
+        elif amount is None or amount <= 0:
+            yield number, 'not a credit'
+        else:
+            yield StatementRow(number, reference, amount, description)
+
+
+def pending_index():
+    """{normalised reference: [payment, ...]} for payments awaiting verification"""
+    index = defaultdict(list)
+    payments = Payment.objects.filter(status__in=PENDING_STATUSES).select_related('order').only(
+        'pk', 'amount', 'payment_reference', 'upi_transaction_id', 'status',
+        'order__order_id', 'order__customer_name',
+    )
+    for payment in payments:
+        for reference in {normalise(payment.payment_reference), normalise(payment.upi_transaction_id)}:
+            if reference:
+                index[reference].append(payment)
+    return index
+
+
+def reconcile(rows, index=None):
+    """Sort statement rows into matched, ambiguous and unmatched"""
+    index = pending_index() if index is None else index
+    result = Reconciliation()
+    claims = defaultdict(list)
+    for row in rows:
+        if not isinstance(row, StatementRow):
+            result.unmatched.append(row)
+            continue
+        candidates = index.get(normalise(row.reference), [])
+        same_amount = [p for p in candidates if p.amount == row.amount]
+        if not candidates:
+            result.unmatched.append((row, 'no pending payment with this reference'))
+        elif len(same_amount) == 1:
+            claims[same_amount[0].pk].append((row, same_amount[0]))
+        elif same_amount:
+            result.ambiguous.append((row, same_amount, 'several pending payments share this reference'))
+        else:
+            result.ambiguous.append((row, candidates, 'reference found but amount differs'))
+
+    for matches in claims.values():
+        if len(matches) == 1:
+            result.matched.append(matches[0])
+        else:
+            for row, payment in matches:
+                result.ambiguous.append((row, [payment], 'payment claimed by several statement lines'))
+    result.matched.sort(key=lambda match: match[0].number)
+    result.ambiguous.sort(key=lambda entry: entry[0].number)
+    return result
+
+
+def verify_payments(payment_ids):
+    """Verify still-pending payments and their orders in set-based updates; returns their orders"""
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update(of=('self',))
+            .filter(payment__pk__in=payment_ids, payment__status__in=PENDING_STATUSES)
+        )
+        Payment.objects.filter(order__in=orders).update(status='verified', verified_at=timezone.now())
+        Order.objects.filter(pk__in=[o.pk for o in orders]).update(payment_status='verified')
+        rollups.record_transitions([(order, order.payment_status, 'verified') for order in orders])
+    for order in orders:
+        order.payment_status = 'verified'
+    return orders
@@ -0,0 +1,175 @@
+"""
+Daily sales rollups: DailySales, DailyBookSales and DailyOrderStatus.
+
+Every place that changes an order's payment status reports the change with
+record_transitions(); the resulting deltas are added to the rollup rows with
+one INSERT ... ON CONFLICT DO UPDATE per table, so concurrent updates never
+lose increments. Orders count on the (local) day they were placed.
+rebuild() recomputes the rollups from the order tables. Sold orders also
+feed the co-purchase recommendations (store.recommendations).
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, Book, DailyBookSales, DailyOrderStatus, DailySales, Order, OrderItem
+
+
+SOLD_STATUSES = ('verified', 'completed')
+UPSERT_BATCH = 200
+
+
+class Deltas:
+    """Pending additions to the rollup tables"""
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: [0, 0, Decimal('0')])  # day -> [orders, units, revenue]
+        self.books = defaultdict(lambda: [0, Decimal('0')])     # (day, book_id) -> [units, revenue]
+        self.statuses = Counter()                               # (day, status) -> orders
+
+    def add_items(self, day, items, sign=1):
+        """items: (book_id, quantity, price) tuples"""
+        for book_id, quantity, price in items:
+            self.books[day, book_id][0] += sign * quantity
+            self.books[day, book_id][1] += sign * quantity * Decimal(price)
+            self.daily[day][1] += sign * quantity
+
+    def apply(self):
+        _upsert_add(DailySales, ['date'], ['orders', 'units', 'revenue'], [
+            (day, *values) for day, values in self.daily.items() if any(values)
+        ])
+        _upsert_add(DailyBookSales, ['date', 'book'], ['units', 'revenue'], [
+            (day, book_id, *values) for (day, book_id), values in self.books.items() if any(values)
+        ])
+        _upsert_add(DailyOrderStatus, ['date', 'payment_status'], ['orders'], [
+            (day, status, count) for (day, status), count in self.statuses.items() if count
+        ])
+
+
+def _upsert_add(model, keys, counters, rows):
+    """Add rows' counter values to existing rows with the same keys, inserting missing ones"""
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in keys + counters]
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(f.column) for f in fields)
+    conflict = ', '.join(quote(f.column) for f in fields[:len(keys)])
+    updates = ', '.join(
+        f"{quote(f.column)} = {table}.{quote(f.column)} + excluded.{quote(f.column)}"
+        for f in fields[len(keys):]
+    )
+    placeholder = f"({', '.join(['%s'] * len(fields))})"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH):
+            batch = rows[start:start + UPSERT_BATCH]
+            params = [
+                field.get_db_prep_save(value, connection)
+                for row in batch for field, value in zip(fields, row)
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([placeholder] * len(batch))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                params,
+            )
+
+
+def record_transitions(changes):
+    """
+    Update the rollups for (order, old_status, new_status) changes.
+
+    old_status is None for a newly created order. Orders moving into or out
+    of a sold status add or remove their revenue and units.
+    """
+    deltas = Deltas()
+    sold = {}
+    for order, old, new in changes:
+        if old == new:
+            continue
+        day = timezone.localdate(order.created_at)
+        if old:
+            deltas.statuses[day, old] -= 1
+        if new:
+            deltas.statuses[day, new] += 1
+        sign = (new in SOLD_STATUSES) - (old in SOLD_STATUSES)
+        if sign:
+            sold[order.pk] = (day, sign)
+            deltas.daily[day][0] += sign
+            deltas.daily[day][2] += sign * Decimal(order.total_amount)
+
+    if sold:
+        items = defaultdict(list)
+        for order_id, *item in OrderItem.objects.filter(order_id__in=sold).values_list(
+            'order_id', 'book_id', 'quantity', 'price'
+        ):
+            items[order_id].append(item)
+        for order_id, (day, sign) in sold.items():
+            deltas.add_items(day, items[order_id], sign)
+
+    if sold:
+        # Imported here: recommendations builds on this module
+        from . import recommendations
+        # Three tables (and the co-purchase matrix) change together
+        with transaction.atomic(using=router.db_for_write(DailySales)):
+            deltas.apply()
+            recommendations.record_baskets([
+                ([book_id for book_id, _, _ in items[order_id]], sign) for order_id, (_, sign) in sold.items()
+            ])
+    else:
+        # A single upsert statement is atomic on its own
+        deltas.apply()
+
+
+def record_transition(order, old_status, new_status):
+    record_transitions([(order, old_status, new_status)])
+
+
+def rebuild(since=None):
+    """Recompute the rollups from live and archived orders, optionally from a date on"""
+    orders = Order.objects.all()
+    archived = ArchivedOrder.objects.all()
+    items = OrderItem.objects.filter(order__payment_status__in=SOLD_STATUSES)
+    if since:
+        orders = orders.filter(created_at__date__gte=since)
+        archived = archived.filter(created_at__date__gte=since)
+        items = items.filter(order__created_at__date__gte=since)
+
+    deltas = Deltas()
+    for queryset in (orders, archived):
+        by_day = queryset.annotate(day=TruncDate('created_at'))
+        for row in by_day.values('day', 'payment_status').annotate(orders=Count('pk')):
+            deltas.statuses[row['day'], row['payment_status']] += row['orders']
+        for row in by_day.filter(payment_status__in=SOLD_STATUSES).values('day').annotate(
+            orders=Count('pk'), revenue=Sum('total_amount'),
+        ):
+            deltas.daily[row['day']][0] += row['orders']
+            deltas.daily[row['day']][2] += row['revenue']
+
+    for row in items.annotate(day=TruncDate('order__created_at')).values('day', 'book_id').annotate(
+        units=Sum('quantity'), revenue=Sum(F('quantity') * F('price'), output_field=DecimalField()),
+    ):
+        deltas.books[row['day'], row['book_id']] = [row['units'], row['revenue']]
+        deltas.daily[row['day']][1] += row['units']
+
+    # Per-book history of archived orders is only available when kept inline
+    for record in archived.filter(payment_status__in=SOLD_STATUSES).exclude(data={}).only('created_at', 'data'):
+        deltas.add_items(timezone.localdate(record.created_at), [
+            (item['book_id'], item['quantity'], item['price']) for item in record.data.get('items', [])
+        ])
+    known = set(Book.objects.filter(pk__in={book_id for _, book_id in deltas.books}).values_list('pk', flat=True))
+    for key in [key for key in deltas.books if key[1] not in known]:
+        del deltas.books[key]
+
+    with transaction.atomic(using=router.db_for_write(DailySales)):
+        for model in (DailySales, DailyBookSales, DailyOrderStatus):
+            stale = model.objects.all()
+            if since:
+                stale = stale.filter(date__gte=since)
+            stale.delete()
+        deltas.apply()
+    return deltas
@@ -0,0 +1,112 @@
+"""
+Database router that sends catalog reads to read replicas.
+
+Replicas come from DATABASE_REPLICA_URL (see settings.py). Reads of the
+models in REPLICA_MODELS go to a random healthy replica unless the current
+request is pinned to the primary. A request is pinned once it writes, and
+ReplicaStickinessMiddleware keeps the browser pinned for
+REPLICA_STICKY_SECONDS afterwards, so cart_add -> checkout -> payment_process
+always sees its own writes. A replica further behind than REPLICA_MAX_LAG
+seconds, or one that can't be reached, is skipped until its next check.
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_MODELS = {'store.book', 'store.review', 'store.aboutsection', 'store.socialmedia'}
+
+PIN_COOKIE = 'nw_primary'
+
+_pinned = ContextVar('replica_pinned', default=False)
+_wrote = ContextVar('replica_wrote', default=False)
+
+_health_lock = threading.Lock()
+_health = {}  # alias -> (checked_at, healthy)
+
+LAG_QUERIES = {
+    'postgresql': """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """,
+}
+
+
+def pin_to_primary():
+    """Route every read in the current request/context to the primary"""
+    _pinned.set(True)
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (0 where the backend can't tell)"""
+    connection = connections[alias]
+    query = LAG_QUERIES.get(connection.vendor)
+    if not query:
+        connection.ensure_connection()
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def replica_healthy(alias):
+    now = time.monotonic()
+    with _health_lock:
+        checked_at, healthy = _health.get(alias, (None, True))
+        if checked_at is not None and now - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return healthy
+        # Claim the check so concurrent requests keep using the cached answer
+        _health[alias] = (now, healthy)
+    try:
+        healthy = replica_lag(alias) <= settings.REPLICA_MAX_LAG
+    except Exception:
+        healthy = False
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get() or model._meta.label_lower not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if replica_healthy(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+class ReplicaStickinessMiddleware:
+    """Pin requests to the primary for a while after the browser's last write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
@@ -0,0 +1,74 @@
+"""
+Indexed search for the order, payment and archived order changelists.
+
+Django's admin search ORs an icontains over every search field, which is a
+sequential scan per column. Here the shape of the term picks one indexed
+lookup instead:
+
+- ORD + hex: exact order_id (unique index)
+- an email address: case-insensitive exact email (UPPER(email) index on
+  Postgres, NOCASE index on SQLite)
+- a phone number: exact phone over the usual ways it gets typed
+- a UTR/reference (payments only): exact upi_transaction_id or
+  payment_reference
+- anything else: customer name, as a substring on Postgres (pg_trgm GIN
+  index) or a prefix on SQLite (NOCASE index)
+
+The indexes are created by migration 0010.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+
+ORDER_ID = re.compile(r'ORD[0-9A-F]{4,}', re.I)
+EMAIL = re.compile(r'[^@\s]+@[^@\s]+')
+PHONE = re.compile(r'\+?[\d\s()-]{6,20}')
+# UPI references (UTR/RRN) are 12 digits, bank references alphanumeric;
+# anything shorter is searched as a phone number
+REFERENCE = re.compile(r'(?=.*\d)[A-Z0-9]{12,}', re.I)
+
+
+def phone_variants(term):
+    """The forms a number is commonly stored in: as typed, digits, +91/0 prefixed"""
+    digits = re.sub(r'\D', '', term)
+    local = digits[-10:]
+    variants = {term, digits, local}
+    if len(local) == 10:
+        variants.update({f"+91{local}", f"+91 {local}", f"91{local}", f"0{local}"})
+    return sorted(variants)
+
+
+def name_lookup(model):
+    if connections[router.db_for_read(model)].vendor == 'postgresql':
+        return 'icontains'
+    return 'istartswith'
+
+
+def order_filter(term, model, prefix=''):
+    """Q over Order-like fields (optionally through a relation prefix) for term"""
+    term = term.strip()
+    if ORDER_ID.fullmatch(term):
+        return Q(**{f"{prefix}order_id": term.upper()})
+    if EMAIL.fullmatch(term):
+        return Q(**{f"{prefix}email__iexact": term})
+    if PHONE.fullmatch(term) and len(re.sub(r'\D', '', term)) >= 6:
+        return Q(**{f"{prefix}phone__in": phone_variants(term)})
+    return Q(**{f"{prefix}customer_name__{name_lookup(model)}": term})
+
+
+def search_orders(queryset, term):
+    """Orders or archived orders matching term; one indexed lookup"""
+    if not term.strip():
+        return queryset
+    return queryset.filter(order_filter(term, queryset.model))
+
+
+def search_payments(queryset, term):
+    term = term.strip()
+    if not term:
+        return queryset
+    if REFERENCE.fullmatch(term) and not ORDER_ID.fullmatch(term):
+        return queryset.filter(Q(upi_transaction_id=term) | Q(payment_reference=term))
+    return queryset.filter(order_filter(term, queryset.model, prefix='order__'))
@@ -0,0 +1,47 @@
+"""
+Bulk data factories shared by the test suite and the load harness.
+"""
+import uuid
+from decimal import Decimal
+
+from .models import Book, Order, OrderItem, Payment, Review
+
+
+def make_books(count, batch_size=1000, **overrides):
+    fields = {'author': 'Nitya', 'stock': 10, **overrides}
+    books = [
+        Book(
+            title=f"Book {i}", description='A story that lingers. ' * 20,
+            price=Decimal('299.00') + i % 500, image=f"books/cover-{i}.jpg", **fields,
+        )
+        for i in range(count)
+    ]
+    return Book.objects.bulk_create(books, batch_size=batch_size)
+
+
+def make_reviews(books, per_book, batch_size=1000):
+    reviews = [
+        Review(book=book, name=f"Reader {n}", rating=5, comment='Loved every page.')
+        for book in books for n in range(per_book)
+    ]
+    return Review.objects.bulk_create(reviews, batch_size=batch_size)
+
+
+def make_orders(count, books, items_per_order=2, status='pending', batch_size=1000):
+    prefix = uuid.uuid4().hex[:4].upper()
+    orders = Order.objects.bulk_create([
+        Order(
+            order_id=f"ORD{prefix}{i:08X}", customer_name=f"Customer {i}", email=f"c{i}@example.com",
+            phone=f"98{i % 10**8:08d}", address_line1='12 MG Road', city='Pune', state='Maharashtra',
+            pincode='411001', total_amount=Decimal('598.00'), payment_status=status,
+        )
+        for i in range(count)
+    ], batch_size=batch_size)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, book=books[(i + n) % len(books)], quantity=1, price=books[0].price)
+        for i, order in enumerate(orders) for n in range(items_per_order)
+    ], batch_size=batch_size)
+    Payment.objects.bulk_create([
+        Payment(order=order, amount=order.total_amount, status=status) for order in orders
+    ], batch_size=batch_size)
+    return orders
@@ -0,0 +1,118 @@
+"""
+"Similar books" from the catalog text, for books without purchase history.
+
+Each book becomes a sparse TF-IDF vector over the words of its title,
+author and description, with title and author words counting extra. The
+vectors are L2-normalised, so cosine similarity is a plain dot product.
+similar_lists() scores a batch of books at once through an inverted index
+(term -> [(book, weight)]), so only books that share a term are scored.
+Terms found in more than MAX_DF of a large catalog are dropped, since they
+say little and would make every book a candidate for every other.
+
+The top SIMILAR_BOOKS_PER_BOOK of each book are stored in SimilarBook, and
+book_detail reads them with one query on the (book, rank) index. The
+catalog is small (the home page lists all of it), so refresh() recomputes
+the vectors from the three text columns in one query. It then re-scores
+only the books a change can reach and rewrites only the lists that changed.
+BookAdmin calls it when a book's text changes or books are deleted, and so
+does the catalog import.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Book, SimilarBook
+from .recommendations import save_lists
+
+
+WORD = re.compile(r"[^\W\d_]{2,}")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have her his in into is it its of on or our she "
+    "that the their them they this to was were will with you your".split()
+)
+FIELD_WEIGHTS = {'title': 3, 'author': 2, 'description': 1}
+MAX_DF = 0.5
+MIN_DOCS_FOR_MAX_DF = 10
+MIN_SCORE = 0.05
+TEXT_FIELDS = tuple(FIELD_WEIGHTS)
+
+
+def terms(book):
+    """Weighted term frequencies of a book (anything with title/author/description)"""
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for word in WORD.findall((getattr(book, field) or '').lower()):
+            if word not in STOP_WORDS:
+                # Author names are their own features: a shared surname in a description isn't the same author
+                counts[f"@{word}" if field == 'author' else word] += weight
+    return counts
+
+
+def vectors(books):
+    """{pk: {term: weight}}, L2-normalised TF-IDF over the given books"""
+    counts = {book.pk: terms(book) for book in books}
+    df = Counter(term for tf in counts.values() for term in tf)
+    n = len(counts)
+    idf = {
+        term: math.log((1 + n) / (1 + d)) + 1 for term, d in df.items()
+        if n < MIN_DOCS_FOR_MAX_DF or d <= MAX_DF * n
+    }
+    result = {}
+    for pk, tf in counts.items():
+        vec = {term: (1 + math.log(f)) * idf[term] for term, f in tf.items() if term in idf}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        result[pk] = {term: w / norm for term, w in vec.items()}
+    return result
+
+
+def similar_lists(vecs, book_ids=None):
+    """Top SIMILAR_BOOKS_PER_BOOK [(pk, score)] for each of book_ids (all if None), in one pass"""
+    index = defaultdict(list)
+    for pk, vec in vecs.items():
+        for term, weight in vec.items():
+            index[term].append((pk, weight))
+    lists = {}
+    for pk in vecs if book_ids is None else book_ids:
+        scores = defaultdict(float)
+        for term, weight in vecs.get(pk, {}).items():
+            for other, other_weight in index[term]:
+                scores[other] += weight * other_weight
+        scores.pop(pk, None)
+        top = heapq.nsmallest(
+            settings.SIMILAR_BOOKS_PER_BOOK,
+            ((-score, other) for other, score in scores.items() if score >= MIN_SCORE),
+        )
+        lists[pk] = [(other, round(-score, 4)) for score, other in top]
+    return lists
+
+
+def listed_with(book_ids):
+    """Ids of the books whose lists include any of book_ids; read them before deleting those books"""
+    return set(SimilarBook.objects.filter(recommended__in=book_ids).values_list('book', flat=True))
+
+
+def refresh(book_ids=None):
+    """
+    Recompute the similar-books lists after the given books changed (all
+    books if None); returns the ids whose lists were rewritten.
+
+    Lists that can change: the changed books', those that share a term
+    with them, and those that listed them before. Document frequencies
+    drift slightly for the rest until the next full refresh
+    (rebuild_similar_books).
+    """
+    vecs = vectors(Book.objects.only('pk', *TEXT_FIELDS))
+    if book_ids is None:
+        affected = None
+    else:
+        changed = set(book_ids)
+        words = {term for pk in changed for term in vecs.get(pk, {})}
+        affected = changed | {pk for pk, vec in vecs.items() if words & vec.keys()}
+        affected |= listed_with(changed)
+        affected &= vecs.keys()
+    with transaction.atomic():
+        return save_lists(similar_lists(vecs, affected), affected, model=SimilarBook, value='score')
@@ -0,0 +1,90 @@
+from itertools import islice
+
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from store.assets import bundle_url, critical_css
+from store import hints
+from store.media import media_url as _media_url
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def stylesheet(context, name):
+    """
+    Inline the critical CSS and load the full bundle without blocking render,
+    on the pages the critical CSS was extracted from (CRITICAL_CSS_TEMPLATES);
+    other pages would flash unstyled, so they load the bundle normally.
+    """
+    href = bundle_url(name)
+    page = context.template.name if context.template else None
+    critical = critical_css() if page in settings.CRITICAL_CSS_TEMPLATES else ''
+    if not critical:
+        return format_html('<link rel="stylesheet" href="{}">', href)
+    return format_html(
+        '<style>{}</style>\n'
+        '  <link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        '  <noscript><link rel="stylesheet" href="{}"></noscript>',
+        mark_safe(critical), href, href,
+    )
+
+
+@register.simple_tag
+def script(name):
+    """Script tag for a built bundle"""
+    return format_html('<script src="{}"></script>', bundle_url(name))
+
+
+@register.filter
+def media_url(file, transformation=None):
+    """Memoised URL of a media file: {{ book.image|media_url }}"""
+    return _media_url(file, transformation)
+
+
+@register.simple_tag(takes_context=True)
+def resource_hints(context):
+    """Preconnect tags for the page head; also sent as a Link header"""
+    return hints.link_tags(hints.page_hints(context.get('request')))
+
+
+@register.simple_tag(takes_context=True)
+def preload_image(context, file, priority=None):
+    """Preload an image the first screen shows: {% preload_image about.author_image 'high' %}"""
+    url = _media_url(file)
+    if not url:
+        return ''
+    hints.add(context.get('request'), url, as_='image', fetchpriority=priority)
+    if priority:
+        return format_html('<link rel="preload" as="image" href="{}" fetchpriority="{}">', url, priority)
+    return format_html('<link rel="preload" as="image" href="{}">', url)
+
+
+@register.simple_tag(takes_context=True)
+def preload_covers(context, books):
+    """Preload the covers of the first ABOVE_THE_FOLD_COVERS books"""
+    with_covers = (book for book in books if book.image)
+    return format_html_join('\n  ', '{}', (
+        (preload_image(context, book.image),) for book in islice(with_covers, settings.ABOVE_THE_FOLD_COVERS)
+    ))
+
+
+@register.simple_tag
+def cover(book, position=0, lazy=False):
+    """
+    Cover <img> for a book card: the first ABOVE_THE_FOLD_COVERS load
+    straight away, the rest (and any with lazy=True, for cards always
+    below the fold) lazily over their tiny placeholder.
+    """
+    url = _media_url(book.image)
+    if not lazy and position < settings.ABOVE_THE_FOLD_COVERS:
+        return format_html('<img src="{}" alt="{}" decoding="async">', url, book.title)
+    if book.placeholder:
+        return format_html(
+            '<img src="{}" alt="{}" loading="lazy" decoding="async" '
+            'style="background: center / cover no-repeat url(\'{}\');">',
+            url, book.title, book.placeholder,
+        )
+    return format_html('<img src="{}" alt="{}" loading="lazy" decoding="async">', url, book.title)
@@ -1,3 +1,1508 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.templatetags.static import static
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+from . import (
+    assets, async_views, catalog_import, direct_upload, media, offload, prerender, recommendations, rollups, routers,
+    similar, warmup,
+)
+from .archive import load_archived
+from .catalog_import import import_books, iter_rows
+from .models import (
+    AboutSection, ArchivedOrder, Book, DailyBookSales, DailyOrderStatus, DailySales, IdempotencyKey, Order, OrderItem,
+    OwnerDigestEntry, Payment, SimilarBook, SocialMedia,
+)
+from .seed import make_books, make_orders, make_reviews
+from nityawrites.urls import sitemaps
+
+
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+# Budget helpers -------------------------------------------------------------
+
+@contextmanager
+def budget(test, max_queries, max_seconds):
+    """Fail if the block runs more than max_queries queries or takes too long"""
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+    elapsed = time.perf_counter() - start
+    if len(ctx.captured_queries) > max_queries:
+        sql = '\n'.join(f"{n}. {q['sql']}" for n, q in enumerate(ctx.captured_queries, 1))
+        test.fail(f"{len(ctx.captured_queries)} queries, budget is {max_queries}:\n{sql}")
+    test.assertLessEqual(elapsed, max_seconds, f"took {elapsed:.3f}s, budget is {max_seconds}s")
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class QueryBudgetTests(TestCase):
+    """Each view's query count must not grow with the size of the catalog or order history"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = make_books(300)
+        make_reviews(cls.books[:50], per_book=10)
+        cls.orders = make_orders(300, cls.books, items_per_order=3)
+        AboutSection.objects.create(title='About', description='Author bio')
+        SocialMedia.objects.create(platform='instagram', url='https://instagram.com/nityawrites')
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def fill_cart(self, count=5):
+        for book in self.books[:count]:
+            self.client.get(reverse('cart_add', args=[book.pk]))
+
+    def checkout_data(self):
+        return {
+            'name': 'Asha Rao', 'email': 'asha@example.com', 'phone': '9999999999',
+            'address1': '12 MG Road', 'city': 'Pune', 'state': 'Maharashtra', 'pincode': '411001',
+        }
+
+    def test_home(self):
+        with budget(self, 3, 2.0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['books']), 300)
+
+    def test_book_detail(self):
+        book = self.books[0]
+        # 4th and 5th queries: the precomputed "customers also bought" and similar-books lists
+        with budget(self, 5, 1.0):
+            response = self.client.get(reverse('book_detail', args=[book.pk]))
+        self.assertContains(response, '10 Reviews')
+
+    def test_cart_detail(self):
+        self.fill_cart()
+        with budget(self, 2, 1.0):
+            response = self.client.get(reverse('cart_detail'))
+        self.assertEqual(len(response.context['cart_items']), 5)
+
+    def test_checkout(self):
+        self.fill_cart()
+        with budget(self, 1, 1.0):
+            response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_payment_process(self):
+        self.fill_cart(20)
+        # 9th query: the order-status rollup upsert
+        with budget(self, 9, 2.0):
+            response = self.client.post(reverse('payment_process'), self.checkout_data())
+        self.assertEqual(response.status_code, 200)
+        order = response.context['order']
+        self.assertEqual(order.items.count(), 20)
+
+    def test_order_success(self):
+        order = self.orders[0]
+        with budget(self, 3, 1.0):
+            response = self.client.get(reverse('order_success', args=[order.order_id]))
+        self.assertContains(response, order.order_id)
+
+    def test_order_admin_changelist(self):
+        self.client.force_login(self.admin)
+        with budget(self, 5, 3.0):
+            response = self.client.get(reverse('admin:store_order_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_payment_admin_changelist(self):
+        self.client.force_login(self.admin)
+        with budget(self, 6, 3.0):
+            response = self.client.get(reverse('admin:store_payment_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_load_funnel_needs_debug_and_an_admin_password(self):
+        with override_settings(DEBUG=False), self.assertRaisesMessage(CommandError, 'DEBUG off'):
+            call_command('load_funnel', seed_only=True, stdout=StringIO())
+        with override_settings(DEBUG=True), self.assertRaisesMessage(CommandError, '--admin-password'):
+            call_command('load_funnel', admin_password='', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='loadtest').exists())
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class RepairSchemaTests(TransactionTestCase):
+    """repair_schema fakes migrations whose schema exists and applies the rest (DDL, so no TestCase)"""
+    DROPPED = ('store', '0014_similar_books')
+    # Indexes only, a table and two tables with constraints, all still there
+    INTACT = [('store', '0011_payment_created_indexes'), ('store', '0012_idempotency_keys'),
+              ('store', '0013_book_recommendations')]
+
+    def setUp(self):
+        self.recorder = MigrationRecorder(connection)
+        with connection.schema_editor() as editor:
+            editor.delete_model(SimilarBook)
+        for key in self.INTACT + [self.DROPPED]:
+            self.recorder.record_unapplied(*key)
+        self.addCleanup(self.restore)
+
+    def restore(self):
+        if SimilarBook._meta.db_table not in connection.introspection.table_names():
+            with connection.schema_editor() as editor:
+                editor.create_model(SimilarBook)
+        for key in self.INTACT + [self.DROPPED]:
+            self.recorder.record_applied(*key)
+
+    def applied(self):
+        return set(self.INTACT + [self.DROPPED]) & self.recorder.applied_migrations().keys()
+
+    def test_plan_fakes_existing_schema_and_applies_what_is_missing(self):
+        out = StringIO()
+        call_command('repair_schema', dry_run=True, stdout=out)
+        for app_label, name in self.INTACT:
+            self.assertIn(f'{app_label}.{name}: fake', out.getvalue())
+        self.assertIn('store.0014_similar_books: apply', out.getvalue())
+        self.assertIn('Dry run, no changes made.', out.getvalue())
+        self.assertNotIn(SimilarBook._meta.db_table, connection.introspection.table_names())
+        self.assertEqual(self.applied(), set())
+
+        out = StringIO()
+        call_command('repair_schema', stdout=out)
+        self.assertIn('Repair finished: 1 applied, 3 faked.', out.getvalue())
+        self.assertIn(SimilarBook._meta.db_table, connection.introspection.table_names())
+        self.assertEqual(self.applied(), set(self.INTACT + [self.DROPPED]))
+
+        out = StringIO()
+        call_command('repair_schema', stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+
+    def test_new_models_get_content_types_and_permissions(self):
+        from django.contrib.auth.models import Permission
+        from django.contrib.contenttypes.models import ContentType
+
+        ContentType.objects.filter(app_label='store', model='similarbook').delete()
+        call_command('repair_schema', stdout=StringIO())
+        self.assertTrue(Permission.objects.filter(codename='change_similarbook').exists())
+
+
+@skipUnless('replica' in settings.DATABASES, "run with DATABASE_REPLICA_URL=sqlite:///replica.sqlite3")
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], REPLICA_LAG_CHECK_INTERVAL=0)
+class ReplicaRouterTests(TestCase):
+    """Two unreplicated SQLite databases, so where a row is visible shows where the read went"""
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        routers._health.clear()
+        self.book = make_books(1)[0]
+        Book.objects.using('replica').create(
+            pk=self.book.pk, title='Replica copy', description='-', price=1, stock=1, image='books/r.jpg',
+        )
+        # Writes pin the current context to the primary; start each test unpinned
+        routers._pinned.set(False)
+
+    def test_catalog_reads_go_to_replica(self):
+        self.assertEqual(Book.objects.get(pk=self.book.pk).title, 'Replica copy')
+
+    def test_order_reads_stay_on_primary(self):
+        make_orders(1, [self.book])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_write_pins_following_requests_to_primary(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual([b.title for b in response.context['books']], ['Replica copy'])
+
+        response = self.client.get(reverse('cart_add', args=[self.book.pk]))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual([b.title for b in response.context['books']], ['Book 0'])
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with override_settings(REPLICA_MAX_LAG=5), mock.patch.object(routers, 'replica_lag', return_value=60):
+            self.assertEqual(Book.objects.get(pk=self.book.pk).title, 'Book 0')
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(routers, 'replica_lag', side_effect=OSError):
+            self.assertEqual(Book.objects.get(pk=self.book.pk).title, 'Book 0')
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class ArchiveOrdersTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(3)
+        self.old = make_orders(5, self.books, status='completed')
+        self.pending = make_orders(2, self.books, status='pending')
+        Order.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.recent = make_orders(2, self.books, status='completed')
+
+    def test_archives_old_final_orders_in_batches(self):
+        call_command('archive_orders', days=180, batch_size=2, stdout=StringIO())
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+        self.assertEqual(Order.objects.count(), 4)
+        self.assertFalse(Payment.objects.filter(order__order_id=self.old[0].order_id).exists())
+        record = ArchivedOrder.objects.get(order_id=self.old[0].order_id)
+        self.assertEqual(len(load_archived(record)['items']), 2)
+
+    def test_archive_to_jsonl_file(self):
+        call_command('archive_orders', days=180, to_file=True, stdout=StringIO())
+        archived = ArchivedOrder.objects.get(order_id=self.old[1].order_id)
+        self.assertEqual(archived.data, {})
+        self.assertTrue(archived.archive_file.endswith('.jsonl.gz'))
+        self.assertEqual(load_archived(archived)['customer_name'], self.old[1].customer_name)
+
+    def test_archived_orders_searchable_in_admin(self):
+        call_command('archive_orders', days=180, stdout=StringIO())
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        response = self.client.get(reverse('admin:store_archivedorder_changelist'), {'q': self.old[2].order_id})
+        self.assertContains(response, self.old[2].order_id)
+        archived = ArchivedOrder.objects.get(order_id=self.old[2].order_id)
+        response = self.client.get(reverse('admin:store_archivedorder_change', args=[archived.pk]))
+        self.assertContains(response, 'Book 0')
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class CatalogImportTests(TestCase):
+    CSV = (
+        "Title,Author,Description,Price,Stock,image_url\n"
+        "Book 0,Nitya,Updated,450,7,\n"
+        "New Book,Someone,Fresh,299.5,3,https://covers.example.com/new.jpg\n"
+        ",Nitya,No title,100,1,\n"
+        "Bad Price,Nitya,-,abc,1,\n"
+    )
+
+    def setUp(self):
+        self.existing = make_books(1)[0]
+
+    def run_csv(self, **kwargs):
+        with mock.patch('store.catalog_import.fetch_cover', return_value=b'jpeg-bytes'):
+            return import_books(iter_rows(BytesIO(self.CSV.encode()), 'books.csv'), **kwargs)
+
+    def test_csv_upserts_on_title_and_author(self):
+        result = self.run_csv(batch_size=1)
+        self.assertEqual((result.rows, result.created, result.updated, result.covers), (4, 1, 1, 1))
+        self.assertEqual([n for n, _ in result.errors], [4, 5])
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.description, self.existing.stock), ('Updated', 7))
+        new = Book.objects.get(title='New Book', author='Someone')
+        self.assertTrue(new.image.name.startswith('books/new'))
+
+        # Re-running updates in place instead of duplicating
+        result = self.run_csv()
+        self.assertEqual((result.created, result.updated, result.covers), (0, 2, 0))
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_xlsx_import_command(self):
+        from openpyxl import Workbook
+        import tempfile
+
+        workbook = Workbook()
+        workbook.active.append(['title', 'author', 'description', 'price', 'stock'])
+        for n in range(25):
+            workbook.active.append([f'Sheet Book {n}', 'Nitya', 'From a sheet', 199, n])
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as f:
+            workbook.save(f.name)
+            out = StringIO()
+            call_command('import_books', f.name, batch_size=10, stdout=out, stderr=StringIO())
+        self.assertIn('25 rows: 25 created', out.getvalue())
+        self.assertEqual(Book.objects.filter(title__startswith='Sheet Book').count(), 25)
+
+    def test_admin_import_page(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        response = self.client.get(reverse('admin:store_book_changelist'))
+        self.assertContains(response, reverse('admin:store_book_import'))
+        upload = SimpleUploadedFile('books.csv', self.CSV.encode(), content_type='text/csv')
+        with mock.patch('store.catalog_import.fetch_cover', return_value=b'jpeg-bytes'):
+            response = self.client.post(reverse('admin:store_book_import'), {'file': upload}, follow=True)
+        self.assertContains(response, '1 created, 1 updated')
+        self.assertContains(response, 'Row 5: invalid price')
+
+    def test_rows_that_do_not_fit_the_columns_are_errors(self):
+        rows = iter_rows(StringIO(
+            "title,author,price,stock\n"
+            f"{'T' * 201},Nitya,100\n"
+            f"Long Author,{'A' * 101},100\n"
+            "Too Dear,Nitya,123456789\n"
+            "Not A Number,Nitya,NaN\n"
+            "Free Money,Nitya,-5\n"
+            "Endless,Nitya,100,inf\n"
+            "Warehouse,Nitya,100,1e12\n"
+            f"{'T' * 200},{'A' * 100},99999999.99,2147483647\n"
+        ), 'books.csv')
+        result = import_books(rows)
+        self.assertEqual(result.created, 1)
+        self.assertEqual([message for _, message in result.errors], [
+            'title is longer than 200 characters', 'author is longer than 100 characters',
+            'price 123456789 is out of range', "invalid price 'NaN'", 'price -5 is out of range',
+            "invalid stock 'inf'", 'stock 1e12 is out of range',
+        ])
+
+    def test_covers_are_fetched_over_http_before_the_transaction(self):
+        with self.assertRaisesMessage(ValueError, 'only http and https'):
+            catalog_import.fetch_cover('file:///etc/passwd')
+        with mock.patch('urllib.request.urlopen') as urlopen, mock.patch.object(catalog_import, 'MAX_COVER_BYTES', 4):
+            urlopen.return_value.__enter__.return_value.read.side_effect = lambda size: b'x' * size
+            with self.assertRaisesMessage(ValueError, 'larger than'):
+                catalog_import.fetch_cover('https://covers.example.com/huge.jpg')
+
+        events = []
+        atomic = transaction.atomic
+
+        def tracked_atomic(*args, **kwargs):
+            events.append('atomic')
+            return atomic(*args, **kwargs)
+
+        with mock.patch('store.catalog_import.fetch_cover', side_effect=lambda url: events.append('fetch') or b'jpeg'), \
+                mock.patch('store.catalog_import.transaction.atomic', tracked_atomic):
+            result = import_books(iter_rows(BytesIO(self.CSV.encode()), 'books.csv'))
+        self.assertEqual(result.covers, 1)
+        self.assertEqual(events[:2], ['fetch', 'atomic'])
+        self.assertTrue(Book.objects.get(title='New Book').image.name.startswith('books/new'))
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(3)
+        self.orders = make_orders(3, self.books, items_per_order=2, status='pending')
+        rollups.rebuild()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(self.admin)
+
+    def snapshot(self):
+        return (
+            sorted(DailySales.objects.values_list('date', 'orders', 'units', 'revenue')),
+            sorted(DailyBookSales.objects.filter(units__gt=0).values_list('date', 'book_id', 'units', 'revenue')),
+            sorted(DailyOrderStatus.objects.filter(orders__gt=0).values_list('date', 'payment_status', 'orders')),
+        )
+
+    def test_verify_and_fail_update_rollups(self):
+        order = self.orders[0]
+        self.client.get(reverse('admin_order_verify', args=[order.pk]))
+        day = DailySales.objects.get()
+        self.assertEqual((day.orders, day.units, day.revenue), (1, 2, order.total_amount))
+        statuses = dict(DailyOrderStatus.objects.values_list('payment_status', 'orders'))
+        self.assertEqual((statuses['pending'], statuses['verified']), (2, 1))
+
+        self.client.get(reverse('admin_order_fail', args=[order.pk]))
+        day.refresh_from_db()
+        self.assertEqual((day.orders, day.units, day.revenue), (0, 0, 0))
+
+    def test_bulk_actions_match_rebuild(self):
+        self.client.post(reverse('admin:store_order_changelist'), {
+            'action': 'mark_as_verified', '_selected_action': [o.pk for o in self.orders[:2]],
+        })
+        self.client.post(reverse('admin:store_payment_changelist'), {
+            'action': 'mark_as_failed', '_selected_action': [self.orders[1].payment.pk],
+        })
+        incremental = self.snapshot()
+        self.assertEqual(incremental[0][0][1:3], (1, 2))
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_payment_fail_action_under_the_status_filter(self):
+        order = self.orders[0]
+        for verified in self.orders[:2]:
+            self.client.get(reverse('admin_order_verify', args=[verified.pk]))
+        self.client.post(reverse('admin:store_payment_changelist') + '?status=verified', {
+            'action': 'mark_as_failed', '_selected_action': [order.payment.pk],
+        })
+        self.assertEqual(Order.objects.get(pk=order.pk).payment_status, 'failed')
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_dashboard_period_is_one_of_the_choices(self):
+        for days in ['99999999999', '0', '-5', '12', 'abc']:
+            response = self.client.get(reverse('admin:store_dailysales_changelist'), {'days': days})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['days'], 30)
+        response = self.client.get(reverse('admin:store_dailysales_changelist'), {'days': '365'})
+        self.assertEqual(response.context['days'], 365)
+
+    def test_dashboard_reads_only_rollups(self):
+        self.client.get(reverse('admin_order_verify', args=[self.orders[0].pk]))
+        with budget(self, 8, 2.0) as ctx:
+            response = self.client.get(reverse('admin:store_dailysales_changelist'))
+        self.assertContains(response, 'Book 0')
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('"store_order"', tables)
+        self.assertNotIn('"store_orderitem"', tables)
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class ReconcileStatementTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(2)
+        self.orders = make_orders(40, self.books, status='pending_verification')
+        for n, order in enumerate(self.orders):
+            Payment.objects.filter(order=order).update(payment_reference=f"4123 4567 {n:04d}")
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def statement(self):
+        lines = ["Date,Narration,UTR No,Amount"]
+        # 30 clean matches, half found only in the narration
+        for n, order in enumerate(self.orders[:30]):
+            utr = f"41234567{n:04d}"
+            if n % 2:
+                lines.append(f"01/10/2026,UPI/{utr}/{order.customer_name},,\"{order.total_amount:,}\"")
+            else:
+                lines.append(f"01/10/2026,UPI credit,{utr},{order.total_amount}")
+        lines.append(f"01/10/2026,UPI credit,412345670030,1.00")                # amount differs
+        lines.append(f"01/10/2026,UPI credit,412345670031,{self.orders[31].total_amount}")
+        lines.append(f"02/10/2026,UPI credit,412345670031,{self.orders[31].total_amount}")  # claimed twice
+        lines.append("01/10/2026,UPI credit,999999999999,100.00")               # unknown
+        lines.append("01/10/2026,ATM withdrawal,,-500.00")                      # no reference
+        return SimpleUploadedFile('statement.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+    def test_upload_classifies_statement_lines(self):
+        response = self.client.post(reverse('admin:store_payment_reconcile'), {'file': self.statement()})
+        result = response.context['result']
+        self.assertEqual(len(result.matched), 30)
+        self.assertEqual(len(result.ambiguous), 3)
+        self.assertEqual(len(result.unmatched), 2)
+        self.assertFalse(Payment.objects.filter(status='verified').exists())
+
+    def test_confirm_verifies_matches_in_bulk(self):
+        response = self.client.post(reverse('admin:store_payment_reconcile'), {'file': self.statement()})
+        # 14th-18th: co-purchase upsert and the affected books' recommendation lists
+        with budget(self, 18, 3.0):
+            response = self.client.post(reverse('admin:store_payment_reconcile'), {
+                'payment_ids': response.context['payment_ids'],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Payment.objects.filter(status='verified', verified_at__isnull=False).count(), 30)
+        self.assertEqual(Order.objects.filter(payment_status='verified').count(), 30)
+        self.assertEqual(DailySales.objects.get().orders, 30)
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[],
+    OWNER_DIGEST_RECIPIENTS=['owner@example.com'], CRON_SECRET='s3cret',
+)
+class OwnerDigestTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(2)
+        self.orders = make_orders(3, self.books, status='pending_verification')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def test_confirmation_goes_to_customer_only(self):
+        for order in self.orders:
+            self.client.get(reverse('admin_order_verify', args=[order.pk]))
+        self.assertEqual([m.to for m in mail.outbox], [[o.email] for o in self.orders])
+        self.assertEqual(OwnerDigestEntry.objects.filter(sent_at__isnull=True).count(), 3)
+
+        # Resending a confirmation doesn't report the order twice
+        self.client.get(reverse('admin_order_verify', args=[self.orders[0].pk]))
+        self.assertEqual(OwnerDigestEntry.objects.count(), 3)
+
+    def test_digest_sends_one_summary_per_run(self):
+        for order in self.orders:
+            self.client.get(reverse('admin_order_verify', args=[order.pk]))
+        mail.outbox = []
+
+        call_command('send_owner_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        digest = mail.outbox[0]
+        self.assertEqual(digest.to, ['owner@example.com'])
+        self.assertIn('3 order(s)', digest.subject)
+        for order in self.orders:
+            self.assertIn(order.order_id, digest.body)
+        self.assertIn('Book 0 x 1', digest.body)
+
+        call_command('send_owner_digest', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_leaves_entries_pending(self):
+        from . import digest
+
+        for order in self.orders:
+            self.client.get(reverse('admin_order_verify', args=[order.pk]))
+        with mock.patch.object(digest, 'send_mail', side_effect=OSError('SMTP down')), self.assertRaises(OSError):
+            digest.send_pending()
+        self.assertEqual(OwnerDigestEntry.objects.filter(sent_at__isnull=True).count(), 3)
+        self.assertEqual(digest.send_pending(), 3)
+        self.assertFalse(OwnerDigestEntry.objects.filter(sent_at__isnull=True).exists())
+
+    def test_cron_endpoint_requires_secret(self):
+        self.assertEqual(self.client.get(reverse('cron_owner_digest')).status_code, 403)
+        response = self.client.get(reverse('cron_owner_digest'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertContains(response, 'No new orders')
+
+
+PRERENDER_STORAGES = {**TEST_STORAGES, 'prerender': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+PRERENDER_MIDDLEWARE = [
+    'store.prerender.PrerenderedPageMiddleware' if m == 'store.routers.ReplicaStickinessMiddleware' else m
+    for m in settings.MIDDLEWARE
+]
+
+
+@override_settings(
+    STORAGES=PRERENDER_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[],
+    MIDDLEWARE=PRERENDER_MIDDLEWARE, PRERENDER_PAGES=True, PRERENDER_HOST='testserver', PRERENDER_BACKGROUND=False,
+)
+class PrerenderTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(3)
+        make_reviews(self.books[:1], per_book=2)
+        call_command('prerender_pages', stdout=StringIO())
+
+    def test_serves_catalog_without_touching_the_database(self):
+        for path in ['/', reverse('book_detail', args=[self.books[0].pk]), '/robots.txt', '/sitemap.xml']:
+            with self.assertNumQueries(0):
+                response = self.client.get(path)
+            self.assertEqual(response['X-Prerendered'], '1', path)
+        self.assertTrue(response['Content-Type'].startswith('application/xml'))
+
+    def test_cart_and_unknown_pages_fall_back_to_live_views(self):
+        response = self.client.get(reverse('cart_detail'))
+        self.assertNotIn('X-Prerendered', response)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/', {'utm_source': 'x'})
+        self.assertNotIn('X-Prerendered', response)
+
+    def test_review_form_fetches_csrf_token(self):
+        response = self.client.get(reverse('book_detail', args=[self.books[0].pk]))
+        self.assertContains(response, 'name="csrfmiddlewaretoken" value=""')
+        self.assertContains(response, reverse('csrf_token'))
+        self.assertTrue(self.client.get(reverse('csrf_token')).json()['token'])
+
+    def test_changes_rerender_only_affected_pages(self):
+        book = self.books[1]
+        with mock.patch.object(prerender, 'publish', wraps=prerender.publish) as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                book.reviews.create(name='Meera', comment='Could not put it down')
+        publish.assert_called_once_with([reverse('book_detail', args=[book.pk])])
+        self.assertContains(self.client.get(reverse('book_detail', args=[book.pk])), 'Could not put it down')
+
+        path = reverse('book_detail', args=[book.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotContains(self.client.get('/'), book.title + '<')
+
+    def test_schedule_after_a_rolled_back_transaction(self):
+        path = reverse('book_detail', args=[self.books[2].pk])
+        with mock.patch.object(prerender, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    prerender.schedule(render=[reverse('book_detail', args=[self.books[0].pk])])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            prerender.schedule(render=[path])
+        publish.assert_called_once_with([path])
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class CatalogApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = make_books(120)
+        make_reviews(cls.books[:2], per_book=3)
+
+    def test_sparse_fields_and_cursor_pagination(self):
+        seen = []
+        url = reverse('api_book_list') + '?fields=title,price&limit=50'
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            self.assertEqual(set(data['results'][0]), {'id', 'title', 'price'})
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, sorted(b.pk for b in self.books))
+
+    def test_only_requested_columns_are_selected(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('api_book_list'), {'fields': 'title'})
+        self.assertNotIn('description', ctx.captured_queries[0]['sql'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('api_book_list'), {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+
+    def test_etag_and_gzip(self):
+        url = reverse('api_book_detail', args=[self.books[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['title'], 'Book 0')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        response = self.client.get(reverse('api_book_list'), {'limit': 200}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 120)
+
+    def test_reviews_for_a_book(self):
+        data = self.client.get(reverse('api_book_reviews', args=[self.books[1].pk])).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual({row['book'] for row in data['results']}, {self.books[1].pk})
+        self.assertEqual(self.client.get(reverse('api_book_detail', args=[999999])).status_code, 404)
+
+
+def png_upload(name='proof.png'):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), 'white').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[], DIRECT_UPLOAD_BACKEND='local',
+)
+class DirectUploadTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(2)
+        self.order = make_orders(1, self.books, status='pending')[0]
+        session = self.client.session
+        session['current_order_id'] = self.order.pk
+        session.save()
+
+    def token(self, kind='payment', target=None):
+        return self.client.post(reverse('direct_upload_token'), {
+            'kind': kind, 'target': self.order.pk if target is None else target, 'filename': 'proof.png',
+        })
+
+    def test_token_only_for_the_sessions_order(self):
+        self.assertEqual(self.token(target=self.order.pk + 1).status_code, 403)
+        self.assertEqual(self.token(kind='book', target=self.books[0].pk).status_code, 403)
+        issued = self.token().json()
+        self.assertEqual(issued['upload']['url'], reverse('direct_upload_local'))
+        self.assertTrue(issued['upload']['fields']['token'])
+
+    def test_upload_then_confirm_attaches_screenshot(self):
+        issued = self.token().json()
+        self.assertEqual(self.client.post(reverse('direct_upload_confirm'), {'token': issued['token']}).status_code, 400)
+
+        response = self.client.post(issued['upload']['url'], {**issued['upload']['fields'], 'file': png_upload()})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('direct_upload_confirm'), {
+            'token': issued['token'], 'payment_reference': '412345678901',
+        })
+        self.assertTemplateUsed(response, 'store/payment_submitted.html')
+        payment = Payment.objects.get(order=self.order)
+        self.assertTrue(payment.payment_screenshot.name.startswith('payment_screenshots/'))
+        self.assertEqual(payment.payment_reference, '412345678901')
+        self.assertEqual(payment.status, 'pending_verification')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_status, 'pending_verification')
+
+    def test_bad_tokens_and_files_are_rejected(self):
+        issued = self.token().json()
+        upload_url = issued['upload']['url']
+        response = self.client.post(upload_url, {'token': issued['token'] + 'x', 'file': png_upload()})
+        self.assertEqual(response.status_code, 403)
+        not_image = SimpleUploadedFile('proof.png', b'not an image', content_type='image/png')
+        self.assertEqual(self.client.post(upload_url, {'token': issued['token'], 'file': not_image}).status_code, 400)
+        with override_settings(DIRECT_UPLOAD_TOKEN_AGE=-1):
+            response = self.client.post(upload_url, {'token': issued['token'], 'file': png_upload()})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('expired', response.json()['error'])
+
+    def test_tokens_upload_once(self):
+        issued = self.token().json()
+        fields = issued['upload']['fields']
+        first = self.client.post(issued['upload']['url'], {**fields, 'file': png_upload()}).json()['name']
+        response = self.client.post(issued['upload']['url'], {**fields, 'file': png_upload()})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post(reverse('direct_upload_confirm'), {'token': issued['token']}).status_code, 200)
+        self.assertEqual(Payment.objects.get(order=self.order).payment_screenshot.name, first)
+
+    def test_only_image_extensions_and_formats_are_stored(self):
+        issued = self.client.post(reverse('direct_upload_token'), {
+            'kind': 'payment', 'target': self.order.pk, 'filename': 'proof.html',
+        }).json()
+        self.assertNotIn('.html', direct_upload.read_token(issued['token'])['name'])
+
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), 'white').save(buffer, 'BMP')
+        bmp = SimpleUploadedFile('proof.png', buffer.getvalue(), content_type='image/png')
+        response = self.client.post(issued['upload']['url'], {**issued['upload']['fields'], 'file': bmp})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(DIRECT_UPLOAD_BACKEND='cloudinary', DIRECT_UPLOAD_MAX_BYTES=1000)
+    def test_cloudinary_confirm_rejects_oversize_uploads(self):
+        from django.core import signing
+
+        name = 'media/payment_screenshots/abc'
+        token = signing.dumps({'kind': 'payment', 'target': self.order.pk, 'name': name}, salt=direct_upload.SALT)
+        with mock.patch('cloudinary.utils.verify_api_response_signature', return_value=True), \
+                mock.patch('cloudinary.api.resource', return_value={'bytes': 1001}), \
+                mock.patch('cloudinary.uploader.destroy') as destroy:
+            response = self.client.post(reverse('direct_upload_confirm'), {
+                'token': token, 'version': '1', 'signature': 'sig',
+            })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('too large', response.json()['error'])
+        destroy.assert_called_once_with(name, invalidate=True)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_status, 'pending')
+
+    def test_confirm_leaves_processed_orders_alone(self):
+        issued = self.token().json()
+        self.client.post(issued['upload']['url'], {**issued['upload']['fields'], 'file': png_upload()})
+        Order.objects.filter(pk=self.order.pk).update(payment_status='verified')
+        response = self.client.post(reverse('direct_upload_confirm'), {'token': issued['token']})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_status, 'verified')
+        self.assertFalse(Payment.objects.get(order=self.order).payment_screenshot)
+
+    def test_admin_book_form_takes_uploaded_cover(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        book = self.books[0]
+        issued = self.token(kind='book', target=book.pk).json()
+        self.client.post(issued['upload']['url'], {**issued['upload']['fields'], 'file': png_upload('cover.png')})
+        response = self.client.post(reverse('admin:store_book_change', args=[book.pk]), {
+            'title': book.title, 'author': book.author, 'description': book.description,
+            'price': book.price, 'stock': book.stock, 'direct_image_token': issued['token'],
+        })
+        self.assertEqual(response.status_code, 302)
+        book.refresh_from_db()
+        self.assertTrue(book.image.name.startswith('books/'))
+        self.assertTrue(book.image.name.endswith('.png'))
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class MediaUrlTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(20)
+        for book in self.books:
+            book.image.name = f"books/cover-{book.pk}.jpg"
+        Book.objects.bulk_update(self.books, ['image'])
+        # Ids (and so names) repeat between tests
+        media.clear_cache()
+
+    def test_urls_are_built_once_per_file(self):
+        from django.core.files.storage import InMemoryStorage
+
+        with mock.patch.object(InMemoryStorage, 'url', autospec=True, side_effect=lambda self, name: f"/media/{name}") as url:
+            first = self.client.get(reverse('home'))
+            self.client.get(reverse('home'))
+            self.client.get(reverse('cart_add', args=[self.books[0].pk]))
+        self.assertContains(first, f'src="/media/books/cover-{self.books[0].pk}.jpg"')
+        # One per cover, plus the probe for the media host to preconnect to
+        self.assertEqual(url.call_count, 21)
+
+    def test_transformation_is_ignored_off_cloudinary(self):
+        self.assertEqual(media.media_url(self.books[0].image, 'c_limit,w_600'), media.media_url(self.books[0].image))
+        self.assertEqual(media.media_url(''), '')
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[], ABOVE_THE_FOLD_COVERS=2,
+)
+class CoverLoadingTests(TestCase):
+
+    def test_uploaded_cover_gets_a_placeholder(self):
+        book = Book(title='Covered', description='x', price=100, image=png_upload('cover.png'))
+        book.save()
+        self.assertTrue(book.placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(book.placeholder), 1000)
+
+        book.image = None
+        book.save()
+        self.assertEqual(book.placeholder, '')
+
+    def test_home_preloads_first_covers_and_lazy_loads_the_rest(self):
+        make_books(5, placeholder='data:image/jpeg;base64,AAAA')
+        response = self.client.get(reverse('home'))
+        link = response['Link']
+        self.assertIn('rel=preload; as=style', link)
+        self.assertIn('<https://fonts.gstatic.com>; rel=preconnect; crossorigin=anonymous', link)
+        self.assertEqual(link.count('as=image'), 2)
+        self.assertIn('</media/books/cover-4.jpg>; rel=preload; as=image', link)  # newest first
+        self.assertContains(response, 'rel="preload" as="image"', count=2)
+        self.assertContains(response, 'loading="lazy"', count=3)
+        self.assertContains(response, "url('data:image/jpeg;base64,AAAA')", count=3)
+
+    @override_settings(ABOVE_THE_FOLD_COVERS=1000)
+    def test_related_books_always_lazy_load(self):
+        from django.template.loader import render_to_string
+
+        books = make_books(3)
+        html = render_to_string('store/related_books.html', {'books': books, 'heading': 'Customers Also Bought'})
+        self.assertEqual(html.count('loading="lazy"'), 3)
+
+    def test_make_placeholders_fills_in_existing_covers(self):
+        from django.core.files.storage import default_storage
+
+        name = default_storage.save('books/old.png', png_upload())
+        book = make_books(1)[0]
+        Book.objects.filter(pk=book.pk).update(image=name)
+        call_command('make_placeholders', stdout=StringIO())
+        self.assertTrue(Book.objects.get(pk=book.pk).placeholder.startswith('data:image/jpeg'))
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class AssetPipelineTests(TestCase):
+
+    def setUp(self):
+        assets.bundle_url.cache_clear()
+        assets.critical_css.cache_clear()
+        self.addCleanup(assets.bundle_url.cache_clear)
+        self.addCleanup(assets.critical_css.cache_clear)
+
+    def test_minify_js_keeps_code_between_comments(self):
+        source = (
+            "/* header\n"
+            " * comment */\n"
+            "function a() {\n"
+            "    // note\n"
+            "    return 1; /* trailing */\n"
+            "}\n"
+            "/* one */ var b = 2; /* two */\n"
+            "var url = 'http://example.com';\n"
+        )
+        self.assertEqual(assets.minify_js(source), (
+            "function a() {\n"
+            "return 1; /* trailing */\n"
+            "}\n"
+            "/* one */ var b = 2; /* two */\n"
+            "var url = 'http://example.com';"
+        ))
+
+    def test_build_assets_writes_bundles_and_critical_css(self):
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as out_dir, override_settings(ASSET_BUILD_DIR=Path(out_dir)):
+            call_command('build_assets', stdout=StringIO())
+            written = {path.name: path.read_text(encoding='utf-8') for path in Path(out_dir).iterdir()}
+        self.assertEqual(set(written), set(settings.ASSET_BUNDLES) | {assets.CRITICAL_CSS_NAME})
+        self.assertNotIn('/*', written['site.min.css'])
+        self.assertTrue(written[assets.CRITICAL_CSS_NAME])
+        self.assertLess(len(written[assets.CRITICAL_CSS_NAME]), len(written['site.min.css']))
+        self.assertIn('function', written['site.min.js'])
+
+    def test_stylesheet_tag_inlines_critical_css(self):
+        from django.template import Template, Context
+
+        source = "{% load store_assets %}{% stylesheet 'site.min.css' %}{% script 'site.min.js' %}"
+        with mock.patch('store.templatetags.store_assets.critical_css', return_value='body{margin:0}'):
+            html = Template(source, name='store/index.html').render(Context())
+            other_page = Template(source, name='store/checkout.html').render(Context())
+        self.assertIn('<style>body{margin:0}</style>', html)
+        self.assertIn('rel="preload"', html)
+        self.assertIn('<noscript>', html)
+        self.assertIn('<script src=', html)
+        # Its critical CSS wasn't extracted for this page, so it would flash unstyled
+        self.assertNotIn('<style>', other_page)
+        self.assertIn('<link rel="stylesheet"', other_page)
+
+        with mock.patch('store.templatetags.store_assets.critical_css', return_value=''):
+            html = Template(source, name='store/index.html').render(Context())
+        self.assertNotIn('<style>', html)
+        self.assertIn('<link rel="stylesheet"', html)
+
+    def test_pages_extending_base_get_critical_css_only_if_extracted_for(self):
+        with mock.patch('store.templatetags.store_assets.critical_css', return_value='body{margin:0}'):
+            home = self.client.get(reverse('home'))
+            cart = self.client.get(reverse('cart_detail'))
+        self.assertContains(home, '<style>body{margin:0}</style>')
+        self.assertNotContains(cart, '<style>body{margin:0}</style>')
+        self.assertContains(cart, '<link rel="stylesheet"')
+
+    def test_bundle_url_falls_back_to_source_when_not_built(self):
+        with override_settings(DEBUG=True), mock.patch('store.assets.finders.find', return_value=None):
+            self.assertEqual(assets.bundle_url('site.min.js'), static('script.js'))
+
+
+class AsyncCatalogUrls:
+    """The project URLs with the catalog served by async_views, as asgi.py does"""
+    urlpatterns = [
+        path('sitemap.xml', async_views.sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+        path('', async_views.home, name='home'),
+        path('book/<int:pk>/', async_views.book_detail, name='book_detail'),
+        path('order/success/<str:order_id>/', async_views.order_success, name='order_success'),
+        path('', include('nityawrites.urls')),
+    ]
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class AsyncViewTests(TestCase):
+    """The async catalog views must render what the sync ones do"""
+
+    def setUp(self):
+        self.books = make_books(4)
+        make_reviews(self.books[:1], per_book=3)
+        self.order = make_orders(2, self.books[:2], items_per_order=2, status='verified')[0]
+        recommendations.rebuild()
+        similar.refresh()
+        AboutSection.objects.create(title='About', description='Author bio')
+        SocialMedia.objects.create(platform='instagram', url='https://instagram.com/nityawrites')
+
+    def compare(self, path, keys=()):
+        async def get():
+            return await self.async_client.get(path)
+
+        sync_response = self.client.get(path)
+        with override_settings(ROOT_URLCONF=AsyncCatalogUrls):
+            async_response = async_to_sync(get)()
+            self.assertTrue(asyncio.iscoroutinefunction(async_response.resolver_match.func))
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        for key in keys:
+            expected, actual = sync_response.context[key], async_response.context[key]
+            if hasattr(expected, '__iter__'):
+                expected, actual = list(expected), list(actual)
+            self.assertEqual(actual, expected, key)
+        return sync_response, async_response
+
+    def test_home(self):
+        sync_response, _ = self.compare('/', ['books', 'about', 'social_links', 'db_error'])
+        self.assertEqual(len(sync_response.context['books']), 4)
+
+    def test_book_detail(self):
+        sync_response, _ = self.compare(
+            reverse('book_detail', args=[self.books[0].pk]),
+            ['book', 'social_links', 'reviews', 'also_bought', 'similar_books'],
+        )
+        self.assertEqual(len(sync_response.context['reviews']), 3)
+        self.assertEqual(sync_response.context['also_bought'], [self.books[1]])
+        self.compare(reverse('book_detail', args=[10**6]))
+
+    def test_order_success(self):
+        sync_response, async_response = self.compare(reverse('order_success', args=[self.order.order_id]), ['order'])
+        self.assertContains(async_response, self.books[1].title)
+        self.compare(reverse('order_success', args=['ORDMISSING']))
+
+    def test_sitemap(self):
+        sync_response, async_response = self.compare('/sitemap.xml')
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertContains(async_response, reverse('book_detail', args=[self.books[3].pk]))
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[],
+    OFFLOAD_WORKERS=1, OFFLOAD_MAX_PENDING=1,
+)
+class OffloadTests(TestCase):
+
+    def setUp(self):
+        # A fresh one-slot pool per test
+        stats = dict.fromkeys(offload._stats, 0)
+        patcher = mock.patch.multiple(offload, _executor=None, _slots=None, _stats=stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.addCleanup(lambda: offload._executor and offload._executor.shutdown(wait=True))
+        self.addCleanup(self.release.set)
+
+    def fill_pool(self):
+        return offload.submit(self.release.wait)
+
+    def test_run_rejects_when_the_pool_is_full(self):
+        blocker = self.fill_pool()
+        with self.assertRaises(offload.PoolBusy):
+            offload.run(len, 'abc')
+        self.release.set()
+        blocker.result(timeout=5)
+        self.assertEqual(offload.stats()['rejected'], 1)
+
+    def test_run_times_out(self):
+        with self.assertRaises(offload.PoolTimeout):
+            offload.run(self.release.wait, timeout=0.01)
+        self.assertEqual(offload.stats()['timed_out'], 1)
+
+    def test_payment_page_falls_back_without_qr_code(self):
+        book = make_books(1)[0]
+        self.client.get(reverse('cart_add', args=[book.pk]))
+        self.fill_pool()
+        response = self.client.post(reverse('payment_process'), {
+            'name': 'Asha Rao', 'email': 'asha@example.com', 'phone': '9999999999',
+            'address1': '12 MG Road', 'city': 'Pune', 'state': 'Maharashtra', 'pincode': '411001',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['qr_code'])
+        self.assertNotContains(response, 'alt="UPI QR Code"')
+        self.assertContains(response, 'QR code is unavailable right now')
+        self.assertContains(response, 'upi://pay?')
+
+    def test_screenshot_upload_asks_for_a_retry_when_the_pool_is_full(self):
+        order = make_orders(1, make_books(1), status='pending')[0]
+        self.fill_pool()
+        response = self.client.post(reverse('upload_payment_proof', args=[order.pk]), {
+            'payment_screenshot': png_upload(),
+        })
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'upload your screenshot again', status_code=503)
+        self.assertFalse(Payment.objects.get(order=order).payment_screenshot)
+        self.assertEqual(Order.objects.get(pk=order.pk).payment_status, 'pending')
+
+    def test_decompression_bombs_are_invalid_images(self):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (100, 100), 'white').save(buffer, 'PNG')
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 10), self.assertRaisesMessage(ValueError, 'Not a valid image'):
+            offload.prepare_screenshot(buffer.getvalue())
+
+    @override_settings(OFFLOAD_MAX_PENDING=2)
+    def test_cancelled_jobs_are_not_counted_as_completed(self):
+        self.fill_pool()
+        queued = offload.submit(len, 'abc')
+        self.assertTrue(queued.cancel())
+        self.assertEqual((offload.stats()['cancelled'], offload.stats()['completed']), (1, 0))
+
+
+class WarmupTests(TestCase):
+
+    def test_warmup_fills_the_cached_loader_past_a_broken_template(self):
+        from django.template import TemplateSyntaxError, engines
+
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+        self.addCleanup(loader.reset)
+        real_get_template = warmup.get_template
+
+        def get_template(name):
+            if name == 'store/cart.html':
+                raise TemplateSyntaxError('broken')
+            return real_get_template(name)
+
+        with mock.patch.object(warmup, 'get_template', get_template), self.assertLogs('store.warmup', 'ERROR'):
+            warmed = warmup.warm_templates()
+        self.assertNotIn('store/cart.html', warmed)
+        self.assertIn('store/base.html', warmed)
+        self.assertEqual(len(warmed), len(warmup.store_template_names()) - 1)
+        self.assertIn('store/book_detail.html', loader.get_template_cache)
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class CompressionTests(TestCase):
+
+    def setUp(self):
+        make_books(30)
+
+    def test_home_is_brotli_compressed(self):
+        import brotli
+
+        plain = self.client.get(reverse('home'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content) // 3)
+
+        response = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_pages_with_csrf_tokens_are_padded_gzip(self):
+        book = Book.objects.first()
+        sizes = set()
+        for _ in range(5):
+            response = self.client.get(reverse('book_detail', args=[book.pk]), HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+            sizes.add(len(response.content))
+        self.assertGreater(len(sizes), 1)
+
+    def test_streaming_and_binary_responses(self):
+        from django.http import HttpResponse, StreamingHttpResponse
+        from django.test import RequestFactory
+
+        from .compression import CompressionMiddleware
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        rows = [f"{n},Book {n}\n".encode() for n in range(500)]
+        middleware = CompressionMiddleware(lambda r: StreamingHttpResponse(iter(rows), content_type='text/csv'))
+        response = middleware(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(rows))
+
+        xlsx = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        response = CompressionMiddleware(lambda r: HttpResponse(b'PK' * 500, content_type=xlsx))(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = CompressionMiddleware(lambda r: HttpResponse(b'tiny'))(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class OrderSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orders = make_orders(300, make_books(2))
+        Order.objects.filter(pk=cls.orders[5].pk).update(customer_name='Priya Sharma', phone='+91 9876543210')
+        Payment.objects.filter(order=cls.orders[7]).update(upi_transaction_id='412345678901')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def found(self, url_name, term):
+        response = self.client.get(reverse(url_name), {'q': term})
+        return [obj.pk for obj in response.context['cl'].result_list]
+
+    def test_order_search_fast_paths(self):
+        order = self.orders[42]
+        self.assertEqual(self.found('admin:store_order_changelist', order.order_id.lower()), [order.pk])
+        self.assertEqual(self.found('admin:store_order_changelist', 'C42@Example.com'), [order.pk])
+        self.assertEqual(self.found('admin:store_order_changelist', order.phone), [order.pk])
+        self.assertEqual(self.found('admin:store_order_changelist', '98765 43210'), [self.orders[5].pk])
+        self.assertEqual(self.found('admin:store_order_changelist', 'priya'), [self.orders[5].pk])
+        self.assertEqual(len(self.found('admin:store_order_changelist', 'Customer 29')), 1 + 10)
+
+    def test_payment_search(self):
+        payment = Payment.objects.get(order=self.orders[7])
+        self.assertEqual(self.found('admin:store_payment_changelist', '412345678901'), [payment.pk])
+        self.assertEqual(self.found('admin:store_payment_changelist', self.orders[7].order_id), [payment.pk])
+        self.assertEqual(self.found('admin:store_payment_changelist', 'c7@example.com'), [payment.pk])
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_searches_use_indexes(self):
+        from . import search
+
+        for term, index in [('priya', 'store_order_name_nocase_idx'), ('c7@example.com', 'store_order_email_nocase_idx'),
+                            ('9876543210', 'store_order_phone_idx')]:
+            self.assertIn(index, search.search_orders(Order.objects.all(), term).explain())
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[], ADMIN_COUNT_LIMIT=100)
+class LargeTableAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orders = make_orders(250, make_books(2))
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def test_keyset_pages_walk_every_order_once(self):
+        url, seen = reverse('admin:store_order_changelist'), []
+        while url:
+            with budget(self, 5, 3.0):
+                response = self.client.get(url)
+            cl = response.context['cl']
+            self.assertTrue(cl.keyset)
+            seen += [order.pk for order in cl.result_list]
+            url = cl.next_url and reverse('admin:store_order_changelist') + cl.next_url
+        expected = list(Order.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertContains(response, '&laquo; Newest')
+
+    def test_counts_are_estimated_or_capped(self):
+        response = self.client.get(reverse('admin:store_order_changelist'))
+        self.assertTrue(response.context['cl'].result_count_label.startswith('about '))
+        self.assertContains(response, 'class="status-select"', count=100)
+        self.assertContains(response, 'admin_status.js')
+        response = self.client.get(reverse('admin:store_order_changelist'), {'payment_status': 'pending'})
+        self.assertEqual(response.context['cl'].result_count_label, '100+')
+        with override_settings(ADMIN_COUNT_LIMIT=1000):
+            response = self.client.get(reverse('admin:store_payment_changelist'), {'status': 'pending'})
+        self.assertEqual(response.context['cl'].result_count_label, '250')
+
+    def test_sorting_by_a_column_uses_numbered_pages(self):
+        response = self.client.get(reverse('admin:store_order_changelist'), {'o': '1'})
+        cl = response.context['cl']
+        self.assertFalse(cl.keyset)
+        self.assertTrue(cl.multi_page)
+
+    def test_inline_status_edit(self):
+        order = self.orders[0]
+        url = reverse('admin:store_order_status', args=[order.pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, {'status': 'shipped'}).status_code, 400)
+
+        response = self.client.post(url, {'status': 'verified'})
+        self.assertEqual(response.json(), {'status': 'verified'})
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'verified')
+        self.assertEqual(DailyOrderStatus.objects.get(payment_status='verified').orders, 1)
+        self.assertEqual(DailySales.objects.get().orders, 1)
+
+        payment = order.payment
+        self.client.post(reverse('admin:store_payment_status', args=[payment.pk]), {'status': 'failed'})
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[],
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.books = make_books(3)
+        for book in self.books:
+            self.client.get(reverse('cart_add', args=[book.pk]))
+
+    def checkout_data(self):
+        key = self.client.get(reverse('checkout')).context['idempotency_key']
+        return {
+            'name': 'Asha Rao', 'email': 'asha@example.com', 'phone': '9999999999', 'address1': '12 MG Road',
+            'city': 'Pune', 'state': 'Maharashtra', 'pincode': '411001', 'idempotency_key': key,
+        }
+
+    def test_double_submit_places_one_order(self):
+        data = self.checkout_data()
+        first = self.client.post(reverse('payment_process'), data)
+        with self.assertNumQueries(0):
+            second = self.client.post(reverse('payment_process'), data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual((Order.objects.count(), OrderItem.objects.count(), Payment.objects.count()), (1, 3, 1))
+
+        # The key row alone is enough once the cache has forgotten it
+        cache.clear()
+        self.assertEqual(self.client.post(reverse('payment_process'), data).content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+        # A new checkout page is a new order
+        self.client.post(reverse('payment_process'), self.checkout_data())
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_requests_leave_no_key(self):
+        data = self.checkout_data()
+        with mock.patch('store.views.Payment.objects.create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('payment_process'), data)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.client.post(reverse('payment_process'), data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_callback_retries_deduct_stock_once(self):
+        self.client.post(reverse('payment_process'), self.checkout_data())
+        stock = self.books[0].stock
+        for _ in range(3):
+            response = self.client.post(reverse('payment_callback'), {'upi_transaction_id': '412345678901'})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(Book.objects.get(pk=self.books[0].pk).stock, stock - 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Order.objects.get().payment_status, 'completed')
+
+    def test_clients_without_a_session_are_not_deduplicated(self):
+        from django.test import Client
+
+        client = Client()
+        for _ in range(2):
+            response = client.post(reverse('payment_process'), {'idempotency_key': 'shared'})
+            self.assertEqual(response.status_code, 302)
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_duplicate_of_a_running_request_is_told_to_retry(self):
+        from . import idempotency
+
+        data = self.checkout_data()
+        key = idempotency.make_key('payment_process', self.client_request(), data['idempotency_key'])
+        claimed = IdempotencyKey.objects.create(key=key)
+        response = self.client.post(reverse('payment_process'), data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 0)
+
+        # A claim that never finished is taken over
+        IdempotencyKey.objects.filter(pk=claimed.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.client.post(reverse('payment_process'), data).status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+    def client_request(self):
+        request = mock.Mock()
+        request.session.session_key = self.client.session.session_key
+        return request
+
+    def test_expired_keys_are_purged(self):
+        from . import idempotency
+
+        self.client.post(reverse('payment_process'), self.checkout_data())
+        self.assertEqual(idempotency.purge_expired(), 0)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(idempotency.purge_expired(), 1)
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class AbandonedOrderTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(2)
+        self.abandoned = make_orders(5, self.books, status='pending')
+        self.awaiting = make_orders(1, self.books, status='pending_verification')
+        Order.objects.update(created_at=timezone.now() - timedelta(days=4))
+        self.recent = make_orders(2, self.books, status='pending')
+        rollups.rebuild()
+
+    def purge(self, **options):
+        output = StringIO()
+        call_command('purge_abandoned_orders', batch_size=2, stdout=output, **options)
+        return output.getvalue()
+
+    def test_deletes_old_pending_orders_in_batches(self):
+        output = self.purge()
+        self.assertIn('Deleted 5 abandoned order(s)', output)
+        self.assertIn('10 item(s), 10 unit(s), ₹2990.00 unpaid', output)
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)), {o.pk for o in self.awaiting + self.recent},
+        )
+        self.assertFalse(Payment.objects.filter(order_id__in=[o.pk for o in self.abandoned]).exists())
+        self.assertEqual(OrderItem.objects.count(), 6)
+        self.assertEqual(list(Book.objects.values_list('stock', flat=True)), [10, 10])
+
+        statuses = dict(DailyOrderStatus.objects.filter(orders__gt=0).values_list('payment_status', 'orders'))
+        self.assertEqual(statuses, {'pending': 2, 'pending_verification': 1})
+
+    def test_archive_instead_of_delete(self):
+        self.assertIn('Archived 5', self.purge(archive=True))
+        self.assertEqual(ArchivedOrder.objects.filter(payment_status='pending').count(), 5)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_dry_run_and_age(self):
+        self.assertIn('5 pending order(s)', self.purge(dry_run=True))
+        self.assertIn('Deleted 0', self.purge(hours=24 * 7))
+        self.assertEqual(Order.objects.count(), 8)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_candidates_use_status_index(self):
+        plan = Order.objects.filter(payment_status='pending', created_at__lt=timezone.now()).order_by('created_at')[:200].explain()
+        self.assertIn('store_order_status_created_idx', plan)
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class RecommendationTests(TestCase):
+
+    def setUp(self):
+        self.books = make_books(4)
+        # Four orders with books 0, 1 and 2; two with books 0 and 3
+        self.trios = make_orders(4, self.books[:3], items_per_order=3, status='pending')
+        self.pairs = make_orders(2, [self.books[0], self.books[3]], items_per_order=2, status='pending')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def post_action(self, action, orders):
+        self.client.post(reverse('admin:store_order_changelist'), {
+            'action': action, '_selected_action': [o.pk for o in orders],
+        })
+
+    def lists(self):
+        return {
+            book.pk: list(book.recommendations.values_list('recommended', 'orders'))
+            for book in Book.objects.all()
+        }
+
+    def test_updated_as_orders_are_verified_and_failed(self):
+        b = [book.pk for book in self.books]
+        self.post_action('mark_as_verified', self.trios + self.pairs)
+        self.assertEqual(self.lists()[b[0]], [(b[1], 4), (b[2], 4), (b[3], 2)])
+        self.assertEqual(self.lists()[b[3]], [(b[0], 2)])
+
+        self.post_action('mark_as_failed', self.trios[:1])
+        incremental = self.lists()
+        self.assertEqual(incremental[b[0]], [(b[1], 3), (b[2], 3), (b[3], 2)])
+        self.assertEqual(incremental[b[1]], [(b[0], 3), (b[2], 3)])
+
+        recommendations.rebuild()
+        self.assertEqual(self.lists(), incremental)
+
+    def test_lists_keep_top_k(self):
+        with override_settings(RECOMMENDATIONS_PER_BOOK=1):
+            self.post_action('mark_as_verified', self.trios + self.pairs)
+        self.assertEqual(self.lists()[self.books[0].pk], [(self.books[1].pk, 4)])
+
+    def test_book_detail_reads_one_query(self):
+        self.post_action('mark_as_verified', self.trios)
+        with budget(self, 5, 1.0):
+            response = self.client.get(reverse('book_detail', args=[self.books[3].pk]))
+        self.assertNotContains(response, 'Customers Also Bought')
+        response = self.client.get(reverse('book_detail', args=[self.books[0].pk]))
+        self.assertContains(response, 'Customers Also Bought')
+        self.assertEqual(response.context['also_bought'], [self.books[1], self.books[2]])
+
+    def test_async_book_detail_lists_also_bought(self):
+        self.post_action('mark_as_verified', self.trios)
+        path = reverse('book_detail', args=[self.books[0].pk])
+        response = async_to_sync(async_views.book_detail)(AsyncRequestFactory().get(path), self.books[0].pk)
+        self.assertContains(response, 'Customers Also Bought')
+        self.assertContains(response, self.books[2].title)
+
+
+@override_settings(STORAGES=TEST_STORAGES, ALLOWED_HOSTS=['testserver'], DATABASE_REPLICAS=[])
+class SimilarBookTests(TestCase):
+    CATALOG = [
+        ('The Monsoon Garden', 'Nitya', 'Poems about rain, gardens and the monsoon in Pune.'),
+        ('Rain Songs', 'Nitya', 'Short poems of monsoon rain falling on a city garden.'),
+        ('Desert Nights', 'Arjun Mehta', 'A thriller across the Thar desert at night.'),
+        ('Sand and Stars', 'Arjun Mehta', 'A desert journey under the stars, a thriller.'),
+        ('Ledger', 'Someone Else', 'Accounting for small businesses.'),
+    ]
+
+    def setUp(self):
+        self.books = [
+            Book.objects.create(title=title, author=author, description=description, price=299, stock=5)
+            for title, author, description in self.CATALOG
+        ]
+        similar.refresh()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def similar_to(self, book):
+        return list(book.similar_books.values_list('recommended__title', flat=True))
+
+    def test_lists_rank_by_shared_words(self):
+        self.assertEqual(self.similar_to(self.books[0]), ['Rain Songs'])
+        self.assertEqual(self.similar_to(self.books[2]), ['Sand and Stars'])
+        self.assertEqual(self.similar_to(self.books[4]), [])
+        score = SimilarBook.objects.get(book=self.books[0]).score
+        self.assertTrue(0 < score <= 1)
+
+    def test_vectors_are_normalised(self):
+        for vec in similar.vectors(Book.objects.all()).values():
+            self.assertAlmostEqual(sum(w * w for w in vec.values()), 1.0)
+
+    def test_admin_edit_refreshes_affected_lists(self):
+        ledger = self.books[4]
+        data = {'title': 'Monsoon Ledger', 'author': ledger.author, 'description': 'Rain and garden poems.',
+                'price': '299', 'stock': '5'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:store_book_change', args=[ledger.pk]), data)
+        self.assertIn('Monsoon Ledger', self.similar_to(self.books[0]))
+        self.assertIn('The Monsoon Garden', self.similar_to(ledger))
+
+        # Price/stock edits don't touch the lists
+        with mock.patch.object(similar, 'refresh') as refresh, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:store_book_change', args=[ledger.pk]), {**data, 'stock': '4'})
+        refresh.assert_not_called()
+
+    def test_book_detail_shows_similar_books(self):
+        response = self.client.get(reverse('book_detail', args=[self.books[2].pk]))
+        self.assertContains(response, 'You Might Also Like')
+        self.assertEqual(response.context['similar_books'], [self.books[3]])
+
+    def test_async_book_detail_shows_similar_books(self):
+        path = reverse('book_detail', args=[self.books[2].pk])
+        response = async_to_sync(async_views.book_detail)(AsyncRequestFactory().get(path), self.books[2].pk)
+        self.assertContains(response, 'You Might Also Like')
+        self.assertContains(response, 'Sand and Stars')
+
+    def test_admin_delete_refills_lists_that_had_the_book(self):
+        diary = Book.objects.create(title='Monsoon Diary', author='Nitya', description='Rain poems.', price=299, stock=5)
+        with override_settings(SIMILAR_BOOKS_PER_BOOK=1):
+            similar.refresh()
+            [top] = Book.objects.filter(title__in=self.similar_to(self.books[0]))
+            runner_up = diary if top == self.books[1] else self.books[1]
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('admin:store_book_delete', args=[top.pk]), {'post': 'yes'})
+            self.assertEqual(self.similar_to(self.books[0]), [runner_up.title])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('admin:store_book_changelist'), {
+                    'action': 'delete_selected', 'post': 'yes', '_selected_action': [runner_up.pk],
+                })
+            self.assertEqual(self.similar_to(self.books[0]), [])
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Read-only catalog pages run as coroutines when served over ASGI
+catalog = async_views if settings.ASYNC_CATALOG_VIEWS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('book/<int:pk>/', views.book_detail, name='book_detail'),
+    path('', catalog.home, name='home'),
+    path('book/<int:pk>/', catalog.book_detail, name='book_detail'),
     path('cart/', views.cart_detail, name='cart_detail'),
     path('cart/add/<int:pk>/', views.cart_add, name='cart_add'),
     path('cart/update/<int:pk>/', views.cart_update, name='cart_update'),
@@ -12,12 +16,17 @@ urlpatterns = [
     path('payment/process/', views.payment_process, name='payment_process'),
     path('payment/upload/<int:order_id>/', views.upload_payment_proof, name='upload_payment_proof'),
     path('payment/callback/', views.payment_callback, name='payment_callback'),
-    path('order/success/<str:order_id>/', views.order_success, name='order_success'),
+    path('uploads/token/', views.direct_upload_token, name='direct_upload_token'),
+    path('uploads/local/', views.direct_upload_local, name='direct_upload_local'),
+    path('uploads/confirm/', views.direct_upload_confirm, name='direct_upload_confirm'),
+    path('order/success/<str:order_id>/', catalog.order_success, name='order_success'),
     path('order/failed/', views.order_failed, name='order_failed'),
     path('create-admin/', views.create_admin, name='create_admin'),
     path('db-check/', views.db_check, name='db_check'),
     path('force-migrate/', views.force_migrate, name='force_migrate'),
     path('repair-db/', views.repair_db, name='repair_db'),
+    path('cron/owner-digest/', views.cron_owner_digest, name='cron_owner_digest'),
+    path('cron/purge-abandoned/', views.cron_purge_abandoned, name='cron_purge_abandoned'),
 
 
 
@@ -26,4 +35,9 @@ urlpatterns = [
     path('manage-order/fail/<int:pk>/', views.admin_order_fail, name='admin_order_fail'),
     path('test-email/', views.test_email_view, name='test_email'),
     path('book/<int:pk>/review/', views.submit_review, name='submit_review'),
+    path('csrf/', views.csrf_token, name='csrf_token'),
+    path('api/books/', api.book_list, name='api_book_list'),
+    path('api/books/<int:pk>/', api.book_detail, name='api_book_detail'),
+    path('api/books/<int:pk>/reviews/', api.review_list, name='api_book_reviews'),
+    path('api/reviews/', api.review_list, name='api_review_list'),
 ]
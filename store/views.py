@@ -6,7 +6,12 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.core.mail import send_mail
 from django.utils.html import strip_tags
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.views.decorators.http import require_POST
 from .models import Book, Order, OrderItem, Payment, AboutSection, SocialMedia, Review
+from . import digest, direct_upload, idempotency, offload, placeholders, rollups
+from .media import media_url
 import uuid
 from urllib.parse import quote
 
@@ -44,6 +49,11 @@ def book_detail(request, pk):
         book = get_object_or_404(Book, pk=pk)
         social_links = SocialMedia.objects.filter(is_active=True)
         reviews = book.reviews.all()
+        # Precomputed top-K lists (store/recommendations.py, store/similar.py), one indexed query each
+        also_bought = [r.recommended for r in book.recommendations.select_related('recommended')]
+        similar_books = [
+            s.recommended for s in book.similar_books.select_related('recommended') if s.recommended not in also_bought
+        ]
     except OperationalError:
         # Fallback for verification if DB fails
         return render(request, 'store/index.html', {'db_error': True})
@@ -52,9 +62,19 @@ def book_detail(request, pk):
         'book': book,
         'social_links': social_links,
         'reviews': reviews,
+        'also_bought': also_bought,
+        'similar_books': similar_books,
     })
 
 
+def csrf_token(request):
+    """CSRF token for forms on pre-rendered pages, which can't embed one"""
+    from django.middleware.csrf import get_token
+    response = JsonResponse({'token': get_token(request)})
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 def submit_review(request, pk):
     """Handle review submission"""
     if request.method == 'POST':
@@ -92,7 +112,7 @@ def cart_add(request, pk):
             'title': book.title,
             'price': str(book.price),
             'quantity': 1,
-            'image': book.image.url if book.image else ''
+            'image': media_url(book.image)
         }
     
     request.session['cart'] = cart
@@ -181,10 +201,13 @@ def checkout(request):
     
     return render(request, 'store/checkout.html', {
         'cart_items': cart_items,
-        'total': total
+        'total': total,
+        # One order per checkout page, however often the form is submitted
+        'idempotency_key': uuid.uuid4().hex,
     })
 
 
+@idempotency.idempotent('payment_process')
 def payment_process(request):
     """Process payment using UPI QR code"""
     if request.method == 'POST':
@@ -212,16 +235,19 @@ def payment_process(request):
             total_amount=total,
             payment_status='pending'
         )
+        rollups.record_transition(order, None, 'pending')
         
         # Create order items
-        for book_id, item in cart.items():
-            book = Book.objects.get(pk=int(book_id))
-            OrderItem.objects.create(
+        books = Book.objects.in_bulk([int(book_id) for book_id in cart])
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                book=book,
+                book=books[int(book_id)],
                 quantity=item['quantity'],
                 price=item['price']
             )
+            for book_id, item in cart.items()
+        ])
         
         # Create payment record
         Payment.objects.create(
@@ -241,16 +267,12 @@ def payment_process(request):
         # UPI string for QR code
         upi_string = f"upi://pay?pa={upi_id}&pn={payee_name}&am={amount_formatted}&cu=INR"
         
-        # Generate QR code
-        import qrcode
-        import io
-        import base64
-        
-        qr_img = qrcode.make(upi_string)
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format='PNG')
-        buffer.seek(0)
-        qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
+        # Generate QR code on the shared pool; under load the page falls
+        # back to the UPI ID and deeplink, which work without it
+        try:
+            qr_code_base64 = offload.run(offload.render_upi_qr, upi_string)
+        except (offload.PoolBusy, offload.PoolTimeout):
+            qr_code_base64 = None
         
         context = {
             'order': order,
@@ -265,6 +287,18 @@ def payment_process(request):
     return redirect('checkout')
 
 
+def proof_submitted(order, payment):
+    """Mark a payment as awaiting verification once its screenshot is attached"""
+    payment.status = 'pending_verification'
+    payment.save()
+
+    # Update order status
+    previous_status = order.payment_status
+    order.payment_status = 'pending_verification'
+    order.save()
+    rollups.record_transition(order, previous_status, order.payment_status)
+
+
 def upload_payment_proof(request, order_id):
     """Handle payment screenshot upload"""
     if request.method == 'POST':
@@ -279,14 +313,28 @@ def upload_payment_proof(request, order_id):
             
             # Save screenshot
             if 'payment_screenshot' in request.FILES:
-                payment.payment_screenshot = request.FILES['payment_screenshot']
-                payment.status = 'pending_verification'
-                payment.save()
-                
-                # Update order status
-                order.payment_status = 'pending_verification'
-                order.save()
-                
+                upload = request.FILES['payment_screenshot']
+                try:
+                    content, ext = offload.run(offload.prepare_screenshot, upload.read())
+                except ValueError:
+                    return render(request, 'store/payment.html', {
+                        'order': order,
+                        'error': 'Please upload a valid image of your payment',
+                        'total': order.total_amount,
+                        'upi_id_debug': settings.UPI_ID
+                    })
+                except (offload.PoolBusy, offload.PoolTimeout):
+                    # Pool saturated: never store an unvalidated file, ask for a retry
+                    return render(request, 'store/payment.html', {
+                        'order': order,
+                        'error': "We're busy right now, please upload your screenshot again in a moment",
+                        'total': order.total_amount,
+                        'upi_id_debug': settings.UPI_ID
+                    }, status=503)
+                else:
+                    stem = upload.name.rsplit('.', 1)[0]
+                    payment.payment_screenshot = ContentFile(content, name=f"{stem}.{ext}")
+                proof_submitted(order, payment)
                 return render(request, 'store/payment_submitted.html', {'order': order})
             else:
                 return render(request, 'store/payment.html', {
@@ -301,7 +349,99 @@ def upload_payment_proof(request, order_id):
     return redirect('home')
 
 
+@require_POST
+def direct_upload_token(request):
+    """Short-lived token for uploading a screenshot/cover straight to storage"""
+    kind = request.POST.get('kind')
+    target = request.POST.get('target', '')
+    if kind == 'payment':
+        # Only the browser that placed the order may attach its proof
+        if not target.isdigit() or str(request.session.get('current_order_id')) != target:
+            return JsonResponse({'error': 'Not your order'}, status=403)
+        target = int(target)
+    elif kind == 'book':
+        if not request.user.has_perm('store.change_book'):
+            return JsonResponse({'error': 'Unauthorized'}, status=403)
+        target = int(target) if target.isdigit() else None
+    else:
+        return JsonResponse({'error': 'Unknown upload kind'}, status=400)
+    return JsonResponse(direct_upload.issue(kind, target, request.POST.get('filename', '')))
+
+
 @csrf_exempt
+@require_POST
+def direct_upload_local(request):
+    """Stand-in for the storage backend's upload API when media is stored locally"""
+    try:
+        payload = direct_upload.read_token(request.POST.get('token', ''))
+    except direct_upload.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=403)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'No file'}, status=400)
+    if upload.size > settings.DIRECT_UPLOAD_MAX_BYTES:
+        return JsonResponse({'error': 'File too large'}, status=413)
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+            image_format = image.format
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        return JsonResponse({'error': 'Not an image'}, status=400)
+    if image_format not in direct_upload.IMAGE_FORMATS:
+        return JsonResponse({'error': 'Not an image'}, status=400)
+    upload.seek(0)
+    # One upload per token: a replayed token can't overwrite a file that may already be attached
+    if default_storage.exists(payload['name']):
+        return JsonResponse({'error': 'Already uploaded'}, status=409)
+    name = default_storage.save(payload['name'], upload)
+    if name != payload['name']:
+        # A concurrent upload with the same token won the race; storage gave this copy another name
+        default_storage.delete(name)
+        return JsonResponse({'error': 'Already uploaded'}, status=409)
+    return JsonResponse({'name': name})
+
+
+@require_POST
+def direct_upload_confirm(request):
+    """Attach a directly uploaded file to its Payment or Book"""
+    try:
+        payload = direct_upload.confirm(
+            request.POST.get('token', ''), request.POST.get('version'), request.POST.get('signature'),
+        )
+    except direct_upload.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if payload['kind'] == 'book':
+        if not request.user.has_perm('store.change_book'):
+            return JsonResponse({'error': 'Unauthorized'}, status=403)
+        book = get_object_or_404(Book, pk=payload['target'] or request.POST.get('book'))
+        book.image.name = payload['name']
+        placeholders.refresh(book)
+        book.save()
+        return JsonResponse({'name': book.image.name, 'url': media_url(book.image)})
+
+    order = get_object_or_404(Order, pk=payload['target'])
+    if order.payment_status not in ('pending', 'pending_verification'):
+        # Don't send a verified/completed/failed order back to verification
+        return JsonResponse({'error': 'This order is no longer awaiting payment.'}, status=409)
+    payment = order.payment
+    payment_ref = request.POST.get('payment_reference', '').strip()
+    if payment_ref:
+        payment.payment_reference = payment_ref
+    payment.payment_screenshot.name = payload['name']
+    proof_submitted(order, payment)
+    return render(request, 'store/payment_submitted.html', {'order': order})
+
+
+def current_order_key(request):
+    """Default idempotency key for payment_callback: one confirmation per order"""
+    order_pk = request.session.get('current_order_id')
+    return order_pk and f"order:{order_pk}"
+
+
+@csrf_exempt
+@idempotency.idempotent('payment_callback', default_key=current_order_key)
 def payment_callback(request):
     """Handle UPI payment confirmation with transaction ID"""
     if request.method == 'POST':
@@ -310,6 +450,9 @@ def payment_callback(request):
         # Get order from session
         order_pk = request.session.get('current_order_id')
         order = Order.objects.get(pk=order_pk)
+        if order.payment_status == 'completed':
+            # Already confirmed (e.g. a retry after its key expired): no second stock deduction or email
+            return redirect('order_success', order_id=order.order_id)
         
         # Update payment
         payment = Payment.objects.get(order=order)
@@ -318,8 +461,10 @@ def payment_callback(request):
         payment.save()
         
         # Update order status
+        previous_status = order.payment_status
         order.payment_status = 'completed'
         order.save()
+        rollups.record_transition(order, previous_status, order.payment_status)
         
         # Update stock
         for item in order.items.all():
@@ -414,24 +559,14 @@ def send_order_confirmation_email(order):
         html_message=html_message,
         fail_silently=False,
     )
-    
-    # Also send a copy to the store owner silently
-    try:
-        send_mail(
-            subject=f"[BCC] {subject}",
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.EMAIL_HOST_USER],
-            html_message=html_message,
-            fail_silently=True,
-        )
-    except:
-        pass
+
+    # The owner hears about it in the next digest (send_owner_digest)
+    digest.append(order, items_list)
 
 
 def order_success(request, order_id):
     """Display order success page"""
-    order = get_object_or_404(Order, order_id=order_id)
+    order = get_object_or_404(Order.objects.prefetch_related('items__book'), order_id=order_id)
     return render(request, 'store/order_success.html', {'order': order})
 
 
@@ -469,8 +604,10 @@ def admin_order_verify(request, pk):
     
     from django.utils import timezone
     order = get_object_or_404(Order, pk=pk)
+    previous_status = order.payment_status
     order.payment_status = 'verified'
     order.save()
+    rollups.record_transition(order, previous_status, order.payment_status)
     
     # Update payment
     payment = getattr(order, 'payment', None)
@@ -495,8 +632,10 @@ def admin_order_fail(request, pk):
         return HttpResponse("Unauthorized", status=403)
     
     order = get_object_or_404(Order, pk=pk)
+    previous_status = order.payment_status
     order.payment_status = 'failed'
     order.save()
+    rollups.record_transition(order, previous_status, order.payment_status)
     
     # Update payment
     payment = getattr(order, 'payment', None)
@@ -541,7 +680,7 @@ def test_email_view(request):
         if order_id:
             order = get_object_or_404(Order, order_id=order_id)
             send_order_confirmation_email(order)
-            return HttpResponse(env_status + f"REAL Order Confirmation sent for {order_id} to {order.email} (and BCC to owner)!")
+            return HttpResponse(env_status + f"REAL Order Confirmation sent for {order_id} to {order.email}! The owner gets it in the next digest.")
         else:
             send_mail(
                 'Simple Test Email',
@@ -593,94 +732,45 @@ def db_check(request):
     <p><strong>Database Host:</strong> {db_host}</p>
     <p><strong>Database User:</strong> {db_user}</p>
     <p><strong>Database Name:</strong> {db_name}</p>
+    <p><strong>Checkout worker pool:</strong> {offload.stats()}</p>
     <p><em>If you see 'password authentication failed', it means your connection string in Vercel has the wrong password.</em></p>
     """
     return HttpResponse(output)
 
 
-def repair_db(request):
-    """Aggressive self-healing tool for out-of-sync database schemas"""
+def cron_authorized(request):
+    return settings.CRON_SECRET and request.headers.get('Authorization') == f"Bearer {settings.CRON_SECRET}"
+
+
+def cron_owner_digest(request):
+    """Vercel cron entry point for send_owner_digest"""
+    if not cron_authorized(request):
+        return HttpResponse("Unauthorized", status=403)
     import io
-    from django.core.management import call_command
-    from django.db import connection
     output = io.StringIO()
-    
-    def table_exists(table_name):
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT EXISTS (SELECT FROM pg_tables WHERE schemaname = 'public' AND tablename = %s)", [table_name])
-            return cursor.fetchone()[0]
-
-    def column_exists(table_name, column_name):
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.columns 
-                    WHERE table_name = %s AND column_name = %s
-                )
-            """, [table_name, column_name])
-            return cursor.fetchone()[0]
-
-    try:
-        output.write("--- UNIVERSAL SURGICAL REPAIR START ---\n")
-        
-        # Helper to fake or run migrations for core apps
-        def repair_app(app_name, primary_table):
-            if table_exists(primary_table):
-                output.write(f"Detected '{primary_table}'. Faking '{app_name}' migrations...\n")
-                call_command('migrate', app_name, '--fake', no_input=True, stdout=output)
-            else:
-                output.write(f"'{primary_table}' missing. Running '{app_name}' migrations...\n")
-                call_command('migrate', app_name, no_input=True, stdout=output)
-
-        # 1. Repair Core Apps
-        repair_app('contenttypes', 'django_content_type')
-        repair_app('auth', 'auth_user')
-        repair_app('admin', 'django_admin_log')
-        repair_app('sessions', 'django_session')
-
-        # 2. Repair Store App
-        output.write("\nCleaning migration history for 'store'...\n")
-        with connection.cursor() as cursor:
-            cursor.execute("DELETE FROM django_migrations WHERE app = 'store'")
-        
-        # Migration 0001
-        if table_exists('store_book'):
-            output.write("Detected 'store_book'. Faking 0001...\n")
-            call_command('migrate', 'store', '0001', '--fake', no_input=True, stdout=output)
-        else:
-            output.write("0001 tables missing. Running...\n")
-            call_command('migrate', 'store', '0001', no_input=True, stdout=output)
+    call_command('send_owner_digest', stdout=output)
+    # Hourly housekeeping rides along
+    output.write(f"Purged {idempotency.purge_expired()} expired idempotency key(s).\n")
+    return HttpResponse(output.getvalue(), content_type='text/plain')
 
-        # Migration 0002
-        if table_exists('store_aboutsection'):
-            output.write("Detected 'store_aboutsection'. Faking 0002...\n")
-            call_command('migrate', 'store', '0002', '--fake', no_input=True, stdout=output)
-        else:
-            output.write("0002 tables missing. Running...\n")
-            call_command('migrate', 'store', '0002', no_input=True, stdout=output)
 
-        # Migration 0003
-        if column_exists('store_payment', 'payment_reference'):
-            output.write("Detected 'payment_reference'. Faking 0003...\n")
-            call_command('migrate', 'store', '0003', '--fake', no_input=True, stdout=output)
-        else:
-            output.write("0003 columns missing. Running...\n")
-            call_command('migrate', 'store', '0003', no_input=True, stdout=output)
+def cron_purge_abandoned(request):
+    """Vercel cron entry point for purge_abandoned_orders"""
+    if not cron_authorized(request):
+        return HttpResponse("Unauthorized", status=403)
+    import io
+    output = io.StringIO()
+    call_command('purge_abandoned_orders', stdout=output)
+    return HttpResponse(output.getvalue(), content_type='text/plain')
 
-        # Migration 0004
-        if table_exists('store_review'):
-            output.write("Detected 'store_review'. Faking 0004...\n")
-            call_command('migrate', 'store', '0004', '--fake', no_input=True, stdout=output)
-        else:
-            output.write("0004 tables missing. Running...\n")
-            call_command('migrate', 'store', '0004', no_input=True, stdout=output)
 
-        # 3. Final catch-all migrate
-        output.write("\nRunning final sync for all apps...\n")
-        call_command('migrate', no_input=True, stdout=output)
-        
+def repair_db(request):
+    """Run the repair_schema command; prefer running it at deploy time instead"""
+    import io
+    output = io.StringIO()
+    try:
+        call_command('repair_schema', stdout=output)
         return HttpResponse(f"Universal Repair completed.<br><pre>{output.getvalue()}</pre>")
-
     except Exception as e:
         import traceback
-        return HttpResponse(f"Repair FATAL ERROR: {str(e)}<br><pre>{traceback.format_exc()}</pre>", status=500)
+        return HttpResponse(f"Repair FATAL ERROR: {str(e)}<br><pre>{output.getvalue()}\n{traceback.format_exc()}</pre>", status=500)
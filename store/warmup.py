@@ -0,0 +1,34 @@
+"""
+Process start-up hooks, called from wsgi.py/asgi.py once Django is loaded.
+"""
+import logging
+from pathlib import Path
+
+from django.apps import apps
+from django.template.loader import get_template
+
+
+logger = logging.getLogger(__name__)
+
+
+def store_template_names():
+    """Every template shipped under store/templates/store/"""
+    root = Path(apps.get_app_config('store').path) / 'templates'
+    return sorted(p.relative_to(root).as_posix() for p in (root / 'store').glob('*.html'))
+
+
+def warm_templates():
+    """
+    Parse every store template into the cached loader before the first
+    request; returns the names that loaded. A broken template is logged
+    and left to fail on its own requests rather than stopping the worker.
+    """
+    warmed = []
+    for name in store_template_names():
+        try:
+            get_template(name)
+        except Exception:
+            logger.exception("Could not warm template %s", name)
+        else:
+            warmed.append(name)
+    return warmed